@@ -137,9 +137,10 @@ def test_circuit_breaker_operations():
     try:
         sys.path.append(str(project_root / 'src/layer_utils'))
         from aws_utils import (
-            s3_object_bytes, send_sqs_message, verify_queue,
+            s3_object_bytes, verify_queue,
             get_thing_type_arn, get_policy_arn, process_thing_group
         )
+        from sqs_utils import send_sqs_message
         from circuit_state import _circuit_states, clear_circuits
         
         print("✅ Successfully imported circuit breaker functions")
@@ -4,8 +4,12 @@
 the Thing, Policy, Certificate, Thing Type, and Thing Group
 """
 import hashlib
+import os
 import random
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from json import loads
+from typing import Callable
 
 from aws_lambda_powertools import Logger
 from aws_lambda_powertools.utilities.idempotency import idempotent_function
@@ -17,20 +21,19 @@ from botocore.exceptions import ClientError
 
 from layer_utils.aws_utils import (
     get_certificate,
-    get_thing_arn,
     process_policy,
     process_thing,
     process_thing_group,
     process_thing_type,
     register_certificate)
 from layer_utils.cert_utils import (
-    decode_certificate,
     get_certificate_fingerprint,
     load_certificate)
+from layer_utils.message_utils import (message_certificate, message_certificate_key,
+                                       message_fingerprint, unpack_message)
 from layer_utils.aws_utils import (
     ImporterMessageKey,
-    powertools_idempotency_environ,
-    get_certificate_arn)
+    powertools_idempotency_environ)
 
 # Initialize Logger and Idempotency
 logger = Logger(service="bulk_importer")
@@ -38,16 +41,35 @@ default_session: Session = Session()
 
 persistence_layer, idempotency_config = powertools_idempotency_environ()
 
+# Number of SQS records from one batch processed concurrently
+BATCH_WORKERS: int = int(os.environ.get("IMPORTER_BATCH_WORKERS", 5))
+# Number of policy, thing group and thing type associations run concurrently per device
+ASSOCIATION_WORKERS: int = int(os.environ.get("IMPORTER_ASSOCIATION_WORKERS", 4))
+
+class AssociationError(Exception):
+    """Raised when one or more association steps fail for a device.
+
+    Attributes:
+        thing_name (str): The thing being associated
+        errors (list): (step, exception) tuples in the order the steps were defined
+    """
+    def __init__(self, thing_name: str, errors: list[tuple[str, Exception]]):
+        self.thing_name = thing_name
+        self.errors = errors
+        details = "; ".join(f"{step}: {error}" for step, error in errors)
+        super().__init__(f"{len(errors)} association step(s) failed for thing "
+                         f"{thing_name}: {details}")
+
 def certificate_key_generator(event: dict, _context):
     """Generate a unique key based on certificate content and thing name"""
-    if not ImporterMessageKey.CERTIFICATE.value in event:
+    if (certificate := message_certificate_key(event)) is None:
         return None
 
     if not ImporterMessageKey.THING_NAME.value in event:
         return None
 
     # Use certificate hash and thing name as the key
-    cert_hash = hashlib.sha256(event[ImporterMessageKey.CERTIFICATE.value].encode()).hexdigest()
+    cert_hash = hashlib.sha256(certificate.encode()).hexdigest()
 
     # Add some randomness to prevent hot keys
     jitter = random.random() * 0.3  # 30% jitter
@@ -61,24 +83,31 @@ def certificate_key_generator(event: dict, _context):
     data_keyword_argument="config"
 )
 def process_certificate(config, session: Session=default_session) -> tuple[str,str]:
-    """ Imports the certificate to IoT Core """
-    payload = config['certificate']
+    """ Imports the certificate to IoT Core. Accepts both importer message formats.
 
-    decoded_certificate = decode_certificate(payload)
-    x509_certificate = load_certificate(decoded_certificate.encode('ascii'))
-    fingerprint = get_certificate_fingerprint(x509_certificate)
+    The fingerprint computed by the provider is trusted for the lookup, so the
+    certificate is only decoded when it has to be registered. Messages without
+    a fingerprint are parsed here.
+    """
+    decoded_certificate = None
+    if (fingerprint := message_fingerprint(config)) is None:
+        decoded_certificate = message_certificate(config)
+        x509_certificate = load_certificate(decoded_certificate.encode('ascii'))
+        fingerprint = get_certificate_fingerprint(x509_certificate)
 
     try:
-        certificate_id = get_certificate(fingerprint, session)
+        certificate = get_certificate(fingerprint, session)
     except ClientError as error:
         logger.info({
             "message": "Certificate not found in IoT Core. Importing.",
             "fingerprint": fingerprint,
             "error": str(error)
         })
+        if decoded_certificate is None:
+            decoded_certificate = message_certificate(config)
         try:
-            certificate_id = register_certificate(certificate=decoded_certificate,
-                                        session=session)
+            certificate = register_certificate(certificate=decoded_certificate,
+                                               session=session)
         except ClientError as import_error:
             logger.error({
                 "message": "Certificate could not be created.",
@@ -86,8 +115,16 @@ def process_certificate(config, session: Session=default_session) -> tuple[str,s
             })
             raise
 
-    certificate_arn = get_certificate_arn(certificate_id, session)
-    return certificate_id, certificate_arn
+        # IoT Core derives the certificate id from the certificate itself
+        if certificate.certificate_id != fingerprint:
+            logger.warning({
+                "message": "Fingerprint in message does not match the registered certificate",
+                "fingerprint": fingerprint,
+                "certificate_id": certificate.certificate_id
+            })
+
+    # Both lookups return the id and ARN from a single API call
+    return certificate.certificate_id, certificate.certificate_arn
 
 def get_thingpress_tags() -> list:
     """Generate standard Thingpress tags for IoT objects
@@ -100,61 +137,193 @@ def get_thingpress_tags() -> list:
         {'Key': 'managed-by', 'Value': 'thingpress'}
     ]
 
+def association_targets(config: dict) -> tuple[tuple[str, ...], tuple[str, ...], str|None]:
+    """Policy names, thing group ARNs and thing type a message asks for.
+    Legacy single policy_name / thing_group_arn keys are honored when the list
+    forms are absent."""
+    policies = config.get(ImporterMessageKey.POLICIES.value)
+    if policies is None and config.get(ImporterMessageKey.POLICY_NAME.value):
+        policies = [{'name': config[ImporterMessageKey.POLICY_NAME.value]}]
+
+    thing_groups = config.get(ImporterMessageKey.THING_GROUPS.value)
+    if thing_groups is None and config.get(ImporterMessageKey.THING_GROUP_ARN.value):
+        thing_groups = [{'arn': config[ImporterMessageKey.THING_GROUP_ARN.value]}]
+
+    return (tuple(policy_info['name'] for policy_info in policies or []),
+            tuple(thing_group_info['arn'] for thing_group_info in thing_groups or []),
+            config.get(ImporterMessageKey.THING_TYPE_NAME.value) or None)
+
+def association_steps(config: dict,
+                      certificate_arn: str,
+                      thing_arn: str,
+                      session: Session=default_session) -> list[tuple[str, Callable]]:
+    """Collect the independent association steps for a device once the certificate
+    and thing exist."""
+    thing_name = config.get(ImporterMessageKey.THING_NAME.value)
+    steps: list[tuple[str, Callable]] = []
+    policy_names, thing_group_arns, thing_type_name = association_targets(config)
+
+    for policy_name in policy_names:
+        steps.append((f"policy {policy_name}",
+                      partial(process_policy,
+                              policy_name=policy_name,
+                              certificate_arn=certificate_arn,
+                              session=session)))
+
+    for thing_group_arn in thing_group_arns:
+        steps.append((f"thing group {thing_group_arn}",
+                      partial(process_thing_group,
+                              thing_group_arn=thing_group_arn,
+                              thing_arn=thing_arn,
+                              session=session)))
+
+    # Thing type is singular - AWS IoT allows only one thing type per thing
+    if thing_type_name:
+        steps.append((f"thing type {thing_type_name}",
+                      partial(process_thing_type,
+                              thing_name=thing_name,
+                              thing_type_name=thing_type_name,
+                              session=session)))
+    return steps
+
+def process_associations(thing_name: str,
+                         steps: list[tuple[str, Callable]],
+                         max_workers: int=ASSOCIATION_WORKERS) -> None:
+    """Run association steps on a bounded thread pool.
+
+    Every step runs to completion even when another fails. Failures are
+    aggregated in step order so the resulting error is deterministic.
+
+    Raises:
+        AssociationError: If any step failed
+    """
+    if not steps:
+        return
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(steps)))) as executor:
+        futures = [(step, executor.submit(func)) for step, func in steps]
+
+    errors = [(step, error) for step, future in futures
+              if (error := future.exception()) is not None]
+    if errors:
+        raise AssociationError(thing_name, errors) from errors[0][1]
+
 def process_sqs(config, session: Session=default_session):
     """Main processing function to procedurally run through processing steps."""
+    thing_name = config.get(ImporterMessageKey.THING_NAME.value)
     certificate_id, certificate_arn = process_certificate(config=config, session=session)
 
     logger.info({
         "message": "Processing thing and associations",
-        "thing_name": config.get(ImporterMessageKey.THING_NAME.value),
+        "thing_name": thing_name,
         "certificate_id": certificate_id,
         "certificate_arn": certificate_arn
     })
 
-    process_thing(config.get(ImporterMessageKey.THING_NAME.value),
-                  certificate_arn=certificate_arn,
-                  session=session)
-
-    # Process multiple policies
-    policies = config.get('policies', [])
-    for policy_info in policies:
-        process_policy(policy_name=policy_info['name'],
-                      certificate_arn=certificate_arn,
-                      session=session)
-
-    thing_arn = get_thing_arn(config.get(ImporterMessageKey.THING_NAME.value),
-                              session=session)
-    
-    # Process multiple thing groups
-    thing_groups = config.get('thing_groups', [])
-    for thing_group_info in thing_groups:
-        process_thing_group(thing_group_arn=thing_group_info['arn'],
-                           thing_arn=thing_arn,
-                           session=session)
-
-    # Process thing type (singular - AWS IoT allows only one thing type per thing)
-    thing_type_name = config.get(ImporterMessageKey.THING_TYPE_NAME.value)
-    if thing_type_name:
-        process_thing_type(thing_name=config.get(ImporterMessageKey.THING_NAME.value),
-                          thing_type_name=thing_type_name,
+    thing = process_thing(thing_name,
+                          certificate_arn=certificate_arn,
                           session=session)
 
+    # Policies, thing groups and thing type are independent of each other
+    process_associations(thing_name,
+                         association_steps(config, certificate_arn, thing.thing_arn, session))
+
     return {
         "certificate_id": certificate_id,
-        "thing_name": config.get(ImporterMessageKey.THING_NAME.value)
+        "thing_name": thing_name
     }
 
+def _record_key(config: dict) -> tuple:
+    """Records importing the same certificate to the same thing share one pass"""
+    return (config.get(ImporterMessageKey.THING_NAME.value),
+            message_certificate_key(config),
+            association_targets(config))
+
+def _process_sqs_safe(config: dict, session: Session) -> dict:
+    """Run process_sqs, capturing the outcome rather than raising"""
+    try:
+        return {"status": "success", "result": process_sqs(config, session=session)}
+    except Exception as error: # pylint: disable=broad-exception-caught
+        logger.error({
+            "message": "Failed to process SQS message",
+            "thing_name": config.get(ImporterMessageKey.THING_NAME.value),
+            "error": str(error)
+        })
+        return {"status": "failed", "error": error}
+
+def process_batch(records: list[tuple[str, dict]],
+                  session: Session=default_session,
+                  max_workers: int=BATCH_WORKERS) -> list[dict]:
+    """Process a whole SQS batch in one pass.
+
+    Duplicate records within the batch are collapsed to a single import, and the
+    remaining records run concurrently since each touches an independent
+    certificate and thing.
+
+    Args:
+        records: List of (message_id, config) tuples in batch order
+        session: Boto3 session
+        max_workers: Maximum number of records processed concurrently
+
+    Returns:
+        List of per-message result dictionaries, in batch order
+    """
+    unique: dict[tuple, dict] = {}
+    for _, config in records:
+        unique.setdefault(_record_key(config), config)
+
+    logger.info({
+        "message": "Processing SQS batch",
+        "records": len(records),
+        "unique_records": len(unique)
+    })
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(unique)))) as executor:
+        futures = {key: executor.submit(_process_sqs_safe, config, session)
+                   for key, config in unique.items()}
+        outcomes = {key: future.result() for key, future in futures.items()}
+
+    return [{"message_id": message_id,
+             "thing_name": config.get(ImporterMessageKey.THING_NAME.value),
+             **outcomes[_record_key(config)]}
+            for message_id, config in records]
+
 def lambda_handler(event: dict,
                    _context: LambdaContext) -> dict:
-    """Lambda function main entry point"""
+    """Lambda function main entry point
+
+    Returns an SQS partial batch response so that only the failed messages
+    are returned to the queue for retry. A packed message is returned when any
+    of its certificates failed; the others are imported idempotently on retry.
+    """
     sqs_event = SQSEvent(event)
 
+    records = []
+    unreadable = []
     for record in sqs_event.records:
-        config = loads(record.body)
-        logger.info({
-            "message": "Processing SQS message",
-            "thing_name": config.get(ImporterMessageKey.THING_NAME.value)
-        })
-        process_sqs(config)
+        # A malformed message fails on its own rather than taking the batch with it
+        try:
+            configs = unpack_message(loads(record.body))
+        except Exception as error: # pylint: disable=broad-exception-caught
+            logger.error({
+                "message": "Failed to read SQS message",
+                "message_id": record.message_id,
+                "error": str(error)
+            })
+            unreadable.append(record.message_id)
+            continue
+        records.extend((record.message_id, config) for config in configs)
+
+    results = process_batch(records) if records else []
+
+    failures = [r for r in results if r["status"] == "failed"]
+    logger.info({
+        "message": "SQS batch processed",
+        "succeeded": len(results) - len(failures),
+        "failed": len(failures),
+        "unreadable": len(unreadable)
+    })
 
-    return event
+    # dict.fromkeys keeps the first occurrence order of packed message ids
+    failed_ids = dict.fromkeys(unreadable + [r["message_id"] for r in failures])
+    return {"batchItemFailures": [{"itemIdentifier": message_id} for message_id in failed_ids]}
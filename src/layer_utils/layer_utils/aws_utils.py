@@ -2,27 +2,28 @@
 # SPDX-License-Identifier: MIT-0
 """AWS related functions that multiple lambda functions use, here to reduce redundancy
 """
-import time
+from contextlib import contextmanager
 from inspect import stack
 from io import BytesIO
 from os import environ
-from json import dumps, JSONDecodeError
 from enum import Enum
 from logging import getLogger
+from typing import BinaryIO, Iterator, NamedTuple
 from boto3 import Session
-from botocore.config import Config
 from botocore.exceptions import ClientError
 from aws_lambda_powertools.utilities.idempotency.config import IdempotencyConfig
 from aws_lambda_powertools.utilities.idempotency.persistence.dynamodb import \
     DynamoDBPersistenceLayer
+from .client_utils import default_session, get_client
 from .circuit_state import (CircuitOpenError, circuit_is_open, record_failure, reset_circuit,
                             with_circuit_breaker)
+from .rate_limiter import acquire_rate_limit
 
 logger = getLogger()
 logger.setLevel("INFO")
 
-client_cache: dict = {}
-default_session: Session = Session()
+# Read size when streaming S3 objects
+S3_STREAM_CHUNK_SIZE: int = 64 * 1024
 
 # These enums probably deserve their own module
 class ProviderMessageKey(Enum):
@@ -32,6 +33,11 @@ class ProviderMessageKey(Enum):
     THING_GROUP_ARN = 'thing_group_arn'
     THING_TYPE_NAME = 'thing_type_name'
     POLICY_NAME = 'policy_name'
+    RANGE_START = 'range_start'
+    RANGE_END = 'range_end'
+    INDEX_START = 'index_start'
+    INDEX_END = 'index_end'
+    FIELDNAMES = 'fieldnames'
 class ImporterMessageKey(Enum):
     """SQS message keys expected by bulk importer"""
     CERTIFICATE = 'certificate'
@@ -39,6 +45,13 @@ class ImporterMessageKey(Enum):
     THING_GROUP_ARN = 'thing_group_arn'
     THING_TYPE_NAME = 'thing_type_name'
     POLICY_NAME = 'policy_name'
+    POLICIES = 'policies'
+    THING_GROUPS = 'thing_groups'
+    VERSION = 'v'
+    CERTIFICATE_DER = 'der'
+    CERTIFICATE_CHAIN = 'chain'
+    FINGERPRINT = 'fp'
+    CERTIFICATES = 'certs'
 class BotoErrorStruct(Enum):
     """dict fields in BotoError structure"""
     ERROR = 'Error'
@@ -49,424 +62,121 @@ class SqsMessageStatus(Enum):
     SUCCESSFUL = 'Successful'
     FAILED = 'Failed'
 
-QUEUE_DEPTH_DELAY_VERY_HIGH: int = 2000
-QUEUE_DEPTH_DELAY_HIGH = 1000
-QUEUE_DEPTH_DELAY_MEDIUM = 500
-QUEUE_DEPTH_DELAY_MEDIUM_LOW = 100
-QUEUE_DEPTH_DELAY_LOW = 0
-
-def client_config():
-    """ Default configuration for each boto3 client """
-    return Config(
-        retries = {
-            'max_attempts': 3,
-            'mode': 'standard'
-        }
-    )
+class CertificateRef(NamedTuple):
+    """Identity of a certificate in IoT Core, as returned by a single API call"""
+    certificate_id: str
+    certificate_arn: str
+
+class ThingRef(NamedTuple):
+    """Identity of a thing in the IoT registry, as returned by a single API call"""
+    thing_name: str
+    thing_arn: str
 
 @with_circuit_breaker('s3_download_fileobj')
-def s3_object(bucket_name: str, object_name: str, fs=BytesIO(), session: Session=default_session):
+def s3_object(bucket_name: str, object_name: str, fs: BinaryIO|None = None,
+              session: Session=default_session) -> BinaryIO:
     """Retrieve an s3 object and return as file-like object.
-       By default, it returns a byte-like object."""
-    s3res = session.resource('s3')
-    res = s3res.Object(bucket_name=bucket_name, key=object_name)
+       By default, a new BytesIO is allocated for each call; the caller owns it."""
+    if fs is None:
+        fs = BytesIO()
+    s3_client = get_client('s3', session)
     try:
-        res.download_fileobj(fs)
+        s3_client.download_fileobj(Bucket=bucket_name, Key=object_name, Fileobj=fs)
     except ClientError as error:
         boto_exception(error, f"With s3 object [{object_name}] bucket [{bucket_name}]")
         raise error
     return fs
 
+@contextmanager
+def s3_object_buffer(bucket_name: str,
+                     object_name: str,
+                     session: Session=default_session) -> Iterator[BytesIO]:
+    """Download an S3 object into a buffer that is released when the block exits"""
+    fs = BytesIO()
+    try:
+        s3_object(bucket_name, object_name, fs, session)
+        fs.seek(0)
+        yield fs
+    finally:
+        fs.close()
+
 @with_circuit_breaker('s3_object_bytes')
 def s3_object_bytes(bucket_name: str,
                     object_name: str,
-#                    getvalue: bool=False,
                     session: Session=default_session) -> bytes:
     """Download an S3 object as byte file-like object"""
-    fs = BytesIO()
-    fs = s3_object(bucket_name, object_name, fs, session)
-    return fs.getvalue()
-#    if getvalue is True:
-#        return fs.getvalue()
-#    return BytesIO(fs.getvalue())
-
-@with_circuit_breaker('sqs_send_message')
-def send_sqs_message(config, queue_url, session: Session=default_session):
-    """Send the thing name and certificate to sqs queue"""
-    sqs_client = session.client('sqs')
-
+    with s3_object_buffer(bucket_name, object_name, session) as fs:
+        return fs.getvalue()
+
+@with_circuit_breaker('s3_head_object')
+def s3_object_size(bucket_name: str,
+                   object_name: str,
+                   session: Session=default_session) -> int:
+    """Size in bytes of an S3 object, without downloading it"""
+    s3_client = get_client('s3', session)
     try:
-        message_body = dumps(config)
-    except JSONDecodeError as e:
-        logger.error("Unexpected problem loading config file:\n%s", config)
-        raise e
-
-    try:
-        response = sqs_client.send_message(QueueUrl=queue_url,
-                                           MessageBody=message_body)
+        response = s3_client.head_object(Bucket=bucket_name, Key=object_name)
     except ClientError as error:
-        boto_exception(error, "With queue_url [{queue_url}]")
+        boto_exception(error, f"With s3 object [{object_name}] bucket [{bucket_name}]")
         raise error
-    return response
-
-def send_sqs_message_batch_prepare(batch_number, batch):
-    """Helper for send_sqs_message_batch
-       Organizes a message batch. """
-    entries = []
-    for idx, message in enumerate(batch):
-
-        entry_id = str(batch_number + idx)
-        entries.append({
-            'Id': entry_id,
-            'MessageBody': dumps(message),
-            'MessageAttributes': {
-                'BatchIndex': {
-                    'StringValue': entry_id,
-                    'DataType': 'Number'
-                }
-            }
-        })
-    return entries
-
-@with_circuit_breaker('sqs_send_message_batch')
-def send_sqs_message_batch(messages: list, queue_url: str, session: Session=default_session):
-    """Send multiple messages in a single SQS batch operation
-
-    Args:
-        messages: List of message dictionaries to send
-        queue_url: SQS queue URL
-        session: Boto3 session
-
-    Returns:
-        List of SQS batch response dictionaries
-
-    Raises:
-        ClientError: If SQS batch operation fails
-    """
-    sqs_client = session.client('sqs')
-    batch_size = 10  # SQS batch limit
-    results = []
-    failed_messages = []
-
-    logger.info("Sending %d messages in batches to queue", len(messages))
-
-    for i in range(0, len(messages), batch_size):
-        batch = messages[i:i + batch_size]
-        entries = send_sqs_message_batch_prepare(i, batch)
-
-        try:
-            response = sqs_client.send_message_batch(
-                QueueUrl=queue_url,
-                Entries=entries
-            )
-        except ClientError as error:
-            logger.error("SQS batch send failed for batch starting at index %d: %s", i, error)
-            boto_exception(error, f"With queue_url [{queue_url}]")
-            raise error
-
-        results.append(response)
-
-        # Log successful sends
-        if SqsMessageStatus.SUCCESSFUL.value in response:
-            logger.info("Successfully sent %d messages in batch",
-                        len(response[SqsMessageStatus.SUCCESSFUL.value]))
-
-        # Handle partial failures
-        if SqsMessageStatus.FAILED.value in response and \
-           response[SqsMessageStatus.FAILED.value]:
-            logger.warning(
-                "Batch send partial failure: %d messages failed",
-                len(response[SqsMessageStatus.FAILED.value])
-                )
-
-            for failure in response[SqsMessageStatus.FAILED.value]:
-                failed_msg_idx = int(failure['Id'])
-                failed_messages.append({
-                    'message': messages[failed_msg_idx],
-                    'error': failure,
-                    'batch_index': failed_msg_idx
-                })
-
-                logger.error(
-                    "Failed to send message %s: %s - %s",
-                    failure['Id'],
-                    failure['Code'],
-                    failure['Message']
-                    )
-
-    # Report final statistics
-    logger.info("Batch send complete: %d sent, %d failed",
-                sum(len(r.get('Successful', [])) for r in results),
-                len(failed_messages))
-
-    if failed_messages:
-        logger.warning("Failed messages details logged for retry")
-
-    return results
-
-def _identify_sqs_failed_messages(message_results: list, remaining_messages: list) -> list:
-    failed_messages = []
-    for result in message_results:
-        if not SqsMessageStatus.FAILED.value in result:
-            break
-        for failure in result[SqsMessageStatus.FAILED.value]:
-            if (failed_msg_idx := int(failure['Id'])) < len(remaining_messages):
-                failed_messages.append(remaining_messages[failed_msg_idx])
-
-    return failed_messages
-
-@with_circuit_breaker('sqs_send_message_batch_with_retry')
-def send_sqs_message_batch_with_retry(messages: list, queue_url: str,
-                                    session: Session=default_session, max_retries: int = 3):
-    """Send messages in batches with retry logic for failed messages
-
-    Args:
-        messages: List of message dictionaries to send
-        queue_url: SQS queue URL
-        session: Boto3 session
-        max_retries: Maximum number of retry attempts
-
-    Returns:
-        List of SQS batch response dictionaries
-    """
-    remaining_messages = messages.copy()
-    all_results = []
-
-    for attempt in range(max_retries):
-        if not remaining_messages:
-            break
-
-        logger.info(
-            "Batch send attempt %d/%d for %d messages",
-            attempt + 1,
-            max_retries,
-            len(remaining_messages)
-            )
-
-        try:
-            results = send_sqs_message_batch(remaining_messages, queue_url, session)
-        except ClientError as error:
-            if attempt == max_retries - 1:
-                logger.error("Final retry attempt failed: %s", error)
-                raise error
-            sleep_time = 2 ** attempt
-            logger.warning(
-                "Retry attempt %d failed, waiting %ds: %s",
-                attempt + 1,
-                sleep_time,
-                error
-            )
-            time.sleep(sleep_time)
-            continue
-
-        all_results.extend(results)
-
-        # Collect failed messages for retry
-        if not (remaining_messages := _identify_sqs_failed_messages(results, remaining_messages)):
-            logger.info("All messages sent successfully")
-            break
-        if attempt < max_retries - 1:
-            # Exponential backoff
-            sleep_time = 2 ** attempt
-            logger.info(
-                "Retrying %d failed messages after %ds delay",
-                len(remaining_messages),
-                sleep_time
-            )
-            time.sleep(sleep_time)
-
-    if remaining_messages:
-        logger.error(
-            "Failed to send %d messages after %d attempts",
-            len(remaining_messages),
-            max_retries
-        )
-
-    return all_results
-
-def get_queue_depth(queue_url: str, session: Session = default_session) -> dict:
-    """Get current queue depth metrics for throttling decisions
-
-    Args:
-        queue_url: SQS queue URL
-        session: Boto3 session
-
-    Returns:
-        Dictionary with queue depth metrics
-    """
-    sqs_client = session.client('sqs')
-
+    return response['ContentLength']
+
+def s3_range_header(range_start: int|None = None, range_end: int|None = None) -> str|None:
+    """HTTP Range header value for an inclusive byte range, None for the whole object"""
+    if range_start is None and range_end is None:
+        return None
+    return f"bytes={range_start or 0}-{'' if range_end is None else range_end}"
+
+@with_circuit_breaker('s3_get_object')
+def s3_object_stream(bucket_name: str,
+                     object_name: str,
+                     session: Session=default_session,
+                     range_start: int|None = None,
+                     range_end: int|None = None):
+    """Open an S3 object, or an inclusive byte range of it, as a streaming body.
+       The caller is responsible for closing the returned body."""
+    s3_client = get_client('s3', session)
+    kwargs = {'Bucket': bucket_name, 'Key': object_name}
+    if (byte_range := s3_range_header(range_start, range_end)) is not None:
+        kwargs['Range'] = byte_range
     try:
-        response = sqs_client.get_queue_attributes(
-            QueueUrl=queue_url,
-            AttributeNames=[
-                'ApproximateNumberOfMessages',
-                'ApproximateNumberOfMessagesNotVisible',
-                'ApproximateNumberOfMessagesDelayed'
-            ]
-        )
+        response = s3_client.get_object(**kwargs)
     except ClientError as error:
-        logger.error("Failed to get queue attributes for %s: %s", queue_url, error)
-        boto_exception(error, f"With queue_url [{queue_url}]")
+        boto_exception(error, f"With s3 object [{object_name}] bucket [{bucket_name}]")
         raise error
-
-    attrs = response['Attributes']
-
-    visible = int(attrs.get('ApproximateNumberOfMessages', 0))
-    in_flight = int(attrs.get('ApproximateNumberOfMessagesNotVisible', 0))
-    delayed = int(attrs.get('ApproximateNumberOfMessagesDelayed', 0))
-    total = visible + in_flight
-
-    return {
-        'visible': visible,
-        'in_flight': in_flight,
-        'delayed': delayed,
-        'total': total,
-        'queue_url': queue_url
-    }
-
-
-def calculate_optimal_delay(queue_depth: int, base_delay: int = 30) -> int:
-    """Calculate optimal delay based on queue depth for automatic throttling
-
-    Args:
-        queue_depth: Current total queue depth
-        base_delay: Base delay in seconds (default: 30)
-
-    Returns:
-        Recommended delay in seconds
-    """
-    if queue_depth > QUEUE_DEPTH_DELAY_VERY_HIGH:
-        return base_delay * 4  # 2 minutes for very high load
-    if queue_depth > QUEUE_DEPTH_DELAY_HIGH:
-        return base_delay * 2  # 1 minute for high load
-    if queue_depth > QUEUE_DEPTH_DELAY_MEDIUM:
-        return base_delay      # 30 seconds for medium load
-    if queue_depth > QUEUE_DEPTH_DELAY_MEDIUM_LOW:
-        return base_delay // 2 # 15 seconds for low-medium load
-
-    return 0               # No delay for low load
-
-def send_sqs_message_with_throttling(messages: list, queue_url: str,
-                                   session: Session = default_session,
-                                   enable_throttling: bool = True,
-                                   base_delay: int = 30) -> list:
-    """Send messages with automatic throttling based on queue depth
-
-    Args:
-        messages: List of message dictionaries to send
-        queue_url: SQS queue URL
-        session: Boto3 session
-        enable_throttling: Whether to enable automatic throttling
-        base_delay: Base delay for throttling calculations
-
-    Returns:
-        List of SQS batch response dictionaries
-    """
-    if enable_throttling:
-        try:
-            # Check queue depth and calculate delay
-            queue_metrics = get_queue_depth(queue_url, session)
-        except ClientError as e:
-            # If throttling check fails, continue without throttling
-            boto_exception(e, "Throttling check failed, proceeding without delay")
-            queue_metrics = None
-
-        if queue_metrics:
-            delay = calculate_optimal_delay(queue_metrics['total'], base_delay)
-
-            logger.info("Queue throttling check: depth=%d, delay=%ds",
-                        queue_metrics['total'], delay)
-
-            if delay > 0:
-                logger.info(
-                    "Throttling: waiting %d seconds before sending %d messages",
-                    delay,
-                    len(messages)
-                )
-                time.sleep(delay)
-
-    # Send messages in batches with retry
-    return send_sqs_message_batch_with_retry(messages, queue_url, session)
-
-def _get_queue_depth_total(queue_url, session) -> int:
-    """Call into SQS to get the queue's metrics, and summarize to total"""
+    return response['Body']
+
+def s3_object_chunks(bucket_name: str,
+                     object_name: str,
+                     session: Session=default_session,
+                     chunk_size: int=S3_STREAM_CHUNK_SIZE,
+                     range_start: int|None = None,
+                     range_end: int|None = None) -> Iterator[bytes]:
+    """Yield an S3 object in chunks of at most chunk_size bytes"""
+    body = s3_object_stream(bucket_name, object_name, session, range_start, range_end)
     try:
-        queue_metrics = get_queue_depth(queue_url, session)
-    except ClientError as e:
-        boto_exception(e, f"Failed to get queue metrics for {queue_url}, returning 0")
-        return 0
-    return int(queue_metrics['total'])
-
-def _do_adaptive_delay(batch_num, max_queue_depth, current_depth):
-    """Apply an adaptive delay (sleep) if excessive depth"""
-    logger.info(
-        "Adaptive throttling check (batch %d): queue_depth=%d",
-        batch_num,
-        current_depth
-    )
-
-    if current_depth > max_queue_depth:
-        # Calculate adaptive delay based on how far over the limit we are
-        excess_ratio = current_depth / max_queue_depth
-        # Cap at 60 seconds
-        adaptive_delay = min(60, int(30 * excess_ratio))
-
-        logger.info("Queue depth (%d) exceeds limit (%d), waiting %ds",
-                    current_depth, max_queue_depth, adaptive_delay)
-        time.sleep(adaptive_delay)
-
+        yield from body.iter_chunks(chunk_size)
+    finally:
+        body.close()
 
-def send_sqs_message_with_adaptive_throttling(messages: list, queue_url: str,
-                                            session: Session = default_session,
-                                            max_queue_depth: int = 1000,
-                                            check_interval: int = 10) -> list:
-    """Send messages with adaptive throttling that monitors queue depth during processing
-
-    Args:
-        messages: List of message dictionaries to send
-        queue_url: SQS queue URL
-        session: Boto3 session
-        max_queue_depth: Maximum allowed queue depth before throttling
-        check_interval: Number of batches between queue depth checks
-
-    Returns:
-        List of SQS batch response dictionaries
-    """
-    batch_size = 10  # SQS batch limit
-    all_results = []
-
-    logger.info("Starting adaptive throttling send for %d messages", len(messages))
-
-    for i in range(0, len(messages), batch_size):
-        batch = messages[i:i + batch_size]
-        batch_num = (i // batch_size) + 1
-
-        # Check queue depth periodically
-        if batch_num % check_interval == 1:  # Check on first batch and every check_interval batches
-            _do_adaptive_delay(batch_num,
-                               max_queue_depth,
-                               _get_queue_depth_total(queue_url, session))
-
-        # Send the batch
-        try:
-            batch_results = send_sqs_message_batch_with_retry([batch], queue_url, session)
-        except ClientError as e:
-            boto_exception(e, f"Failed to send batch {batch_num}")
-            raise e
-        all_results.extend(batch_results)
-
-        # Small delay between batches to avoid overwhelming
-        if i + batch_size < len(messages):
-            time.sleep(0.1)  # 100ms between batches
-
-    logger.info("Adaptive throttling send completed: %d batch responses", len(all_results))
-    return all_results
+def s3_object_lines(bucket_name: str,
+                    object_name: str,
+                    session: Session=default_session,
+                    keepends: bool=False,
+                    chunk_size: int=S3_STREAM_CHUNK_SIZE,
+                    range_start: int|None = None,
+                    range_end: int|None = None) -> Iterator[bytes]:
+    """Yield an S3 object line by line, holding at most one chunk plus one line in memory"""
+    body = s3_object_stream(bucket_name, object_name, session, range_start, range_end)
+    try:
+        yield from body.iter_lines(chunk_size, keepends)
+    finally:
+        body.close()
 
 @with_circuit_breaker('sqs_get_queue_attributes')
 def verify_queue(queue_url: str, session: Session=default_session) -> bool:
     """Verify the queue exists by attempting to fetch its attributes"""
-    sqs_client =  session.client('sqs')
+    sqs_client = get_client('sqs', session)
     try:
         sqs_client.get_queue_attributes(QueueUrl=queue_url,
                                         AttributeNames=['CreatedTimestamp'])
@@ -475,20 +185,21 @@ def verify_queue(queue_url: str, session: Session=default_session) -> bool:
         raise error
     return True
 
-def get_certificate(certificate_id: str, session: Session=default_session) -> str:
-    """ Verifies that the certificate is in IoT Core """
-    iot_client = session.client('iot')
+def get_certificate(certificate_id: str, session: Session=default_session) -> CertificateRef:
+    """ Verifies that the certificate is in IoT Core, returning its id and ARN """
+    iot_client = get_client('iot', session)
 
     try:
         response = iot_client.describe_certificate(certificateId=certificate_id)
     except ClientError as error:
         boto_exception(error, f"error on finding certificate_id {certificate_id}")
         raise error
-    return response["certificateDescription"].get("certificateId")
+    description = response["certificateDescription"]
+    return CertificateRef(description.get("certificateId"), description.get("certificateArn"))
 
 def get_certificate_arn(certificate_id: str, session: Session=default_session) -> str:
     """ Retrieve the certificate Arn. """
-    iot_client = session.client('iot')
+    iot_client = get_client('iot', session)
 
     try:
         response = iot_client.describe_certificate(certificateId=certificate_id)
@@ -498,7 +209,7 @@ def get_certificate_arn(certificate_id: str, session: Session=default_session) -
     return response["certificateDescription"].get("certificateArn")
 
 def register_certificate(certificate: str,
-                         session: Session=default_session) -> str:
+                         session: Session=default_session) -> CertificateRef:
     """ Register an AWS IoT certificate without a registered CA 
 
     Args:
@@ -506,20 +217,20 @@ def register_certificate(certificate: str,
         session: Boto3 session (when tags are provided)
 
     Returns:
-        Certificate ID
+        Certificate id and ARN from the registration response
     """
-    iot_client = session.client('iot')
+    iot_client = get_client('iot', session)
     try:
         # Register the certificate
+        acquire_rate_limit('iot_register_certificate_without_ca')
         response = iot_client.register_certificate_without_ca(
             certificatePem=certificate,
             status='ACTIVE')
     except ClientError as error:
         boto_exception(error, f"register_certificate failed on certificate {certificate}")
         raise
-    certificate_id = response.get("certificateId")
 
-    return certificate_id
+    return CertificateRef(response.get("certificateId"), response.get("certificateArn"))
 
 def get_thing_group_arn(thing_group_name: str, session: Session=default_session) -> str:
     """ Retrieves the thing group ARN with circuit breaker pattern """
@@ -533,7 +244,7 @@ def get_thing_group_arn(thing_group_name: str, session: Session=default_session)
         logger.warning("Circuit breaker open for %s, failing fast", operation_name)
         raise CircuitOpenError(f"Circuit breaker open for {operation_name}")
 
-    iot_client = session.client('iot')
+    iot_client = get_client('iot', session)
     try:
         response = iot_client.describe_thing_group(thingGroupName=thing_group_name)
     except ClientError as error:
@@ -551,7 +262,7 @@ def get_thing_type_arn(type_name: str, session: Session=default_session) -> str:
     if type_name in {"None", ""}:
         raise ValueError("The thing type value signals that no thing type defined")
 
-    iot_client = session.client('iot')
+    iot_client = get_client('iot', session)
     try:
         response = iot_client.describe_thing_type(thingTypeName=type_name)
     except ClientError as error:
@@ -565,7 +276,7 @@ def get_thing_arn(thing_name: str, session: Session=default_session) -> str:
     if thing_name in {"None", ""}:
         raise ValueError("The thing name value signals that no thing defined")
 
-    iot_client = session.client('iot')
+    iot_client = get_client('iot', session)
     try:
         response = iot_client.describe_thing(thingName=thing_name)
     except ClientError as error:
@@ -581,7 +292,7 @@ def get_policy_arn(policy_name: str,
     if not check_cfn_prop_valid(policy_name):
         raise ValueError("Policy name signals policy not defined")
 
-    iot_client = session.client('iot')
+    iot_client = get_client('iot', session)
 
     try:
         response = iot_client.get_policy(policyName=policy_name)
@@ -597,8 +308,9 @@ def process_thing_group(thing_group_arn: str,
     """ Attaches the configured thing group to the iot thing """
     if thing_group_arn is None:
         return
-    iot_client = session.client('iot')
+    iot_client = get_client('iot', session)
     try:
+        acquire_rate_limit('iot_add_thing_to_thing_group')
         iot_client.add_thing_to_thing_group(thingGroupArn=thing_group_arn,
                                             thingArn=thing_arn,
                                             overrideDynamicGroups=False)
@@ -614,47 +326,54 @@ def process_policy(policy_name: str,
     """ Attaches the IoT policy to the certificate """
     if policy_name is None:
         return
-    iot_client = session.client('iot')
+    iot_client = get_client('iot', session)
     try:
+        acquire_rate_limit('iot_attach_policy')
         iot_client.attach_policy(policyName=policy_name, target=certificate_arn)
     except ClientError as err:
         boto_exception(err, f"Policy {policy_name} failed to attach " \
                             f"to principal {certificate_arn}.")
         raise err
 
-def _verify_thing_exists(thing_name: str,
-                  session: Session=default_session) -> bool:
-    """ A basic check on whether or not an IoT Thing is defined in the IoT registry """
-    iot_client = session.client('iot')
+def _describe_thing_arn(thing_name: str,
+                        session: Session=default_session) -> str|None:
+    """ Look up the thing in the IoT registry, returning its ARN or None when not defined """
+    iot_client = get_client('iot', session)
     try:
-        iot_client.describe_thing(thingName=thing_name)
+        response = iot_client.describe_thing(thingName=thing_name)
     except ClientError as err_describe:
         boto_exception(err_describe, f"Thing {thing_name} not found in the IoT registry.")
-        return False
+        return None
     logger.info("Thing %s found in the IoT registry", thing_name)
-    return True
+    return response.get('thingArn')
 
 def process_thing(thing_name: str,
                   certificate_arn: str,
-                  session: Session=default_session) -> None:
+                  session: Session=default_session) -> ThingRef:
     """Creates the IoT Thing if it does not already exist and attaches certificate
 
     Args:
         thing_name: Name of the IoT Thing to create
         certificate_arn: Certificate ID to attach to the thing
         session: Boto3 session
+
+    Returns:
+        Thing name and ARN, taken from describe_thing or create_thing
     """
     logger.info("Processing thing %s.", thing_name)
-    iot_client = session.client('iot')
+    iot_client = get_client('iot', session)
 
-    if not _verify_thing_exists(thing_name, session):
+    if (thing_arn := _describe_thing_arn(thing_name, session)) is None:
         try:
-            iot_client.create_thing(thingName=thing_name)
+            acquire_rate_limit('iot_create_thing')
+            response = iot_client.create_thing(thingName=thing_name)
         except ClientError as err_create:
             boto_exception(err_create, f"Thing {thing_name} creation failed")
             raise err_create
+        thing_arn = response.get('thingArn')
+        logger.info("Created thing %s", thing_name)
 
-    logger.info("Created thing %s", thing_name)
+    thing = ThingRef(thing_name, thing_arn)
 
     # Always attempt to attach certificate, whether thing existed or was just created
     try:
@@ -664,17 +383,20 @@ def process_thing(thing_name: str,
         logger.warning("Could not list thing principals for %s: %s."
                         "Attempting attachment anyway.",
                         thing_name, str(list_error))
+        acquire_rate_limit('iot_attach_thing_principal')
         iot_client.attach_thing_principal(thingName=thing_name, principal=certificate_arn)
         logger.info("Attached certificate %s to thing %s", certificate_arn, thing_name)
+        return thing
 
     attached_principals = principals_response.get('principals', [])
 
     if certificate_arn in attached_principals:
         logger.info("Certificate %s already attached to thing %s",
                     certificate_arn, thing_name)
-        return
+        return thing
 
     try:
+        acquire_rate_limit('iot_attach_thing_principal')
         iot_client.attach_thing_principal(thingName=thing_name, principal=certificate_arn)
     except ClientError as error:
         if boto_errorcode(error) == 'ResourceAlreadyExistsException':
@@ -684,12 +406,13 @@ def process_thing(thing_name: str,
             raise error
 
     logger.info("Attached certificate %s to thing %s", certificate_arn, thing_name)
+    return thing
 
 def process_thing_type(thing_name: str,
                        thing_type_name: str|None,
                        session: Session=default_session) -> None:
     """ Process the thing type request which applies the thing type to the iot thing """
-    iot_client = session.client('iot')
+    iot_client = get_client('iot', session)
 
     if thing_type_name is None:
         return
@@ -698,6 +421,7 @@ def process_thing_type(thing_name: str,
                 thing_name,
                 thing_type_name)
     try:
+        acquire_rate_limit('iot_update_thing')
         iot_client.update_thing(thingName=thing_name,
                                 thingTypeName=thing_type_name,
                                 removeThingType=False)
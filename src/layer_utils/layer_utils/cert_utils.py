@@ -6,9 +6,10 @@ Certificate/manifest related routines that multiple lambda functions use,
 here to reduce redundancy
 """
 import binascii
+import hashlib
 import logging
-from ast import literal_eval
 from base64 import b64decode, b64encode
+from typing import NamedTuple
 
 from cryptography import x509
 from cryptography.hazmat.backends import default_backend
@@ -19,6 +20,9 @@ from cryptography.x509.oid import NameOID
 logger = logging.getLogger()
 logger.setLevel("INFO")
 
+PEM_CERTIFICATE_BEGIN = b"-----BEGIN CERTIFICATE-----"
+PEM_CERTIFICATE_END = b"-----END CERTIFICATE-----"
+
 def format_certificate(cert_string):
     """Encode certificate so that it can safely travel via sqs"""
     cert_encoded = cert_string.encode('ascii')
@@ -82,9 +86,68 @@ def get_cn(cert_data: str | bytes) -> str:
     return cn
 
 def decode_certificate(b64_encoded_cert: str) -> str:
-    """A decoding mechanism that is required when receiving a certificate via SQS message"""
-    return b64decode(literal_eval(b64_encoded_cert)).decode('ascii')
+    """A decoding mechanism that is required when receiving a certificate via SQS message
+    in the legacy format, the str() of the base64 encoded PEM bytes"""
+    if b64_encoded_cert[:2] in ("b'", 'b"') and b64_encoded_cert[-1:] == b64_encoded_cert[1]:
+        # Base64 text needs no escaping, so the repr is just the quoted text
+        b64_encoded_cert = b64_encoded_cert[2:-1]
+    return b64decode(b64_encoded_cert, validate=True).decode('ascii')
 
 def get_certificate_fingerprint(certificate: x509.Certificate) -> str:
     """Retrieve the certificate fingerprint"""
     return binascii.hexlify(certificate.fingerprint(hashes.SHA256())).decode('UTF-8')
+
+def pem_blocks(cert_data: bytes) -> list[bytes]:
+    """Base64 bodies of the PEM certificate blocks in cert_data, whitespace removed.
+    Each body is the base64 encoding of the certificate's DER bytes."""
+    blocks = []
+    start = cert_data.find(PEM_CERTIFICATE_BEGIN)
+    while start >= 0:
+        start += len(PEM_CERTIFICATE_BEGIN)
+        end = cert_data.find(PEM_CERTIFICATE_END, start)
+        if end < 0:
+            break
+        blocks.append(b''.join(cert_data[start:end].split()))
+        start = cert_data.find(PEM_CERTIFICATE_BEGIN, end + len(PEM_CERTIFICATE_END))
+    return blocks
+
+def der_to_pem(der_b64: str) -> str:
+    """PEM text of a certificate from the base64 encoding of its DER bytes"""
+    lines = [der_b64[i:i + 64] for i in range(0, len(der_b64), 64)]
+    return "\n".join([PEM_CERTIFICATE_BEGIN.decode(), *lines,
+                      PEM_CERTIFICATE_END.decode()]) + "\n"
+
+class CertificateInfo(NamedTuple):
+    """What a provider needs from a certificate, read from a single parse"""
+    thing_name: str
+    fingerprint: str
+    # Base64 of the DER encoding, for the leaf and any further PEM blocks
+    certificate: str
+    chain: tuple[str, ...] = ()
+
+def certificate_info(cert_data: bytes) -> CertificateInfo:
+    """Parse a PEM certificate once for its thing name and SHA-256 fingerprint.
+
+    The DER encoding is taken from the PEM text rather than re-serialized, and
+    the fingerprint is the digest of those bytes. Certificates after the first
+    PEM block are carried along as the chain without being parsed.
+    """
+    blocks = pem_blocks(cert_data)
+    if not blocks:
+        certificate = load_certificate(cert_data)
+        encoded = b64encode(certificate.public_bytes(serialization.Encoding.DER))
+    else:
+        encoded = blocks[0]
+    try:
+        der = b64decode(encoded, validate=True)
+        if blocks:
+            certificate = x509.load_der_x509_certificate(der)
+    except ValueError as ve:
+        logger.error("Certificate data is malformed: %s", ve)
+        raise
+    try:
+        cn = get_cn_value(certificate)
+    except IndexError:
+        cn = generate_random_cn(cert_data)
+    return CertificateInfo(cn, hashlib.sha256(der).hexdigest(), encoded.decode('ascii'),
+                           tuple(block.decode('ascii') for block in blocks[1:]))
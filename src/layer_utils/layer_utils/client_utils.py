@@ -0,0 +1,87 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Pooled boto3 clients shared by the layer's modules
+
+Kept free of other layer imports so that any module, including those
+aws_utils itself depends on, can obtain a client.
+"""
+from os import environ
+from threading import Lock
+from weakref import WeakKeyDictionary
+from boto3 import Session
+from botocore.config import Config
+
+default_session: Session = Session()
+
+# Connections kept alive per pooled client; botocore defaults to 10
+DEFAULT_MAX_POOL_CONNECTIONS: int = int(environ.get("CLIENT_MAX_POOL_CONNECTIONS", 50))
+
+def client_config(max_pool_connections: int = DEFAULT_MAX_POOL_CONNECTIONS) -> Config:
+    """ Default configuration for each boto3 client """
+    return Config(
+        retries = {
+            'max_attempts': 3,
+            'mode': 'standard'
+        },
+        max_pool_connections=max_pool_connections,
+        tcp_keepalive=True
+    )
+
+class ClientPool:
+    """Process-wide pool of boto3 clients.
+
+    Clients are created once per (session, service, region, config) and reused
+    across invocations of a warm container. Creation is serialized since
+    Session.client is not thread-safe; the clients themselves are.
+    """
+    def __init__(self):
+        self._clients: WeakKeyDictionary = WeakKeyDictionary()
+        self._lock: Lock = Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @staticmethod
+    def _config_key(config: Config) -> tuple:
+        """Hashable representation of the options set on a botocore Config"""
+        # pylint: disable=protected-access
+        return tuple(sorted((k, repr(v)) for k, v in config._user_provided_options.items()))
+
+    def get(self, service_name: str, session: Session,
+            region_name: str|None = None, config: Config|None = None):
+        """Return the pooled client for the key, creating it on first use"""
+        config = config or client_config()
+        region_name = region_name or session.region_name
+        key = (service_name, region_name, self._config_key(config))
+
+        with self._lock:
+            session_clients = self._clients.setdefault(session, {})
+            if (client := session_clients.get(key)) is not None:
+                self.hits += 1
+                return client
+            self.misses += 1
+            client = session.client(service_name, region_name=region_name, config=config)
+            session_clients[key] = client
+            return client
+
+    def stats(self) -> dict[str, int]:
+        """Hit/miss counters and the number of pooled clients"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'clients': sum(len(c) for c in self._clients.values())
+            }
+
+    def clear(self) -> None:
+        """Drop all pooled clients and reset the counters"""
+        with self._lock:
+            self._clients.clear()
+            self.hits = 0
+            self.misses = 0
+
+client_pool: ClientPool = ClientPool()
+
+def get_client(service_name: str, session: Session=default_session,
+               region_name: str|None = None, config: Config|None = None):
+    """Retrieve a pooled boto3 client for the service"""
+    return client_pool.get(service_name, session, region_name, config)
@@ -0,0 +1,89 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Incremental JSON handling routines
+
+Manifests that are a single top-level JSON array can be parsed element by
+element while they stream in, so memory is bounded by the largest element
+rather than by the manifest.
+"""
+import codecs
+from collections.abc import Iterable, Iterator
+from json import JSONDecoder, JSONDecodeError
+from typing import Any
+
+_WHITESPACE = ' \t\n\r'
+# Characters that may carry a number on past the point the decoder stopped,
+# such as the '.' of a fraction or the 'e' of an exponent whose digits are
+# still to come
+_NUMBER_CHARS = frozenset('0123456789.eE+-')
+# Consumed text is dropped from the buffer once this much has accumulated
+_COMPACT_THRESHOLD = 64 * 1024
+
+def _number_may_continue(value: Any, buffer: str, end: int) -> bool:
+    """True when the text from end to the end of the buffer could still be part of
+    the number just decoded, so more input is needed before it is complete"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return end == len(buffer)
+    return all(char in _NUMBER_CHARS for char in buffer[end:])
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """Yield the elements of a top-level UTF-8 JSON array from a stream of byte chunks.
+
+    Chunks may split the document anywhere, including inside a multi-byte
+    character. Text after the closing bracket is not read.
+
+    Raises:
+        ValueError: If the document is not a well formed JSON array
+    """
+    decoder = JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8')()
+    source = iter(chunks)
+    buffer = ''
+    pos = 0
+    eof = False
+    expect = '['
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+
+        if pos < len(buffer):
+            char = buffer[pos]
+            if expect == '[':
+                if char != '[':
+                    raise ValueError(f"Expected JSON array, found {char!r}")
+                pos += 1
+                expect = 'first'
+                continue
+            if expect == 'separator' or expect == 'first' and char == ']':
+                if char == ']':
+                    return
+                if char != ',':
+                    raise ValueError(f"Expected ',' or ']' in JSON array, found {char!r}")
+                pos += 1
+                expect = 'value'
+                continue
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except JSONDecodeError as e:
+                if eof:
+                    raise ValueError(f"Malformed JSON array element: {e}") from e
+            else:
+                # A number running to the end of the buffer may have digits,
+                # a fraction or an exponent still to come
+                if eof or not _number_may_continue(value, buffer, end):
+                    yield value
+                    pos = end
+                    expect = 'separator'
+                    continue
+        elif eof:
+            raise ValueError("Unexpected end of JSON array")
+
+        if pos > _COMPACT_THRESHOLD:
+            buffer, pos = buffer[pos:], 0
+        chunk = next(source, None)
+        if chunk is None:
+            eof = True
+            buffer += text.decode(b'', final=True)
+        else:
+            buffer += text.decode(chunk)
@@ -0,0 +1,140 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Bulk importer message encoding
+
+Version 2 messages carry the certificate as base64 DER, encoded once, along
+with the fingerprint the provider computed. They hold only the configuration
+the importer reads, not the provider's manifest and chunk details:
+
+    {"v": 2, "thing": ..., "der": ..., "fp": ..., "chain": [...],
+     "policies": [...], "thing_groups": [...], "thing_type_name": ...}
+
+Messages without a version are the legacy format, where "certificate" is the
+str() of the base64 encoded PEM bytes. The importer accepts both.
+
+With IMPORTER_PACK_SIZE above 1, version 2 messages sharing a configuration
+are packed several to an SQS message, the configuration stored once:
+
+    {"v": 2, "certs": [{"thing": ..., "der": ..., "fp": ...}, ...],
+     "policies": [...], "thing_groups": [...], "thing_type_name": ...}
+"""
+import os
+import re
+from json import dumps
+
+from .aws_utils import ImporterMessageKey
+from .cert_utils import CertificateInfo, decode_certificate, der_to_pem
+
+MESSAGE_VERSION = 2
+
+# Certificates per SQS message; 1 sends each certificate in its own message
+PACK_SIZE = int(os.environ.get("IMPORTER_PACK_SIZE", 1))
+# Packed message size cap, so that ten of them fit one 256 KiB SendMessageBatch
+PACK_MAX_BYTES = int(os.environ.get("IMPORTER_PACK_MAX_BYTES", 24 * 1024))
+# SendMessageBatch requests' worth of certificates a provider collects before
+# each send, so that they can be sent concurrently
+SEND_BATCHES = int(os.environ.get("IMPORTER_SEND_BATCHES", 1))
+# Certificates a provider collects before each send
+IMPORTER_BATCH_SIZE = 10 * max(PACK_SIZE, 1) * max(SEND_BATCHES, 1)
+
+_FINGERPRINT = re.compile(r'[0-9a-f]{64}')
+
+# Configuration keys the importer reads; anything else stays with the provider
+IMPORTER_CONFIG_KEYS = (
+    ImporterMessageKey.POLICIES.value,
+    ImporterMessageKey.THING_GROUPS.value,
+    ImporterMessageKey.THING_TYPE_NAME.value,
+    ImporterMessageKey.POLICY_NAME.value,
+    ImporterMessageKey.THING_GROUP_ARN.value,
+)
+
+def importer_message(config: dict, info: CertificateInfo, thing_name: str|None = None) -> dict:
+    """Compact importer message for one certificate.
+    thing_name overrides the certificate CN when the manifest names the device.
+
+    The configuration values are the provider config's own objects, so the
+    messages of a file refer to one set of policies and thing groups rather
+    than each holding a copy. They are written once per SQS message, which is
+    once per certificate unless pack_messages groups them.
+    """
+    message = {key: config[key] for key in IMPORTER_CONFIG_KEYS if key in config}
+    message[ImporterMessageKey.VERSION.value] = MESSAGE_VERSION
+    message[ImporterMessageKey.THING_NAME.value] = thing_name or info.thing_name
+    message[ImporterMessageKey.CERTIFICATE_DER.value] = info.certificate
+    message[ImporterMessageKey.FINGERPRINT.value] = info.fingerprint
+    if info.chain:
+        message[ImporterMessageKey.CERTIFICATE_CHAIN.value] = list(info.chain)
+    return message
+
+def message_version(message: dict) -> int:
+    """Format version of an importer message; legacy messages are version 1"""
+    return message.get(ImporterMessageKey.VERSION.value, 1)
+
+def message_certificate(message: dict) -> str:
+    """PEM text of the certificate, followed by any chain, from either format"""
+    if message_version(message) == 1:
+        return decode_certificate(message[ImporterMessageKey.CERTIFICATE.value])
+    return "".join(der_to_pem(der) for der in
+                   [message[ImporterMessageKey.CERTIFICATE_DER.value],
+                    *message.get(ImporterMessageKey.CERTIFICATE_CHAIN.value, [])])
+
+def message_certificate_key(message: dict) -> str|None:
+    """Text that identifies the certificate of a message without decoding it"""
+    if message_version(message) == 1:
+        return message.get(ImporterMessageKey.CERTIFICATE.value)
+    return message.get(ImporterMessageKey.CERTIFICATE_DER.value)
+
+def message_fingerprint(message: dict) -> str|None:
+    """SHA-256 fingerprint the provider computed, if the message carries a well formed one"""
+    fingerprint = message.get(ImporterMessageKey.FINGERPRINT.value)
+    if isinstance(fingerprint, str) and _FINGERPRINT.fullmatch(fingerprint):
+        return fingerprint
+    return None
+
+def _shared_config(message: dict) -> dict:
+    return {key: message[key] for key in IMPORTER_CONFIG_KEYS if key in message}
+
+def pack_messages(messages: list[dict], pack_size: int|None = None,
+                  max_bytes: int|None = None) -> list[dict]:
+    """Pack consecutive version 2 messages with the same configuration into
+    messages of up to pack_size certificates and about max_bytes of JSON.
+    Legacy messages, and a certificate too large to share a message, are sent alone."""
+    pack_size = PACK_SIZE if pack_size is None else pack_size
+    max_bytes = PACK_MAX_BYTES if max_bytes is None else max_bytes
+    if pack_size <= 1:
+        return messages
+
+    packed: list[dict] = []
+    certificates: list[dict]|None = None
+    pack_config: dict = {}
+    size = 0
+    for message in messages:
+        if message_version(message) == 1:
+            packed.append(message)
+            certificates = None
+            continue
+        shared = _shared_config(message)
+        entry = {key: value for key, value in message.items()
+                 if key not in shared and key != ImporterMessageKey.VERSION.value}
+        entry_size = len(dumps(entry)) + 2
+        # Messages from one provider config share its values, so this is
+        # normally settled by identity without walking the lists
+        if certificates is None or len(certificates) >= pack_size or \
+                size + entry_size > max_bytes or pack_config != shared:
+            pack_config = shared
+            certificates = []
+            pack = shared | {ImporterMessageKey.VERSION.value: MESSAGE_VERSION,
+                             ImporterMessageKey.CERTIFICATES.value: certificates}
+            size = len(dumps(pack))
+            packed.append(pack)
+        certificates.append(entry)
+        size += entry_size
+    return packed
+
+def unpack_message(message: dict) -> list[dict]:
+    """The single certificate messages held by a message, packed or not"""
+    if (certificates := message.get(ImporterMessageKey.CERTIFICATES.value)) is None:
+        return [message]
+    shared = _shared_config(message)
+    shared[ImporterMessageKey.VERSION.value] = message_version(message)
+    return [shared | entry for entry in certificates]
@@ -0,0 +1,240 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Token bucket rate limiting for AWS control-plane calls
+
+IoT Core enforces per-API transactions-per-second quotas. Calls are paced to a
+configured rate before they are made, rather than relying on throttling errors
+and retries to find the limit.
+
+Each operation has its own bucket. The rate, in requests per second, comes from
+the environment variable RATE_LIMIT_<OPERATION> (for example
+RATE_LIMIT_IOT_CREATE_THING), falling back to DEFAULT_RATES. A rate of 0
+disables limiting for that operation.
+
+By default each Lambda container paces itself, so the rates should be the
+quota divided by the function's concurrency. When RATE_LIMIT_TABLE names a
+DynamoDB table (the idempotency table suits), the buckets are shared by every
+container and the rates are the account-wide quotas. Tokens are leased from
+the table RATE_LIMIT_LEASE at a time to keep the table traffic low. While the
+table cannot be used a container limits itself locally, trying the table again
+every RATE_LIMIT_FALLBACK_COOLDOWN seconds.
+"""
+import logging
+import math
+import os
+import random
+import time
+from threading import Lock
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from .client_utils import get_client
+
+logger = logging.getLogger()
+logger.setLevel("INFO")
+
+# Requests per second. Conservative starting points; set them to the account's
+# IoT Core quotas from Service Quotas.
+DEFAULT_RATES: dict[str, float] = {
+    'iot_register_certificate_without_ca': 10,
+    'iot_create_thing': 50,
+    'iot_attach_thing_principal': 50,
+    'iot_attach_policy': 50,
+    'iot_add_thing_to_thing_group': 50,
+    'iot_update_thing': 50,
+}
+
+RATE_LIMIT_TABLE: str|None = os.environ.get("RATE_LIMIT_TABLE") or None
+RATE_LIMIT_LEASE: int = int(os.environ.get("RATE_LIMIT_LEASE", 5))
+# Shared bucket items are removed by the table's TTL once no longer refreshed
+RATE_LIMIT_ITEM_TTL: int = 3600
+# Seconds a container limits itself locally before trying the table again
+RATE_LIMIT_FALLBACK_COOLDOWN: float = float(os.environ.get("RATE_LIMIT_FALLBACK_COOLDOWN", 60))
+# Attempts at a throttled or failing table before falling back, and the base
+# of the full jitter backoff between them and after a lost conditional write
+RATE_LIMIT_RETRIES: int = 3
+RATE_LIMIT_RETRY_DELAY: float = 0.05
+
+# DynamoDB errors worth retrying; any other means the table is unusable
+_RETRYABLE_ERRORS = frozenset({
+    'ProvisionedThroughputExceededException',
+    'ThrottlingException',
+    'RequestLimitExceeded',
+    'InternalServerError',
+    'ServiceUnavailable',
+})
+
+_buckets: dict = {}
+_buckets_lock: Lock = Lock()
+
+def operation_rate(operation_name: str) -> float:
+    """Configured requests per second for an operation; 0 when not limited"""
+    value = os.environ.get(f"RATE_LIMIT_{operation_name.upper()}")
+    if value is None:
+        return DEFAULT_RATES.get(operation_name, 0)
+    return float(value)
+
+def _retryable(error: Exception) -> bool:
+    """True for throttling, server and connection errors, which pass with time"""
+    if isinstance(error, ClientError):
+        return error.response['Error']['Code'] in _RETRYABLE_ERRORS or \
+            error.response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0) >= 500
+    return isinstance(error, BotoCoreError)
+
+class TokenBucket:
+    """Thread safe token bucket for one container.
+
+    A caller reserves a token even when the bucket is empty and then sleeps
+    until the token would have been added, so concurrent callers are served
+    in order at the configured rate.
+
+    Attributes:
+        rate (float): Tokens added per second
+        capacity (float): Largest burst allowed after an idle period
+    """
+    def __init__(self, rate: float, capacity: float|None = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = Lock()
+
+    def reserve(self, tokens: float = 1) -> float:
+        """Take tokens, returning the seconds to wait before using them"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens
+            return max(-self.tokens / self.rate, 0.0)
+
+    def acquire(self, tokens: float = 1) -> None:
+        """Block until tokens are available"""
+        if (wait := self.reserve(tokens)) > 0:
+            time.sleep(wait)
+
+class SharedTokenBucket:
+    """Token bucket held in a DynamoDB item and shared by all containers.
+
+    Tokens are leased in blocks with an optimistic conditional write and spent
+    locally. A lost write or a throttled table is retried with backoff. If the
+    table still cannot be used the bucket limits locally at the same rate for
+    RATE_LIMIT_FALLBACK_COOLDOWN seconds rather than blocking the caller.
+    """
+    def __init__(self, operation_name: str, rate: float, table_name: str,
+                 client=None, lease: int = RATE_LIMIT_LEASE):
+        self.key = f"rate_limit#{operation_name}"
+        self.rate = rate
+        self.capacity = max(rate, 1)
+        self.table_name = table_name
+        self.lease = max(1, min(lease, int(self.capacity)))
+        self.leased = 0
+        self._client = client
+        self._fallback: TokenBucket|None = None
+        self._fallback_until = 0.0
+        self._lock = Lock()
+
+    @property
+    def client(self):
+        """DynamoDB client, created on first use"""
+        if self._client is None:
+            self._client = get_client('dynamodb')
+        return self._client
+
+    def _take(self, wanted: int) -> tuple[int, float]:
+        """Lease up to wanted tokens from the table.
+        Returns the tokens granted and, when none were, the seconds until one is due."""
+        response = self.client.get_item(TableName=self.table_name,
+                                        Key={'id': {'S': self.key}},
+                                        ConsistentRead=True)
+        now = time.time()
+        item = response.get('Item')
+        if item is None:
+            tokens, condition, values = self.capacity, 'attribute_not_exists(id)', {}
+        else:
+            previous = item['updated']['N']
+            elapsed = max(now - float(previous), 0.0)
+            tokens = min(self.capacity, float(item['tokens']['N']) + elapsed * self.rate)
+            condition, values = 'updated = :previous', {':previous': {'N': previous}}
+
+        # Allow for rounding in the refill so a due token is not missed
+        if (granted := min(wanted, math.floor(tokens + 1e-6))) < 1:
+            return 0, (1 - tokens) / self.rate
+
+        try:
+            self.client.put_item(
+                TableName=self.table_name,
+                Item={'id': {'S': self.key},
+                      'tokens': {'N': repr(tokens - granted)},
+                      'updated': {'N': repr(now)},
+                      'expiration': {'N': str(int(now) + RATE_LIMIT_ITEM_TTL)}},
+                ConditionExpression=condition,
+                **({'ExpressionAttributeValues': values} if values else {}))
+        except ClientError as error:
+            if error.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            # Another container updated the bucket first; read it again after
+            # a jittered pause so the racers do not collide once more
+            return 0, random.uniform(0, RATE_LIMIT_RETRY_DELAY)
+        return granted, 0.0
+
+    def _fall_back(self, error: Exception) -> TokenBucket:
+        """Limit locally until the cooldown has passed"""
+        logger.warning("Shared rate limit for %s unavailable, limiting locally for %ss: %s",
+                       self.key, RATE_LIMIT_FALLBACK_COOLDOWN, error)
+        if self._fallback is None:
+            self._fallback = TokenBucket(self.rate, self.capacity)
+        self._fallback_until = time.monotonic() + RATE_LIMIT_FALLBACK_COOLDOWN
+        return self._fallback
+
+    def _acquire_shared(self, tokens: int) -> TokenBucket|None:
+        """Take tokens from the shared bucket, or return the local bucket to
+        take them from when the table cannot be used"""
+        failures = 0
+        while self.leased < tokens:
+            try:
+                granted, wait = self._take(self.lease)
+            except (ClientError, BotoCoreError) as error:
+                failures += 1
+                if not _retryable(error) or failures >= RATE_LIMIT_RETRIES:
+                    return self._fall_back(error)
+                granted, wait = 0, random.uniform(0, RATE_LIMIT_RETRY_DELAY * 2 ** failures)
+            self.leased += granted
+            if wait > 0:
+                time.sleep(wait)
+        self.leased -= tokens
+        return None
+
+    def acquire(self, tokens: int = 1) -> None:
+        """Block until tokens are available from the shared bucket"""
+        with self._lock:
+            if time.monotonic() < self._fallback_until:
+                local = self._fallback
+            else:
+                local = self._acquire_shared(tokens)
+        if local is not None:
+            local.acquire(tokens)
+
+def rate_limiter(operation_name: str) -> TokenBucket|SharedTokenBucket|None:
+    """The bucket for an operation, or None when the operation is not limited"""
+    with _buckets_lock:
+        if operation_name not in _buckets:
+            rate = operation_rate(operation_name)
+            if rate <= 0:
+                _buckets[operation_name] = None
+            elif RATE_LIMIT_TABLE:
+                _buckets[operation_name] = SharedTokenBucket(operation_name, rate,
+                                                             RATE_LIMIT_TABLE)
+            else:
+                _buckets[operation_name] = TokenBucket(rate)
+        return _buckets[operation_name]
+
+def acquire_rate_limit(operation_name: str) -> None:
+    """Wait for the operation's rate limit before making the call"""
+    if (bucket := rate_limiter(operation_name)) is not None:
+        bucket.acquire()
+
+def clear_rate_limiters():
+    """ Clears all rate limiters """
+    with _buckets_lock:
+        _buckets.clear()
@@ -0,0 +1,428 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""SQS send and queue depth functions shared by the providers
+
+Messages are sent with SendMessageBatch, grouped into as few requests as the
+entry and payload limits allow, with several requests in flight at once.
+"""
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from json import dumps, JSONDecodeError
+from logging import getLogger
+from os import environ
+from typing import Callable, NamedTuple
+from boto3 import Session
+from botocore.exceptions import ClientError
+from .aws_utils import SqsMessageStatus, boto_errorcode, boto_errormessage, boto_exception
+from .circuit_state import with_circuit_breaker
+from .client_utils import default_session, get_client
+
+logger = getLogger()
+logger.setLevel("INFO")
+
+# SendMessageBatch limits: entries per request and total payload bytes
+SQS_BATCH_MAX_ENTRIES: int = 10
+SQS_BATCH_MAX_BYTES: int = 256 * 1024
+# SendMessageBatch requests kept in flight by send_sqs_message_batch_with_retry
+SQS_SEND_CONCURRENCY: int = int(environ.get("SQS_SEND_CONCURRENCY", 4))
+# Full jitter backoff bounds, in seconds, between send attempts for failed messages
+SQS_RETRY_BASE_DELAY: float = 0.5
+SQS_RETRY_MAX_DELAY: float = 20.0
+
+QUEUE_DEPTH_DELAY_VERY_HIGH: int = 2000
+QUEUE_DEPTH_DELAY_HIGH = 1000
+QUEUE_DEPTH_DELAY_MEDIUM = 500
+QUEUE_DEPTH_DELAY_MEDIUM_LOW = 100
+QUEUE_DEPTH_DELAY_LOW = 0
+
+@with_circuit_breaker('sqs_send_message')
+def send_sqs_message(config, queue_url, session: Session=default_session):
+    """Send the thing name and certificate to sqs queue"""
+    sqs_client = get_client('sqs', session)
+
+    try:
+        message_body = dumps(config)
+    except JSONDecodeError as e:
+        logger.error("Unexpected problem loading config file:\n%s", config)
+        raise e
+
+    try:
+        response = sqs_client.send_message(QueueUrl=queue_url,
+                                           MessageBody=message_body)
+    except ClientError as error:
+        boto_exception(error, "With queue_url [{queue_url}]")
+        raise error
+    return response
+
+def send_sqs_message_batch_prepare(batch_number, batch):
+    """Helper for send_sqs_message_batch_with_retry
+       Organizes a message batch. """
+    entries = []
+    for idx, message in enumerate(batch):
+
+        entry_id = str(batch_number + idx)
+        entries.append({
+            'Id': entry_id,
+            'MessageBody': dumps(message),
+            'MessageAttributes': {
+                'BatchIndex': {
+                    'StringValue': entry_id,
+                    'DataType': 'Number'
+                }
+            }
+        })
+    return entries
+
+def _sqs_entry_size(entry: dict) -> int:
+    """Bytes an entry counts towards the SendMessageBatch payload limit"""
+    size = len(entry['MessageBody'].encode('utf-8'))
+    for name, attribute in entry.get('MessageAttributes', {}).items():
+        size += len(name) + len(attribute['DataType']) + len(attribute['StringValue'])
+    return size
+
+def sqs_entry_batches(entries: list[dict],
+                      max_entries: int = SQS_BATCH_MAX_ENTRIES,
+                      max_bytes: int = SQS_BATCH_MAX_BYTES) -> list[list[dict]]:
+    """Group batch entries, in order, into SendMessageBatch requests within
+    the entry count and payload size limits"""
+    batches = []
+    batch = []
+    batch_bytes = 0
+    for entry in entries:
+        size = _sqs_entry_size(entry)
+        if batch and (len(batch) == max_entries or batch_bytes + size > max_bytes):
+            batches.append(batch)
+            batch, batch_bytes = [], 0
+        batch.append(entry)
+        batch_bytes += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+def _send_sqs_batches(batches: list[list[dict]], queue_url: str, session: Session,
+                      max_workers: int) -> list[dict|ClientError]:
+    """Send SendMessageBatch requests, up to max_workers at once.
+    Returns each request's response, or the ClientError it raised, in request order."""
+    sqs_client = get_client('sqs', session)
+
+    def send_batch(entries: list[dict]) -> dict|ClientError:
+        try:
+            return sqs_client.send_message_batch(QueueUrl=queue_url, Entries=entries)
+        except ClientError as error:
+            logger.error("SQS batch send failed for batch starting at index %s: %s",
+                         entries[0]['Id'], error)
+            boto_exception(error, f"With queue_url [{queue_url}]")
+            return error
+
+    if max_workers > 1 and len(batches) > 1:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+            return list(executor.map(send_batch, batches))
+    return [send_batch(entries) for entries in batches]
+
+class SqsSendFailure(NamedTuple):
+    """A message that could not be sent to SQS"""
+    message: dict
+    entry_id: str
+    code: str
+    error_message: str
+    sender_fault: bool
+
+class SqsSendError(Exception):
+    """Raised when messages could not be sent to SQS and no failure sink was given.
+
+    Attributes:
+        failures (list): SqsSendFailure for each message not sent, in message order
+    """
+    def __init__(self, failures: list[SqsSendFailure]):
+        self.failures = failures
+        super().__init__(f"{len(failures)} message(s) could not be sent to SQS: " +
+                         ", ".join(f"{f.entry_id} {f.code}" for f in failures))
+
+def sqs_retry_delay(attempt: int) -> float:
+    """Full jitter exponential backoff before retry attempt (1 based)"""
+    return random.uniform(0, min(SQS_RETRY_MAX_DELAY, SQS_RETRY_BASE_DELAY * 2 ** attempt))
+
+def _sqs_batch_failures(batches: list[list[dict]], results: list[dict|ClientError],
+                        messages: list) -> list[SqsSendFailure]:
+    """Every entry that was not sent, whether its request failed or only the entry did"""
+    failures = []
+    for entries, result in zip(batches, results):
+        if isinstance(result, ClientError):
+            # SenderFault is reported per entry; a failed request is treated as
+            # retryable, the error being raised once the attempts run out
+            failures.extend(SqsSendFailure(messages[int(entry['Id'])], entry['Id'],
+                                           boto_errorcode(result), boto_errormessage(result),
+                                           False)
+                            for entry in entries)
+            continue
+        failures.extend(SqsSendFailure(messages[int(failure['Id'])], failure['Id'],
+                                       failure.get('Code', ''), failure.get('Message', ''),
+                                       failure.get('SenderFault', False))
+                        for failure in result.get(SqsMessageStatus.FAILED.value, []))
+    return failures
+
+@with_circuit_breaker('sqs_send_message_batch_with_retry')
+def send_sqs_message_batch_with_retry(messages: list, queue_url: str,
+                                    session: Session=default_session, max_retries: int = 3,
+                                    failure_sink: Callable[[list[SqsSendFailure]], None]|None
+                                        = None):
+    """Send messages in batches, retrying only the messages that failed
+
+    Each message keeps its index as its entry Id on every attempt, so a
+    failure always maps back to the right message. Retries wait with jittered
+    exponential backoff. Messages SQS rejects as the sender's fault are not
+    retried.
+
+    Args:
+        messages: List of message dictionaries to send
+        queue_url: SQS queue URL
+        session: Boto3 session
+        max_retries: Maximum number of send attempts for each message
+        failure_sink: Called once with the messages that could not be sent,
+            for example to write them to a dead letter queue or spill file.
+            Without one the function raises instead, so that the caller's own
+            message is returned to its queue and retried.
+
+    Returns:
+        List of SQS batch response dictionaries from every attempt
+
+    Raises:
+        ValueError: If max_retries is less than 1
+        ClientError: If the final attempt's request failed and there is no failure_sink
+        SqsSendError: If any other message could not be sent and there is no failure_sink
+    """
+    if max_retries < 1:
+        raise ValueError(f"max_retries must be at least 1, got {max_retries}")
+    entries = send_sqs_message_batch_prepare(0, messages)
+    all_results = []
+    permanent: list[SqsSendFailure] = []
+    last_error: ClientError|None = None
+
+    for attempt in range(max_retries):
+        if not entries:
+            break
+        if attempt:
+            sleep_time = sqs_retry_delay(attempt)
+            logger.info("Retrying %d failed messages after %.2fs delay",
+                        len(entries), sleep_time)
+            time.sleep(sleep_time)
+
+        logger.info(
+            "Batch send attempt %d/%d for %d messages",
+            attempt + 1,
+            max_retries,
+            len(entries)
+            )
+
+        batches = sqs_entry_batches(entries)
+        results = _send_sqs_batches(batches, queue_url, session, SQS_SEND_CONCURRENCY)
+        all_results.extend(r for r in results if not isinstance(r, ClientError))
+        errors = [r for r in results if isinstance(r, ClientError)]
+        last_error = errors[-1] if errors else None
+
+        failures = _sqs_batch_failures(batches, results, messages)
+        permanent.extend(f for f in failures if f.sender_fault)
+        retry_ids = {f.entry_id for f in failures if not f.sender_fault}
+        entries = [entry for entry in entries if entry['Id'] in retry_ids]
+        if not failures:
+            logger.info("All messages sent successfully")
+
+    if entries:
+        failed_ids = {entry['Id'] for entry in entries}
+        permanent.extend(f for f in failures if f.entry_id in failed_ids)
+        logger.error(
+            "Failed to send %d messages after %d attempts",
+            len(entries),
+            max_retries
+        )
+
+    if permanent:
+        permanent.sort(key=lambda f: int(f.entry_id))
+        if failure_sink is not None:
+            failure_sink(permanent)
+        elif last_error is not None and entries:
+            raise last_error
+        else:
+            raise SqsSendError(permanent)
+
+    return all_results
+
+def get_queue_depth(queue_url: str, session: Session = default_session) -> dict:
+    """Get current queue depth metrics for throttling decisions
+
+    Args:
+        queue_url: SQS queue URL
+        session: Boto3 session
+
+    Returns:
+        Dictionary with queue depth metrics
+    """
+    sqs_client = get_client('sqs', session)
+
+    try:
+        response = sqs_client.get_queue_attributes(
+            QueueUrl=queue_url,
+            AttributeNames=[
+                'ApproximateNumberOfMessages',
+                'ApproximateNumberOfMessagesNotVisible',
+                'ApproximateNumberOfMessagesDelayed'
+            ]
+        )
+    except ClientError as error:
+        logger.error("Failed to get queue attributes for %s: %s", queue_url, error)
+        boto_exception(error, f"With queue_url [{queue_url}]")
+        raise error
+
+    attrs = response['Attributes']
+
+    visible = int(attrs.get('ApproximateNumberOfMessages', 0))
+    in_flight = int(attrs.get('ApproximateNumberOfMessagesNotVisible', 0))
+    delayed = int(attrs.get('ApproximateNumberOfMessagesDelayed', 0))
+    total = visible + in_flight
+
+    return {
+        'visible': visible,
+        'in_flight': in_flight,
+        'delayed': delayed,
+        'total': total,
+        'queue_url': queue_url
+    }
+
+
+def calculate_optimal_delay(queue_depth: int, base_delay: int = 30) -> int:
+    """Calculate optimal delay based on queue depth for automatic throttling
+
+    Args:
+        queue_depth: Current total queue depth
+        base_delay: Base delay in seconds (default: 30)
+
+    Returns:
+        Recommended delay in seconds
+    """
+    if queue_depth > QUEUE_DEPTH_DELAY_VERY_HIGH:
+        return base_delay * 4  # 2 minutes for very high load
+    if queue_depth > QUEUE_DEPTH_DELAY_HIGH:
+        return base_delay * 2  # 1 minute for high load
+    if queue_depth > QUEUE_DEPTH_DELAY_MEDIUM:
+        return base_delay      # 30 seconds for medium load
+    if queue_depth > QUEUE_DEPTH_DELAY_MEDIUM_LOW:
+        return base_delay // 2 # 15 seconds for low-medium load
+
+    return 0               # No delay for low load
+
+def send_sqs_message_with_throttling(messages: list, queue_url: str,
+                                   session: Session = default_session,
+                                   enable_throttling: bool = True,
+                                   base_delay: int = 30) -> list:
+    """Send messages with automatic throttling based on queue depth
+
+    Args:
+        messages: List of message dictionaries to send
+        queue_url: SQS queue URL
+        session: Boto3 session
+        enable_throttling: Whether to enable automatic throttling
+        base_delay: Base delay for throttling calculations
+
+    Returns:
+        List of SQS batch response dictionaries
+    """
+    if enable_throttling:
+        try:
+            # Check queue depth and calculate delay
+            queue_metrics = get_queue_depth(queue_url, session)
+        except ClientError as e:
+            # If throttling check fails, continue without throttling
+            boto_exception(e, "Throttling check failed, proceeding without delay")
+            queue_metrics = None
+
+        if queue_metrics:
+            delay = calculate_optimal_delay(queue_metrics['total'], base_delay)
+
+            logger.info("Queue throttling check: depth=%d, delay=%ds",
+                        queue_metrics['total'], delay)
+
+            if delay > 0:
+                logger.info(
+                    "Throttling: waiting %d seconds before sending %d messages",
+                    delay,
+                    len(messages)
+                )
+                time.sleep(delay)
+
+    # Send messages in batches with retry
+    return send_sqs_message_batch_with_retry(messages, queue_url, session)
+
+def _get_queue_depth_total(queue_url, session) -> int:
+    """Call into SQS to get the queue's metrics, and summarize to total"""
+    try:
+        queue_metrics = get_queue_depth(queue_url, session)
+    except ClientError as e:
+        boto_exception(e, f"Failed to get queue metrics for {queue_url}, returning 0")
+        return 0
+    return int(queue_metrics['total'])
+
+def _do_adaptive_delay(batch_num, max_queue_depth, current_depth):
+    """Apply an adaptive delay (sleep) if excessive depth"""
+    logger.info(
+        "Adaptive throttling check (batch %d): queue_depth=%d",
+        batch_num,
+        current_depth
+    )
+
+    if current_depth > max_queue_depth:
+        # Calculate adaptive delay based on how far over the limit we are
+        excess_ratio = current_depth / max_queue_depth
+        # Cap at 60 seconds
+        adaptive_delay = min(60, int(30 * excess_ratio))
+
+        logger.info("Queue depth (%d) exceeds limit (%d), waiting %ds",
+                    current_depth, max_queue_depth, adaptive_delay)
+        time.sleep(adaptive_delay)
+
+
+def send_sqs_message_with_adaptive_throttling(messages: list, queue_url: str,
+                                            session: Session = default_session,
+                                            max_queue_depth: int = 1000,
+                                            check_interval: int = 10) -> list:
+    """Send messages with adaptive throttling that monitors queue depth during processing
+
+    Args:
+        messages: List of message dictionaries to send
+        queue_url: SQS queue URL
+        session: Boto3 session
+        max_queue_depth: Maximum allowed queue depth before throttling
+        check_interval: Number of batches between queue depth checks
+
+    Returns:
+        List of SQS batch response dictionaries
+    """
+    batch_size = 10  # SQS batch limit
+    all_results = []
+
+    logger.info("Starting adaptive throttling send for %d messages", len(messages))
+
+    for i in range(0, len(messages), batch_size):
+        batch = messages[i:i + batch_size]
+        batch_num = (i // batch_size) + 1
+
+        # Check queue depth periodically
+        if batch_num % check_interval == 1:  # Check on first batch and every check_interval batches
+            _do_adaptive_delay(batch_num,
+                               max_queue_depth,
+                               _get_queue_depth_total(queue_url, session))
+
+        # Send the batch
+        try:
+            batch_results = send_sqs_message_batch_with_retry([batch], queue_url, session)
+        except ClientError as e:
+            boto_exception(e, f"Failed to send batch {batch_num}")
+            raise e
+        all_results.extend(batch_results)
+
+        # Small delay between batches to avoid overwhelming
+        if i + batch_size < len(messages):
+            time.sleep(0.1)  # 100ms between batches
+
+    logger.info("Adaptive throttling send completed: %d batch responses", len(all_results))
+    return all_results
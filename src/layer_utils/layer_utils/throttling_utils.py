@@ -8,14 +8,67 @@ to ensure optimal performance and avoid API rate limiting.
 import logging
 import os
 import time
-from typing import Optional
+from threading import Lock
+from typing import NamedTuple, Optional
 
 from boto3 import Session
 
-from .aws_utils import calculate_optimal_delay, get_queue_depth, send_sqs_message_batch_with_retry
+from .sqs_utils import calculate_optimal_delay, get_queue_depth, send_sqs_message_batch_with_retry
+from .message_utils import pack_messages
 
 logger = logging.getLogger(__name__)
 
+# Queue depth is read from SQS at most this often; readings in between are served from cache
+QUEUE_DEPTH_REFRESH_SECONDS = float(os.environ.get("QUEUE_DEPTH_REFRESH_SECONDS", 5))
+# Weight of the newest reading in the exponentially smoothed queue depth
+QUEUE_DEPTH_SMOOTHING = float(os.environ.get("QUEUE_DEPTH_SMOOTHING", 0.5))
+
+class QueueDepthSample:
+    """Smoothed queue depth and when it was last read from SQS"""
+    def __init__(self, depth: int, sampled_at: float):
+        self.depth = float(depth)
+        self.sampled_at = sampled_at
+
+class QueueDepthReading(NamedTuple):
+    """Smoothed queue depth as of the SQS read at sampled_at. Callers served
+    from the cache get the same sampled_at, so they can tell a new reading
+    from one they have already acted on."""
+    depth: int
+    sampled_at: float
+
+# Shared by every throttler in the container, keyed by queue URL
+_queue_depth_samples: dict[str, QueueDepthSample] = {}
+_queue_depth_lock = Lock()
+
+def sample_queue_depth(queue_url: str, session: Session) -> QueueDepthReading:
+    """Exponentially smoothed total depth of a queue.
+
+    GetQueueAttributes is called at most once per QUEUE_DEPTH_REFRESH_SECONDS
+    for each queue; other callers get the cached value. Errors from SQS are
+    raised and leave the cache as it was.
+    """
+    now = time.monotonic()
+    with _queue_depth_lock:
+        sample = _queue_depth_samples.get(queue_url)
+        if sample is not None and now - sample.sampled_at < QUEUE_DEPTH_REFRESH_SECONDS:
+            return QueueDepthReading(round(sample.depth), sample.sampled_at)
+
+    depth = get_queue_depth(queue_url, session)['total']
+
+    with _queue_depth_lock:
+        sample = _queue_depth_samples.get(queue_url)
+        if sample is None:
+            sample = _queue_depth_samples[queue_url] = QueueDepthSample(depth, now)
+        else:
+            sample.depth += QUEUE_DEPTH_SMOOTHING * (depth - sample.depth)
+            sample.sampled_at = now
+        return QueueDepthReading(round(sample.depth), sample.sampled_at)
+
+def clear_queue_depth_samples():
+    """ Clears all cached queue depth samples """
+    with _queue_depth_lock:
+        _queue_depth_samples.clear()
+
 class ThrottlingConfig:
     """Configuration class for throttling parameters."""
 
@@ -27,6 +80,78 @@ class ThrottlingConfig:
         self.max_queue_depth = int(os.environ.get("MAX_QUEUE_DEPTH", 1000))
         self.use_adaptive_throttling = os.environ.get(
             "USE_ADAPTIVE_THROTTLING", "false").lower() == "true"
+        self.use_controlled_throttling = os.environ.get(
+            "USE_CONTROLLED_THROTTLING", "false").lower() == "true"
+        self.min_batch_rate = float(os.environ.get("THROTTLING_MIN_BATCH_RATE", 0.05))
+        self.max_batch_rate = float(os.environ.get("THROTTLING_MAX_BATCH_RATE", 20))
+        self.batch_rate_step = float(os.environ.get("THROTTLING_BATCH_RATE_STEP", 0.5))
+        self.batch_rate_backoff = float(os.environ.get("THROTTLING_BATCH_RATE_BACKOFF", 0.5))
+
+    @property
+    def throttling_type(self) -> str:
+        """Name of the throttling strategy in use"""
+        if self.use_controlled_throttling:
+            return "controlled"
+        if self.use_adaptive_throttling:
+            return "adaptive"
+        return "batch_based"
+
+class AimdController:
+    """Additive increase, multiplicative decrease pacing of batch sends.
+
+    The batch rate grows by a fixed step while the target queue depth is
+    respected and is cut by the backoff factor when the depth is at or above
+    the target, or cannot be read. The rate changes once per queue depth
+    reading; batches sent while the reading is cached keep the current rate.
+    Batches are spaced 1/rate seconds apart, so the delay between batches is
+    usually well under a second.
+    """
+
+    def __init__(self, config: ThrottlingConfig):
+        self.target_depth = config.max_queue_depth
+        self.min_rate = config.min_batch_rate
+        self.max_rate = config.max_batch_rate
+        self.step = config.batch_rate_step
+        self.backoff = config.batch_rate_backoff
+        self.rate = min(max(1.0, self.min_rate), self.max_rate)
+        self.queue_depth: int|None = None
+        self.sampled_at: float|None = None
+        self.last_delay = 0.0
+        self.increases = 0
+        self.decreases = 0
+        self._next_send: float|None = None
+
+    def update(self, queue_depth: int|None, sampled_at: float|None = None) -> float:
+        """Adjust the rate for a queue depth reading and return the seconds
+        to wait before sending the next batch. A reading with the sampled_at
+        of the previous one has already been acted on and leaves the rate as
+        it is; without sampled_at every reading counts as new."""
+        if sampled_at is None or sampled_at != self.sampled_at:
+            self.queue_depth = queue_depth
+            self.sampled_at = sampled_at
+            if queue_depth is not None and queue_depth < self.target_depth:
+                self.rate = min(self.max_rate, self.rate + self.step)
+                self.increases += 1
+            else:
+                self.rate = max(self.min_rate, self.rate * self.backoff)
+                self.decreases += 1
+
+        now = time.monotonic()
+        send_at = now if self._next_send is None else max(now, self._next_send)
+        self._next_send = send_at + 1 / self.rate
+        self.last_delay = send_at - now
+        return self.last_delay
+
+    def get_state(self) -> dict[str, float|int|None]:
+        """Current controller state"""
+        return {
+            "batch_rate": round(self.rate, 3),
+            "target_queue_depth": self.target_depth,
+            "queue_depth": self.queue_depth,
+            "last_delay_seconds": round(self.last_delay, 3),
+            "rate_increases": self.increases,
+            "rate_decreases": self.decreases
+        }
 
 class StandardizedThrottler:
     """Standardized throttling implementation for all vendor providers."""
@@ -34,6 +159,7 @@ class StandardizedThrottler:
     def __init__(self, config: ThrottlingConfig|None = None):
         self.config = config or ThrottlingConfig()
         self.batch_count = 0
+        self.controller = AimdController(self.config)
 
     def should_throttle(self) -> bool:
         """Determine if throttling should be applied based on batch count."""
@@ -64,14 +190,13 @@ class StandardizedThrottler:
             return
 
         try:
-            queue_metrics = get_queue_depth(queue_url, session)
-            delay = calculate_optimal_delay(
-                queue_metrics['total'], self.config.throttling_base_delay)
+            queue_depth = sample_queue_depth(queue_url, session).depth
+            delay = calculate_optimal_delay(queue_depth, self.config.throttling_base_delay)
 
             logger.info({
                 "message": "Adaptive throttling check",
                 "batch_number": self.batch_count,
-                "queue_depth": queue_metrics['total'],
+                "queue_depth": queue_depth,
                 "calculated_delay": delay,
                 "throttling_type": "adaptive"
             })
@@ -81,7 +206,7 @@ class StandardizedThrottler:
                     "message": "Applying adaptive throttling delay",
                     "batch_number": self.batch_count,
                     "delay_seconds": delay,
-                    "queue_depth": queue_metrics['total']
+                    "queue_depth": queue_depth
                 })
                 time.sleep(delay)
 
@@ -94,40 +219,70 @@ class StandardizedThrottler:
             # Fallback to batch-based throttling
             self.apply_batch_throttling()
 
+    def apply_controlled_throttling(self, queue_url: str, session: Session) -> None:
+        """Pace batches with the AIMD controller, targeting the maximum queue depth."""
+        if not self.config.auto_throttling_enabled:
+            return
+
+        try:
+            queue_depth, sampled_at = sample_queue_depth(queue_url, session)
+        except Exception as e:
+            logger.warning({
+                "message": "Queue depth unavailable, reducing batch rate",
+                "batch_number": self.batch_count,
+                "error": str(e)
+            })
+            queue_depth, sampled_at = None, None
+
+        delay = self.controller.update(queue_depth, sampled_at)
+        if delay > 0:
+            time.sleep(delay)
+
     def send_batch_with_throttling(self, batch_messages: list, queue_url: str,
                                  session: Session, is_final_batch: bool = False) -> list:
-        """Send a batch of messages with appropriate throttling applied."""
+        """Send a batch of messages with appropriate throttling applied.
+        Raises if any message could not be sent, so the provider's own SQS
+        message is reported as a batch item failure and retried."""
         self.batch_count += 1
 
         # Choose throttling strategy
-        if self.config.use_adaptive_throttling:
+        if self.config.use_controlled_throttling:
+            self.apply_controlled_throttling(queue_url, session)
+        elif self.config.use_adaptive_throttling:
             self.apply_adaptive_throttling(queue_url, session)
         else:
             self.apply_batch_throttling()
 
+        # Several certificates share an SQS message when packing is enabled
+        messages = pack_messages(batch_messages)
+
         # Log batch sending
         batch_type = "final batch" if is_final_batch else "batch"
         logger.info({
             "message": f"Sending {batch_type} with standardized throttling",
             "batch_number": self.batch_count,
             "batch_size": len(batch_messages),
+            "sqs_messages": len(messages),
             "throttling_enabled": self.config.auto_throttling_enabled,
-            "throttling_type": "adaptive" if self.config.use_adaptive_throttling else "batch_based"
+            "throttling_type": self.config.throttling_type
         })
 
         # Send the batch
-        return send_sqs_message_batch_with_retry(batch_messages, queue_url, session)
+        return send_sqs_message_batch_with_retry(messages, queue_url, session)
 
-    def get_throttling_stats(self) -> dict[str, str|int]:
+    def get_throttling_stats(self) -> dict[str, str|int|dict]:
         """Get current throttling statistics."""
-        return {
+        stats = {
             "total_batches_processed": self.batch_count,
             "throttling_enabled": self.config.auto_throttling_enabled,
-            "throttling_type": "adaptive" if self.config.use_adaptive_throttling else "batch_based",
+            "throttling_type": self.config.throttling_type,
             "base_delay": self.config.throttling_base_delay,
             "batch_interval": self.config.throttling_batch_interval,
             "max_queue_depth": self.config.max_queue_depth
         }
+        if self.config.use_controlled_throttling:
+            stats["controller"] = self.controller.get_state()
+        return stats
 
 def create_standardized_throttler() -> StandardizedThrottler:
     """Factory function to create a standardized throttler with environment configuration."""
@@ -6,28 +6,45 @@ This function handles S3 events and routes manifests to appropriate SQS queues.
 It verifies S3 uploads and does NOT process certificates directly - that's done by
 vendor-specific providers.
 
+Large manifests are split into chunks of MANIFEST_CHUNK_SIZE certificates so that
+several provider invocations can work on one manifest concurrently. Each chunk is
+described by a byte range (generated and Espressif files) or an index range
+(Microchip JSON) in the provider message. Infineon bundles are compressed, so
+the Infineon provider splits them itself once the selected bundle is extracted.
+
 Event Flow:
 S3 Upload → Product Verifier (S3 Event) → SQS Queue → Vendor Provider (SQS Event) → Bulk Importer
 """
+import csv
 import logging
 import os
+from collections.abc import Iterable, Iterator
+from contextlib import closing
 
 from aws_lambda_powertools.utilities.data_classes import S3Event
 from aws_lambda_powertools.utilities.typing import LambdaContext
 from boto3 import Session
 from layer_utils.aws_utils import (check_cfn_prop_valid, get_policy_arn, get_thing_group_arn,
-                                   get_thing_type_arn, send_sqs_message)
+                                   get_thing_type_arn, s3_object_chunks, s3_object_lines,
+                                   s3_object_size, ProviderMessageKey, S3_STREAM_CHUNK_SIZE)
+from layer_utils.json_utils import iter_json_array
+from layer_utils.sqs_utils import send_sqs_message, send_sqs_message_batch_with_retry
 
 logger = logging.getLogger()
 logger.setLevel("INFO")
 
 default_session: Session = Session()
 
+# Number of certificates handed to a single provider invocation
+MANIFEST_CHUNK_SIZE = int(os.environ.get("MANIFEST_CHUNK_SIZE", 1000))
+# Manifests smaller than this are forwarded whole without being scanned
+MANIFEST_SPLIT_MIN_BYTES = int(os.environ.get("MANIFEST_SPLIT_MIN_BYTES", 1024 * 1024))
+
 def parse_comma_delimited_list(value: str) -> list[str]:
     """Parse comma-delimited string into list, filtering out 'None' and empty values"""
     if not value or value.strip().lower() == 'none':
         return []
-    return [item.strip() for item in value.split(',') 
+    return [item.strip() for item in value.split(',')
             if item.strip() and item.strip().lower() != 'none']
 
 ESPRESSIF_BUCKET_PREFIX = "thingpress-espressif-"
@@ -50,6 +67,120 @@ def get_provider_queue(bucket_name: str) -> str:
         return os.environ['QUEUE_TARGET_GENERATED']
     raise ValueError(f"Bucket name prefix unidentifiable: {bucket_name}")
 
+def record_ranges(lines: Iterable[bytes],
+                  chunk_size: int,
+                  offset: int = 0,
+                  quotechar: bytes|None = None) -> Iterator[tuple[int, int]]:
+    """Yield inclusive byte ranges that each hold up to chunk_size records.
+
+    Lines must keep their line endings so the offsets are exact. When quotechar
+    is given a record continues across lines while a quoted field is open, which
+    is how CSV manifests embed multi-line PEM certificates.
+    """
+    start = offset
+    records = 0
+    in_quotes = False
+    for line in lines:
+        offset += len(line)
+        if quotechar is not None and line.count(quotechar) % 2:
+            in_quotes = not in_quotes
+        if in_quotes or not line.strip():
+            continue
+        records += 1
+        if records == chunk_size:
+            yield start, offset - 1
+            start = offset
+            records = 0
+    if records:
+        yield start, offset - 1
+
+def index_ranges(count: int, chunk_size: int) -> Iterator[tuple[int, int]]:
+    """Yield [start, end) index ranges that each hold up to chunk_size entries"""
+    for start in range(0, count, chunk_size):
+        yield start, min(start + chunk_size, count)
+
+def generated_chunks(bucket: str, key: str, chunk_size: int,
+                     session: Session=default_session) -> list[dict]:
+    """Byte ranges of a generated file, one certificate per line.
+
+    Ranges are sized from the length of the first line and are not aligned to
+    line boundaries; provider_generated assigns each line to the range holding
+    its first byte, so the file is never scanned here.
+    """
+    size = s3_object_size(bucket, key, session)
+    lines = s3_object_lines(bucket, key, session=session, keepends=True,
+                            range_end=S3_STREAM_CHUNK_SIZE - 1)
+    try:
+        line_size = len(next(lines, b''))
+    finally:
+        lines.close()
+    step = max(line_size * chunk_size, 1)
+    return [{ProviderMessageKey.RANGE_START.value: start,
+             ProviderMessageKey.RANGE_END.value: min(start + step, size) - 1}
+            for start in range(0, size, step)]
+
+def espressif_chunks(bucket: str, key: str, chunk_size: int,
+                     session: Session=default_session) -> list[dict]:
+    """Byte ranges of an Espressif CSV manifest aligned to CSV records.
+    The header row is carried in each chunk since only the first range holds it."""
+    lines = s3_object_lines(bucket, key, session=session, keepends=True)
+    header = next(lines, b'')
+    fieldnames = next(csv.reader([header.decode()]), [])
+    return [{ProviderMessageKey.RANGE_START.value: start,
+             ProviderMessageKey.RANGE_END.value: end,
+             ProviderMessageKey.FIELDNAMES.value: fieldnames}
+            for start, end in record_ranges(lines, chunk_size, len(header), b'"')]
+
+def microchip_chunks(bucket: str, key: str, chunk_size: int,
+                     session: Session=default_session) -> list[dict]:
+    """Index ranges over the entries of a Microchip JSON manifest, counted as it streams"""
+    with closing(s3_object_chunks(bucket, key, session=session)) as chunks:
+        count = sum(1 for _ in iter_json_array(chunks))
+    return [{ProviderMessageKey.INDEX_START.value: start,
+             ProviderMessageKey.INDEX_END.value: end}
+            for start, end in index_ranges(count, chunk_size)]
+
+def manifest_chunks(config: dict, chunk_size: int = MANIFEST_CHUNK_SIZE,
+                    session: Session=default_session) -> list[dict]:
+    """Split a manifest into provider messages of up to chunk_size certificates.
+
+    Returns the config unchanged as the only message when the manifest format
+    cannot be split, when the object is too small to be worth scanning, or when
+    it holds no more than one chunk.
+    """
+    bucket = config[ProviderMessageKey.OBJECT_BUCKET.value]
+    key = config[ProviderMessageKey.OBJECT_KEY.value]
+
+    if bucket.startswith(ESPRESSIF_BUCKET_PREFIX):
+        planner = espressif_chunks
+    elif bucket.startswith(MICROCHIP_BUCKET_PREFIX):
+        planner = microchip_chunks
+    elif bucket.startswith(GENERATED_BUCKET_PREFIX):
+        planner = generated_chunks
+    else:
+        return [config]
+
+    if s3_object_size(bucket, key, session) < MANIFEST_SPLIT_MIN_BYTES:
+        return [config]
+
+    chunks = planner(bucket, key, chunk_size, session)
+    if len(chunks) <= 1:
+        return [config]
+
+    logger.info("Split s3://%s/%s into %d chunks of up to %d certificates",
+                bucket, key, len(chunks), chunk_size)
+    return [config | chunk for chunk in chunks]
+
+def send_manifest_chunks(chunks: list[dict], queue_url: str,
+                         session: Session=default_session) -> None:
+    """Enqueue the provider messages for a manifest.
+    Raises if any chunk could not be sent so the S3 event is retried."""
+    if len(chunks) == 1:
+        send_sqs_message(chunks[0], queue_url, session)
+        return
+
+    send_sqs_message_batch_with_retry(chunks, queue_url, session)
+
 def lambda_handler(event,
                    context: LambdaContext) -> dict: # pylint: disable=unused-argument
     """Lambda function main entry point. Verifies the S3 object can be read and resolves
@@ -57,13 +188,14 @@ def lambda_handler(event,
 
     This lambda function expects invocation by S3 event. There should be only one
     event, but is processed as if multiple events were found at once.
-    
+
     Expects the following environment variables to be set:
     QUEUE_TARGET_ESPRESSIF, QUEUE_TARGET_INFINEON, QUEUE_TARGET_MICROCHIP, QUEUE_TARGET_GENERATED
     POLICY_NAMES, THING_GROUP_NAMES (comma-delimited), THING_TYPE_NAME
+    MANIFEST_CHUNK_SIZE, MANIFEST_SPLIT_MIN_BYTES (optional)
     """
     config = {}
-    
+
     # Get multi-value parameters
     e_policies = os.environ.get('POLICY_NAMES', '')
     e_thing_groups = os.environ.get('THING_GROUP_NAMES', '')
@@ -124,8 +256,9 @@ def lambda_handler(event,
         else:
             logger.info("Processing vendor certificate manifest: %s", record.s3.get_object.key)
 
-        send_sqs_message(config, queue_url, default_session)
-        logger.info("Sent message to queue %s for s3://%s/%s",
-                    queue_url, bucket_name, record.s3.get_object.key)
+        chunks = manifest_chunks(config.copy(), MANIFEST_CHUNK_SIZE, default_session)
+        send_manifest_chunks(chunks, queue_url, default_session)
+        logger.info("Sent %d message(s) to queue %s for s3://%s/%s",
+                    len(chunks), queue_url, bucket_name, record.s3.get_object.key)
 
     return raw_event
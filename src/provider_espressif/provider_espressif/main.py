@@ -5,19 +5,20 @@
 Lambda function to decompose Espressif based certificate manifest(s) and begin
 the import processing pipeline
 """
-import base64
 import csv
 import json
 import os
-from io import StringIO
 
 from aws_lambda_powertools import Logger
+from aws_lambda_powertools.utilities.batch import BatchProcessor, EventType
+from aws_lambda_powertools.utilities.data_classes.sqs_event import SQSRecord
 from aws_lambda_powertools.utilities.typing import LambdaContext
-from aws_lambda_powertools.utilities.data_classes import SQSEvent
 from boto3 import Session
-from layer_utils.aws_utils import s3_object_bytes
+from layer_utils.aws_utils import s3_object_lines
 from layer_utils.aws_utils import powertools_idempotency_environ
 from layer_utils.aws_utils import ProviderMessageKey
+from layer_utils.cert_utils import certificate_info
+from layer_utils.message_utils import importer_message, IMPORTER_BATCH_SIZE
 from layer_utils.throttling_utils import create_standardized_throttler
 
 # Initialize Logger and Idempotency
@@ -25,42 +26,54 @@ logger = Logger(service="provider_espressif")
 default_session: Session = Session()
 
 persistence_layer, idempotency_config = powertools_idempotency_environ()
-
-def file_key_generator(event, _context):
-    """Generate a unique key based on S3 bucket and key"""
-    if isinstance(event, dict) and "bucket" in event and "key" in event:
-        # Use bucket and key as the idempotency key
-        return f"{event[ProviderMessageKey.OBJECT_BUCKET]}:{event[ProviderMessageKey.OBJECT_KEY.value]}"
-    return None
+processor = BatchProcessor(event_type=EventType.SQS)
 
 def invoke_export(config: dict, queue_url: str, session: Session=default_session):
     """Evaluate CSV based Espressif manifest"""
     logger.info({
         "message": "Processing Espressif manifest",
         "bucket": config['bucket'],
-        "key": config['key']
+        "key": config['key'],
+        "range_start": config.get(ProviderMessageKey.RANGE_START.value),
+        "range_end": config.get(ProviderMessageKey.RANGE_END.value)
     })
 
-    manifest_bytes = s3_object_bytes(config[ProviderMessageKey.OBJECT_BUCKET.value],
+    # Line endings are kept so quoted multi-line certificate fields parse intact.
+    # A chunk message names a record-aligned byte range and carries the header
+    # row, which only the first chunk of the manifest contains.
+    manifest_lines = s3_object_lines(config[ProviderMessageKey.OBJECT_BUCKET.value],
                                      config[ProviderMessageKey.OBJECT_KEY.value],
-                                     session=session)
+                                     session=session,
+                                     keepends=True,
+                                     range_start=config.get(ProviderMessageKey.RANGE_START.value),
+                                     range_end=config.get(ProviderMessageKey.RANGE_END.value))
 
-    reader_list = csv.DictReader(StringIO(manifest_bytes.decode()))
+    reader_list = csv.DictReader((line.decode() for line in manifest_lines),
+                                 fieldnames=config.get(ProviderMessageKey.FIELDNAMES.value))
 
     # Process certificates in batches for optimal SQS throughput
     batch_messages = []
-    batch_size = 10  # SQS batch limit
+    batch_size = IMPORTER_BATCH_SIZE  # SQS batch limit, times certificates per message and sends
     total_count = 0
 
     # Initialize standardized throttler
     throttler = create_standardized_throttler()
 
     for row in reader_list:
-        cert_config = config.copy()
-        cert_config['thing'] = row['MAC']
-        cert_config['certificate'] = str(base64.b64encode(row['cert'].encode('ascii')))
-
-        batch_messages.append(cert_config)
+        try:
+            info = certificate_info(row['cert'].encode('ascii'))
+        except ValueError as error:
+            # Fail the whole message so it is retried and then reaches the
+            # dead letter queue, rather than silently dropping the device
+            logger.error({
+                "message": "Malformed certificate in manifest",
+                "thing": row['MAC'],
+                "error": str(error)
+            })
+            raise error
+
+        # The manifest names the device by MAC rather than certificate CN
+        batch_messages.append(importer_message(config, info, thing_name=row['MAC']))
         total_count += 1
 
         # Send batch when full
@@ -88,6 +101,18 @@ def invoke_export(config: dict, queue_url: str, session: Session=default_session
 
     return total_count
 
+def record_handler(record: SQSRecord) -> int:
+    """Process a single provider queue message"""
+    config = json.loads(record.body)
+    logger.info({
+        "message": "Processing SQS message",
+        "bucket": config.get('bucket'),
+        "key": config.get('key')
+    })
+    return invoke_export(config=config,
+                         queue_url=os.environ['QUEUE_TARGET'],
+                         session=default_session)
+
 def lambda_handler(event: dict, context: LambdaContext) -> dict: # pylint: disable=unused-argument
     """
     Process Espressif certificate manifests from SQS messages and forward to target queue.
@@ -115,28 +140,15 @@ def lambda_handler(event: dict, context: LambdaContext) -> dict: # pylint: disab
         context (LambdaContext): Lambda execution context (unused)
         
     Returns:
-        dict: The original event for AWS Lambda SQS batch processing
+        dict: SQS partial batch response listing the messages that failed processing
     """
-    # Convert raw dict to SQSEvent (AWS always sends raw dict to Lambda handlers)
-    sqs_event = SQSEvent(event)
-
-    queue_url = os.environ['QUEUE_TARGET']
-    total_processed = 0
-
-    for record in sqs_event.records:
-        config = json.loads(record.body)
-        logger.info({
-            "message": "Processing SQS message",
-            "bucket": config.get('bucket'),
-            "key": config.get('key')
-        })
-        total_processed += invoke_export(config=config,
-                                         queue_url=queue_url,
-                                         session=default_session)
+    with processor(records=event['Records'], handler=record_handler):
+        results = processor.process()
 
     logger.info({
         "message": "Total certificates processed",
-        "count": total_processed
+        "count": sum(result for status, result, _ in results if status == "success"),
+        "failed_messages": len(processor.fail_messages)
     })
 
-    return event
+    return processor.response()
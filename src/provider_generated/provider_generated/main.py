@@ -6,35 +6,88 @@ and begin the import processing pipeline
 import base64
 import json
 import os
+from collections.abc import Iterator
 from aws_lambda_powertools import Logger
+from aws_lambda_powertools.utilities.batch import BatchProcessor, EventType
+from aws_lambda_powertools.utilities.data_classes.sqs_event import SQSRecord
 from aws_lambda_powertools.utilities.typing import LambdaContext
-from aws_lambda_powertools.utilities.data_classes import SQSEvent
 from boto3 import Session
-from layer_utils.aws_utils import s3_object_bytes
-from layer_utils.cert_utils import get_cn
+from layer_utils.aws_utils import s3_object_chunks, s3_object_lines
+from layer_utils.cert_utils import certificate_info
+from layer_utils.message_utils import importer_message, IMPORTER_BATCH_SIZE
 from layer_utils.throttling_utils import create_standardized_throttler
 from layer_utils.aws_utils import (
-    powertools_idempotency_environ, ProviderMessageKey, ImporterMessageKey)
+    powertools_idempotency_environ, ProviderMessageKey)
 
 # Initialize Logger and Idempotency
 logger = Logger(service="provider_generated")
 default_session: Session = Session()
 
 persistence_layer, idempotency_config = powertools_idempotency_environ()
-
-def file_key_generator(event, _context):
-    """Generate a unique key based on S3 bucket and key"""
-    if isinstance(event, dict) and \
-       ProviderMessageKey.OBJECT_BUCKET.value in event and \
-       ProviderMessageKey.OBJECT_KEY.value in event:
-        # Use bucket and key as the idempotency key
-        return f"{event[ProviderMessageKey.OBJECT_BUCKET.value]}:" \
-               f"{event[ProviderMessageKey.OBJECT_KEY.value]}"
-    return None
+processor = BatchProcessor(event_type=EventType.SQS)
+
+# Bytes read past the end of a range for the line crossing it, and per extra
+# ranged GET when that line is longer still
+CERTIFICATE_LINE_MAX_BYTES: int = int(os.environ.get("CERTIFICATE_LINE_MAX_BYTES", 8 * 1024))
+
+def _line_tail(bucket: str, key: str, start: int, session: Session) -> bytes:
+    """Read the rest of a line from start, CERTIFICATE_LINE_MAX_BYTES at a time.
+    Each GET starts one byte early so it never lies wholly past the end of the object."""
+    tail = b''
+    while True:
+        chunks = s3_object_chunks(bucket, key, session=session, range_start=start - 1,
+                                  range_end=start + CERTIFICATE_LINE_MAX_BYTES - 1)
+        data = b''.join(chunks)[1:]
+        if (newline := data.find(b'\n')) >= 0:
+            return tail + data[:newline + 1]
+        tail += data
+        if len(data) < CERTIFICATE_LINE_MAX_BYTES:
+            return tail
+        start += len(data)
+
+def certificate_lines(config: dict, session: Session=default_session) -> Iterator[bytes]:
+    """Yield the lines of a certificate file, or of the byte range named in the config.
+
+    Ranges need not fall on line boundaries. A line belongs to the range holding
+    its first byte: the partial line at the start of a range is left to the
+    previous range, and the line crossing the end of a range is read to its end.
+    The GET is bounded to CERTIFICATE_LINE_MAX_BYTES past the range; a longer
+    crossing line is completed with further small ranged GETs.
+    """
+    range_start = config.get(ProviderMessageKey.RANGE_START.value)
+    range_end = config.get(ProviderMessageKey.RANGE_END.value)
+    bucket = config[ProviderMessageKey.OBJECT_BUCKET.value]
+    key = config[ProviderMessageKey.OBJECT_KEY.value]
+
+    if range_start is None and range_end is None:
+        yield from s3_object_lines(bucket, key, session=session)
+        return
+
+    # Start one byte early so a line beginning exactly at range_start is kept
+    range_start = range_start or 0
+    offset = max(range_start - 1, 0)
+    window_end = None if range_end is None else range_end + CERTIFICATE_LINE_MAX_BYTES
+    lines = s3_object_lines(bucket, key, session=session, keepends=True,
+                            range_start=offset, range_end=window_end)
+    try:
+        if range_start > 0:
+            offset += len(next(lines, b''))
+        for line in lines:
+            if range_end is not None and offset > range_end:
+                break
+            offset += len(line)
+            # The window cut the line short
+            if window_end is not None and offset > window_end and not line.endswith(b'\n'):
+                line += _line_tail(bucket, key, offset, session)
+            yield line
+    finally:
+        lines.close()
 
 def process_certificate_file(config: dict[str, str], queue_url: str,
                              session: Session=default_session) -> int:
     """Process a file containing base64-encoded certificates (one per line).
+    When the config carries range_start/range_end only the certificates whose
+    lines start inside that byte range are processed.
     
     Args:
         config: Configuration dictionary with bucket and key information
@@ -47,37 +100,27 @@ def process_certificate_file(config: dict[str, str], queue_url: str,
     logger.info({
         "message": "Processing certificate file",
         "bucket": config['bucket'],
-        "key": config['key']
+        "key": config['key'],
+        "range_start": config.get(ProviderMessageKey.RANGE_START.value),
+        "range_end": config.get(ProviderMessageKey.RANGE_END.value)
     })
 
-    # Get the file content from S3
-    file_content = s3_object_bytes(config['bucket'],
-                                   config['key'],
-#                                   getvalue=True,
-                                   session=session).decode()
-
     # Process certificates in batches for optimal SQS throughput
     batch_messages = []
-    batch_size = 10  # SQS batch limit
+    batch_size = IMPORTER_BATCH_SIZE  # SQS batch limit, times certificates per message and sends
     count = 0
 
     # Initialize standardized throttler
     throttler = create_standardized_throttler()
 
-    for raw_line in file_content.splitlines():
+    # Stream the file, or only this chunk's byte range, from S3
+    for raw_line in certificate_lines(config, session):
         if not (line := raw_line.strip()):
             continue
 
-        # Create a copy of the config for this certificate
-        cert_config = config.copy()
-
-        # Store the certificate
-        cert_bytes = base64.b64decode(line)
-        cert_config[ImporterMessageKey.THING_NAME.value] = get_cn(cert_bytes)
-        cert_config[ImporterMessageKey.CERTIFICATE.value] = str(base64.b64encode(cert_bytes))
-
-        # Add to batch
-        batch_messages.append(cert_config)
+        # Add the certificate to the batch
+        info = certificate_info(base64.b64decode(line))
+        batch_messages.append(importer_message(config, info))
         count += 1
 
         # Send batch when full
@@ -103,6 +146,16 @@ def process_certificate_file(config: dict[str, str], queue_url: str,
 
     return count
 
+def record_handler(record: SQSRecord) -> int:
+    """Process a single provider queue message"""
+    config = json.loads(record.body)
+    logger.info({
+        "message": "Processing SQS message",
+        "bucket": config.get(ProviderMessageKey.OBJECT_BUCKET.value),
+        "key": config.get(ProviderMessageKey.OBJECT_KEY.value)
+    })
+    return process_certificate_file(config, os.environ['QUEUE_TARGET'])
+
 def lambda_handler(event: dict, context: LambdaContext) -> dict: # pylint: disable=unused-argument
     """Process certificate files generated by generate_certificates.py from SQS messages and
     forward to target queue.
@@ -125,26 +178,15 @@ def lambda_handler(event: dict, context: LambdaContext) -> dict: # pylint: disab
         context (LambdaContext): Lambda execution context (unused)
         
     Returns:
-        dict: The original event for AWS Lambda SQS batch processing
+        dict: SQS partial batch response listing the messages that failed processing
     """
-    # Convert raw dict to SQSEvent (AWS always sends raw dict to Lambda handlers)
-    sqs_event = SQSEvent(event)
-
-    queue_url = os.environ['QUEUE_TARGET']
-    total_processed = 0
-
-    for record in sqs_event.records:
-        config = json.loads(record.body)
-        logger.info({
-            "message": "Processing SQS message",
-            "bucket": config.get(ProviderMessageKey.OBJECT_BUCKET.value),
-            "key": config.get(ProviderMessageKey.OBJECT_KEY.value)
-        })
-        total_processed += process_certificate_file(config, queue_url)
+    with processor(records=event['Records'], handler=record_handler):
+        results = processor.process()
 
     logger.info({
         "message": "Total certificates processed",
-        "count": total_processed
+        "count": sum(result for status, result, _ in results if status == "success"),
+        "failed_messages": len(processor.fail_messages)
     })
 
-    return event
+    return processor.response()
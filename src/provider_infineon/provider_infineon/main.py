@@ -7,8 +7,9 @@ import json
 import os
 
 from aws_lambda_powertools import Logger
+from aws_lambda_powertools.utilities.batch import BatchProcessor, EventType
+from aws_lambda_powertools.utilities.data_classes.sqs_event import SQSRecord
 from aws_lambda_powertools.utilities.typing import LambdaContext
-from aws_lambda_powertools.utilities.data_classes import SQSEvent
 from boto3 import Session
 from botocore.exceptions import ClientError
 from layer_utils.aws_utils import (
@@ -21,27 +22,21 @@ logger = Logger(service="provider_infineon")
 default_session: Session = Session()
 
 persistence_layer, idempotency_config = powertools_idempotency_environ()
+processor = BatchProcessor(event_type=EventType.SQS)
 
-def file_key_generator(event, _context):
-    """Generate a unique key based on S3 bucket and key"""
-    if isinstance(event, dict) and \
-       ProviderMessageKey.OBJECT_BUCKET.value in event and \
-       ProviderMessageKey.OBJECT_KEY.value in event:
-        # Use bucket and key as the idempotency key
-        return f"{event[ProviderMessageKey.OBJECT_BUCKET.value]}:" \
-               f"{event[ProviderMessageKey.OBJECT_KEY.value]}"
-    return None
-
-def process_infineon_manifest(config, queue_url, cert_type, session=default_session):
+def process_infineon_manifest(config, queue_url, cert_type, session=default_session,
+                              chunk_queue_url=None):
     """Process Infineon manifest with idempotency"""
     logger.info({
         "message": "Processing Infineon manifest",
         "bucket": config[ProviderMessageKey.OBJECT_BUCKET.value],
         "key": config[ProviderMessageKey.OBJECT_KEY.value],
-        "cert_type": cert_type
+        "cert_type": cert_type,
+        "index_start": config.get(ProviderMessageKey.INDEX_START.value),
+        "index_end": config.get(ProviderMessageKey.INDEX_END.value)
     })
 
-    count = invoke_export(config, queue_url, cert_type, session)
+    count = invoke_export(config, queue_url, cert_type, session, chunk_queue_url)
 
     logger.info({
         "message": "Processed certificates from Infineon manifest",
@@ -52,6 +47,17 @@ def process_infineon_manifest(config, queue_url, cert_type, session=default_sess
 
     return count
 
+def record_handler(record: SQSRecord) -> int:
+    """Process a single provider queue message"""
+    config = json.loads(record.body)
+    logger.info({
+        "message": "Processing SQS message",
+        "bucket": config.get(ProviderMessageKey.OBJECT_BUCKET.value),
+        "key": config.get(ProviderMessageKey.OBJECT_KEY.value)
+    })
+    return process_infineon_manifest(config, os.environ['QUEUE_TARGET'], os.environ['CERT_TYPE'],
+                                     chunk_queue_url=os.environ.get('QUEUE_SOURCE'))
+
 def lambda_handler(event: dict, context: LambdaContext) -> dict: # pylint: disable=unused-argument
     """Process Infineon certificate manifests from SQS messages and forward to target queue.
     
@@ -67,6 +73,9 @@ def lambda_handler(event: dict, context: LambdaContext) -> dict: # pylint: disab
     Environment variables:
         QUEUE_TARGET: URL of the SQS queue to forward processed certificates to
         CERT_TYPE: Type of Infineon certificate to process (E0E0, E0E1, or E0E2)
+        QUEUE_SOURCE: URL of this provider's queue; large bundles are split into
+            index-range work items sent here (optional)
+        MANIFEST_CHUNK_SIZE: Certificates per work item (optional)
         POWERTOOLS_IDEMPOTENCY_TABLE: DynamoDB table for idempotency
         POWERTOOLS_IDEMPOTENCY_EXPIRY_SECONDS: Expiry time for idempotency records
     
@@ -75,14 +84,10 @@ def lambda_handler(event: dict, context: LambdaContext) -> dict: # pylint: disab
         context (LambdaContext): Lambda execution context (unused)
         
     Returns:
-        dict: The original event for AWS Lambda SQS batch processing, or None if validation fails
+        dict: SQS partial batch response listing the messages that failed processing
     """
-    # Convert raw dict to SQSEvent (AWS always sends raw dict to Lambda handlers)
-    sqs_event = SQSEvent(event)
-
     queue_url = os.environ['QUEUE_TARGET']
     cert_type = os.environ['CERT_TYPE']
-    total_processed = 0
 
     try:
         verify_queue(queue_url=queue_url, session=default_session)
@@ -100,18 +105,13 @@ def lambda_handler(event: dict, context: LambdaContext) -> dict: # pylint: disab
         })
         raise error
 
-    for record in sqs_event.records:
-        config = json.loads(record.body)
-        logger.info({
-            "message": "Processing SQS message",
-            "bucket": config.get(ProviderMessageKey.OBJECT_BUCKET.value),
-            "key": config.get(ProviderMessageKey.OBJECT_KEY.value)
-        })
-        total_processed += process_infineon_manifest(config, queue_url, cert_type)
+    with processor(records=event['Records'], handler=record_handler):
+        results = processor.process()
 
     logger.info({
         "message": "Total certificates processed",
-        "count": total_processed
+        "count": sum(result for status, result, _ in results if status == "success"),
+        "failed_messages": len(processor.fail_messages)
     })
 
-    return event
+    return processor.response()
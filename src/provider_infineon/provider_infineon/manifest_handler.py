@@ -1,19 +1,89 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
 """The manifest_handler has all operations specific to mangling the manifest file.
+
+Bundles holding more than MANIFEST_CHUNK_SIZE certificates are not sent in one
+invocation. Instead, index-range work items are queued back to the provider
+queue, and each one is handled by a separate invocation.
 """
 import io
-import base64
+import os
+from collections.abc import Callable
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO
 
 import py7zr
 import py7zr.io as py7io
 from boto3 import Session
-from layer_utils.aws_utils import s3_object_bytes, ProviderMessageKey, ImporterMessageKey
-from layer_utils.cert_utils import get_cn
+from layer_utils.aws_utils import s3_object, ProviderMessageKey
+from layer_utils.cert_utils import certificate_info
+from layer_utils.message_utils import importer_message, IMPORTER_BATCH_SIZE
+from layer_utils.sqs_utils import send_sqs_message_batch_with_retry
 from layer_utils.throttling_utils import create_standardized_throttler
 
 default_session: Session = Session()
 
+# Archives larger than this are spooled to ephemeral storage rather than memory
+SPOOL_MAX_BYTES = int(os.environ.get("INFINEON_SPOOL_MAX_BYTES", 8 * 1024 * 1024))
+# Number of certificates handed to a single provider invocation
+MANIFEST_CHUNK_SIZE = int(os.environ.get("MANIFEST_CHUNK_SIZE", 1000))
+
+class FileWriter(py7io.Py7zIO):
+    """Py7zIO that writes an extracted member straight into a file-like object"""
+    def __init__(self, fs: BinaryIO):
+        self._fs = fs
+        self._size = 0
+
+    def write(self, s: bytes | bytearray) -> int:
+        self._size += len(s)
+        return self._fs.write(s)
+
+    def read(self, size: int | None = None) -> bytes:
+        return self._fs.read(size)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self._fs.seek(offset, whence)
+
+    def flush(self) -> None:
+        self._fs.flush()
+
+    def size(self) -> int:
+        return self._size
+
+class FileWriterFactory(py7io.WriterFactory):
+    """Extract the members selected by the caller into a single file-like object"""
+    def __init__(self, fs: BinaryIO):
+        self.fs = fs
+
+    def create(self, filename: str) -> py7io.Py7zIO:
+        return FileWriter(self.fs)
+
+class MemberStreamFactory(py7io.WriterFactory):
+    """Hand each extracted member to a callback once it is complete.
+
+    py7zr extracts members one after another and asks for the next writer only
+    when the previous member has been written and checked, so at most one
+    member is held in memory. Call finish() after extraction to deliver the
+    last member.
+    """
+    def __init__(self, on_member: Callable[[str, bytes], None]):
+        self.on_member = on_member
+        self._current: tuple[str, io.BytesIO] | None = None
+
+    def create(self, filename: str) -> py7io.Py7zIO:
+        self.finish()
+        buffer = io.BytesIO()
+        self._current = (filename, buffer)
+        return FileWriter(buffer)
+
+    def finish(self) -> None:
+        """Deliver the member extracted last, if any"""
+        if self._current is None:
+            return
+        filename, buffer = self._current
+        self._current = None
+        self.on_member(filename, buffer.getvalue())
+
 def verify_certtype(option: str) -> bool:
     """ Check type selection for import """
     match option:
@@ -36,44 +106,62 @@ def verify_certificate_set(files: list[py7zr.FileInfo], option: str) -> str|None
             return x.filename
     return None
 
-def select_certificate_set(manifest_bundle: io.BytesIO, option: str) -> io.BytesIO:
-    """There are 3 bundles within the main payload, select which one of it exists."""
-    szf = py7zr.SevenZipFile(manifest_bundle)
-    if (f := verify_certificate_set(szf.list(), option)) is None:
-        raise FileNotFoundError("file having option not found ")
-    # get single file from bundle, return as io,BytesIO
-    fcty = py7io.BytesIOFactory(limit=10)
-    szf.extract(factory=fcty)
-    return io.BytesIO(fcty.get(filename = f).read())
-
-def send_certificates(manifest_archive: io.BytesIO,
+def select_certificate_set(manifest_bundle: BinaryIO, option: str,
+                           fs: BinaryIO | None = None) -> BinaryIO:
+    """There are 3 bundles within the main payload, select which one of it exists.
+       Only the selected bundle is extracted, into fs (a new BytesIO by default),
+       which is returned rewound."""
+    with py7zr.SevenZipFile(manifest_bundle) as szf:
+        if (f := verify_certificate_set(szf.list(), option)) is None:
+            raise FileNotFoundError("file having option not found ")
+        if fs is None:
+            fs = io.BytesIO()
+        szf.extract(targets=[f], factory=FileWriterFactory(fs))
+    fs.seek(0)
+    return fs
+
+def certificate_members(manifest_archive: BinaryIO) -> list[str]:
+    """Names of the certificates in a bundle, in archive order, read from its header"""
+    with py7zr.SevenZipFile(manifest_archive) as szf:
+        names = [x.filename for x in szf.list() if not x.is_directory]
+    manifest_archive.seek(0)
+    return names
+
+def index_chunks(count: int, chunk_size: int) -> list[dict]:
+    """[index_start, index_end) work items that each hold up to chunk_size certificates"""
+    return [{ProviderMessageKey.INDEX_START.value: start,
+             ProviderMessageKey.INDEX_END.value: min(start + chunk_size, count)}
+            for start in range(0, count, chunk_size)]
+
+def send_index_chunks(config: dict, count: int, chunk_size: int,
+                      queue_url: str, session: Session) -> int:
+    """Queue a work item per index range of the bundle named in config.
+    Raises if any work item could not be sent so the message is retried."""
+    chunks = [config | chunk for chunk in index_chunks(count, chunk_size)]
+    send_sqs_message_batch_with_retry(chunks, queue_url, session)
+    return len(chunks)
+
+def send_certificates(manifest_archive: BinaryIO,
                       config: dict,
                       queue_url: str,
                       session: Session) -> int:
-    """Routine to send data through queue for further processing with batch optimization."""
+    """Routine to send data through queue for further processing with batch optimization.
+       Certificates are sent as they are extracted, one archive member at a time.
+       When the config names an index range only those members are sent."""
 
     # Process certificates in batches for optimal SQS throughput
     batch_messages = []
-    batch_size = 10  # SQS batch limit
+    batch_size = IMPORTER_BATCH_SIZE  # SQS batch limit, times certificates per message and sends
     total_count = 0
 
     # Initialize standardized throttler
     throttler = create_standardized_throttler()
 
-    szf = py7zr.SevenZipFile(manifest_archive)
-    fcty = py7io.BytesIOFactory(limit=10000)
-    szf.extract(factory=fcty)
-
-    for x in szf.list():
-        j = fcty.get(filename = x.filename).read().decode('ascii')
-        k = str(base64.b64encode(j.encode("ascii")))
-        l = get_cn(j)
-
-        cert_config = config.copy()
-        cert_config[ImporterMessageKey.THING_NAME.value] = l
-        cert_config[ImporterMessageKey.CERTIFICATE.value] = k
-
-        batch_messages.append(cert_config)
+    def send_member(_filename: str, data: bytes) -> None:
+        nonlocal batch_messages, total_count
+        if not data:
+            return
+        batch_messages.append(importer_message(config, certificate_info(data)))
         total_count += 1
 
         # Send batch when full
@@ -81,6 +169,19 @@ def send_certificates(manifest_archive: io.BytesIO,
             throttler.send_batch_with_throttling(batch_messages, queue_url, session)
             batch_messages = []
 
+    index_start = config.get(ProviderMessageKey.INDEX_START.value)
+    index_end = config.get(ProviderMessageKey.INDEX_END.value)
+    targets = None
+    if index_start is not None or index_end is not None:
+        targets = certificate_members(manifest_archive)[index_start:index_end]
+        if not targets:
+            return 0
+
+    fcty = MemberStreamFactory(send_member)
+    with py7zr.SevenZipFile(manifest_archive) as szf:
+        szf.extract(targets=targets, factory=fcty)
+    fcty.finish()
+
     # Send remaining messages
     if batch_messages:
         throttler.send_batch_with_throttling(
@@ -88,12 +189,25 @@ def send_certificates(manifest_archive: io.BytesIO,
 
     return total_count
 
-def invoke_export(config, queue_url, cert_type, session: Session=default_session):
+def invoke_export(config, queue_url, cert_type, session: Session=default_session,
+                  chunk_queue_url: str|None = None, chunk_size: int = MANIFEST_CHUNK_SIZE):
     """The manifest_file must be a file-like object
     Main interface to invoke manifest processing routines
+
+    When chunk_queue_url is given and the config does not already name an index
+    range, a bundle holding more than chunk_size certificates is split into
+    index-range work items sent to chunk_queue_url, and 0 is returned.
     """
-    manifest_bytes = s3_object_bytes(config[ProviderMessageKey.OBJECT_BUCKET.value],
-                                    config[ProviderMessageKey.OBJECT_KEY.value],
-                                    session=session)
-    x = select_certificate_set(io.BytesIO(manifest_bytes), cert_type)
-    return send_certificates(x, config, queue_url=queue_url, session=session)
+    with SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as manifest, \
+         SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as bundle:
+        s3_object(config[ProviderMessageKey.OBJECT_BUCKET.value],
+                  config[ProviderMessageKey.OBJECT_KEY.value],
+                  manifest, session=session)
+        manifest.seek(0)
+        x = select_certificate_set(manifest, cert_type, bundle)
+        if chunk_queue_url and ProviderMessageKey.INDEX_START.value not in config:
+            count = len(certificate_members(x))
+            if count > chunk_size:
+                send_index_chunks(config, count, chunk_size, chunk_queue_url, session)
+                return 0
+        return send_certificates(x, config, queue_url=queue_url, session=session)
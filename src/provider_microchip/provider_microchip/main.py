@@ -6,8 +6,9 @@ import json
 import os
 import sys
 
+from aws_lambda_powertools.utilities.batch import BatchProcessor, EventType
+from aws_lambda_powertools.utilities.data_classes.sqs_event import SQSRecord
 from aws_lambda_powertools.utilities.typing import LambdaContext
-from aws_lambda_powertools.utilities.data_classes import SQSEvent
 from boto3 import Session
 
 # Handle imports for both Lambda and unit test environments
@@ -25,6 +26,12 @@ except ImportError:
         from manifest_handler import invoke_export
 
 default_session: Session = Session()
+processor = BatchProcessor(event_type=EventType.SQS)
+
+def record_handler(record: SQSRecord) -> None:
+    """Process a single provider queue message"""
+    config = json.loads(record.body)
+    invoke_export(config, os.environ['QUEUE_TARGET'], default_session)
 
 def lambda_handler(event: dict, context: LambdaContext) -> dict: # pylint: disable=unused-argument
     """Process Microchip certificate manifests from SQS messages and forward to target queue.
@@ -46,15 +53,9 @@ def lambda_handler(event: dict, context: LambdaContext) -> dict: # pylint: disab
         context (LambdaContext): Lambda execution context (unused)
         
     Returns:
-        dict: The original raw event for AWS Lambda SQS batch processing
+        dict: SQS partial batch response listing the messages that failed processing
     """
-    # Convert raw dict to SQSEvent (AWS always sends raw dict to Lambda handlers)
-    sqs_event = SQSEvent(event)
-
-    queue_url = os.environ['QUEUE_TARGET']
-
-    for record in sqs_event.records:
-        config = json.loads(record.body)
-        invoke_export(config, queue_url, default_session)
+    with processor(records=event['Records'], handler=record_handler):
+        processor.process()
 
-    return event
+    return processor.response()
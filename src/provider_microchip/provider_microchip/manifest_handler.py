@@ -8,15 +8,28 @@ import json
 import logging
 import os
 import re
-from base64 import b64decode, b64encode
+import time
+from base64 import b64decode
+from collections import Counter, deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import closing
+from functools import partial
+from itertools import islice
+from threading import Lock
+from typing import NamedTuple
 
 from boto3 import Session
 from cryptography import x509
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes, serialization
-from jose import jws
+from jose import jwk, jws
+from jose.backends.base import Key
 from jose.utils import base64url_decode, base64url_encode
-from layer_utils.aws_utils import s3_object_bytes
+from layer_utils.aws_utils import get_client, s3_object_bytes, s3_object_chunks, ProviderMessageKey
+from layer_utils.cert_utils import certificate_info
+from layer_utils.json_utils import iter_json_array
+from layer_utils.message_utils import importer_message, IMPORTER_BATCH_SIZE
 from layer_utils.throttling_utils import create_standardized_throttler
 
 logger = logging.getLogger()
@@ -26,118 +39,232 @@ verification_algorithms = [
     'RS256', 'RS384', 'RS512', 'ES256', 'ES384', 'ES512'
 ]
 
-
-def get_verification_certificates(verification_certs_bucket: str, session: Session) -> list[tuple[str, bytes]]:
+# Signature verification is CPU bound; spread it across the cores Lambda allots
+VERIFY_WORKERS = int(os.environ.get("MICROCHIP_VERIFY_WORKERS", os.cpu_count() or 1))
+# 'thread' or 'process'. Process pools need /dev/shm, which Lambda does not provide,
+# and an entry verifies in well under a millisecond, so shipping it to a worker
+# process costs about as much as verifying it.
+VERIFY_EXECUTOR = os.environ.get("MICROCHIP_VERIFY_EXECUTOR", "thread")
+# Entries in flight per worker; bounds memory while the manifest streams in
+VERIFY_WINDOW_PER_WORKER = 4
+# Seconds a warm container trusts its parsed verification certificates before
+# revalidating them against the bucket listing
+VERIFICATION_CERTS_CACHE_TTL = int(os.environ.get("VERIFICATION_CERTS_CACHE_TTL", 300))
+
+
+def list_verification_certificates(verification_certs_bucket: str,
+                                   session: Session) -> list[tuple[str, str]]:
     """
-    Get all Microchip verification certificates from S3 bucket, sorted by date (newest first).
-    
+    List Microchip verification certificates in the S3 bucket, sorted by date (newest first).
+
     Returns:
-        List of tuples (cert_name, cert_content) sorted by date, newest first
+        List of tuples (cert_name, etag) sorted by date, newest first
     """
-    s3_client = session.client('s3')
-
-    try:
-        response = s3_client.list_objects_v2(Bucket=verification_certs_bucket)
-        if 'Contents' not in response:
-            logger.error("No verification certificates found in bucket %s",
-                         verification_certs_bucket)
-            return []
-
-        cert_files = []
-        cert_pattern = re.compile(r'MCHP_manifest_signer_(\d+)_(.+)\.crt')
-
-        for obj in response['Contents']:
-            key = obj['Key']
-            match = cert_pattern.match(key)
-            if match:
-                signer_num = int(match.group(1))
-                date_info = match.group(2)
-
-                # Parse priority: higher signer number = newer
-                # Special case: "noExpiration" gets highest priority
-                if 'noExpiration' in date_info:
-                    priority = 9999  # Highest priority
-                else:
-                    priority = signer_num
-
-                cert_files.append((key, priority, obj['LastModified']))
-
-        # Sort by priority (descending), then by last modified (descending)
-        cert_files.sort(key=lambda x: (x[1], x[2]), reverse=True)
-
-        # Download certificate contents
-        certificates = []
-        for cert_name, _, _ in cert_files:
-            try:
-                cert_content = s3_object_bytes(
-                    verification_certs_bucket,
-                    cert_name,
-#                    getvalue=True,
-                    session=session
-                )
-                certificates.append((cert_name, cert_content))
-                logger.info("Loaded verification certificate: %s", cert_name)
-            except Exception as e:
-                logger.warning("Failed to load certificate %s: %s", cert_name, str(e))
-                continue
-
-        if not certificates:
-            logger.error("No valid verification certificates could be loaded")
-            return []
-
-        logger.info("Loaded %d verification certificates, will try in order: %s",
-                   len(certificates), [cert[0] for cert in certificates])
-        return certificates
-
-    except Exception as e:
-        logger.error("Failed to list verification certificates: %s", str(e))
+    s3_client = get_client('s3', session)
+    response = s3_client.list_objects_v2(Bucket=verification_certs_bucket)
+    if 'Contents' not in response:
+        logger.error("No verification certificates found in bucket %s",
+                     verification_certs_bucket)
         return []
 
+    cert_files = []
+    cert_pattern = re.compile(r'MCHP_manifest_signer_(\d+)_(.+)\.crt')
 
-class ManifestIterator:
-    """Helper for going through list of certificates"""
-    def __init__(self, manifest):
-        self.manifest = manifest
-        self.index = len(manifest)
+    for obj in response['Contents']:
+        key = obj['Key']
+        match = cert_pattern.match(key)
+        if match:
+            signer_num = int(match.group(1))
+            date_info = match.group(2)
 
-    def __iter__(self):
-        return self
+            # Parse priority: higher signer number = newer
+            # Special case: "noExpiration" gets highest priority
+            if 'noExpiration' in date_info:
+                priority = 9999  # Highest priority
+            else:
+                priority = signer_num
 
-    def __next__(self):
-        if self.index == 0:
-            raise StopIteration
-        self.index = self.index - 1
-        return self.manifest[self.index]
+            cert_files.append((key, priority, obj['LastModified'], obj.get('ETag', '')))
 
-def get_iterator(manifest_file):
-    """Create a ManifestIterator from a JSON manifest file."""
-    return ManifestIterator( json.loads(manifest_file) )
+    # Sort by priority (descending), then by last modified (descending)
+    cert_files.sort(key=lambda x: (x[1], x[2]), reverse=True)
+    return [(cert_name, etag) for cert_name, _, _, etag in cert_files]
 
-class ManifestItem:
-    """Represents a single 'certificate' in the manifest"""
-    def __init__(self, signed_se, verification_cert_raw):
+class VerificationKey:
+    """Key material of one Microchip manifest signer certificate.
+
+    The certificate is parsed once; entries are matched to it by the kid and
+    x5t#S256 of their protected header, and verified with a key prepared once
+    per signing algorithm.
+    """
+    def __init__(self, name: str, cert_pem: bytes):
         verification_cert = x509.load_pem_x509_certificate(
-            data=verification_cert_raw,
+            data=cert_pem,
             backend=default_backend()
         )
-
-        self.signed_se = signed_se
-        self.ski_ext = verification_cert.extensions.get_extension_for_class(
+        ski_ext = verification_cert.extensions.get_extension_for_class(
             extclass=x509.SubjectKeyIdentifier
         )
 
-        self.verification_cert_kid_b64 = base64url_encode(
-            self.ski_ext.value.digest
+        self.name = name
+        self.cert_pem = cert_pem
+        self.kid = base64url_encode(ski_ext.value.digest).decode('ascii')
+        self.x5t_s256 = base64url_encode(
+            verification_cert.fingerprint(hashes.SHA256())
         ).decode('ascii')
-
-        self.verification_public_key_pem = verification_cert.public_key().public_bytes(
+        self.public_key_pem = verification_cert.public_key().public_bytes(
             encoding=serialization.Encoding.PEM,
             format=serialization.PublicFormat.SubjectPublicKeyInfo
         ).decode('ascii')
+        self._keys: dict[str, Key] = {}
 
-        self.verification_cert_x5t_s256_b64 = base64url_encode(
-            verification_cert.fingerprint(hashes.SHA256())
-        ).decode('ascii')
+    def __getstate__(self):
+        # Prepared keys are not picklable; rebuild them once in each process pool worker
+        return self.name, self.cert_pem
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def matches(self, protected: dict) -> bool:
+        """True when a protected header names this signer"""
+        return protected.get('kid') == self.kid and protected.get('x5t#S256') == self.x5t_s256
+
+    def key(self, algorithm: str) -> Key:
+        """Public key prepared for the algorithm, constructed on first use"""
+        if algorithm not in self._keys:
+            self._keys[algorithm] = jwk.construct(self.public_key_pem, algorithm)
+        return self._keys[algorithm]
+
+def load_verification_keys(certificates: list[tuple[str, bytes]]) -> list[VerificationKey]:
+    """Parse verification certificates once, keeping their priority order"""
+    keys = []
+    for cert_name, cert_content in certificates:
+        try:
+            keys.append(VerificationKey(cert_name, cert_content))
+        except Exception as e: # pylint: disable=broad-exception-caught
+            logger.warning("Failed to parse verification certificate %s: %s", cert_name, str(e))
+    return keys
+
+class SignerIndex:
+    """Verification keys indexed by kid and by x5t#S256 for constant time signer
+    selection. Where several certificates share an identifier the newest wins."""
+    def __init__(self, verification_keys: list[VerificationKey]):
+        self.keys = verification_keys
+        self.by_kid: dict[str, VerificationKey] = {}
+        self.by_x5t: dict[str, VerificationKey] = {}
+        for verification_key in verification_keys:
+            self.by_kid.setdefault(verification_key.kid, verification_key)
+            self.by_x5t.setdefault(verification_key.x5t_s256, verification_key)
+
+    def __len__(self):
+        return len(self.keys)
+
+    @staticmethod
+    def lookup_kind(protected: dict) -> str:
+        """How candidates are selected for a protected header: kid, x5t or scan"""
+        if 'kid' in protected:
+            return 'kid'
+        if 'x5t#S256' in protected:
+            return 'x5t'
+        return 'scan'
+
+    def candidates(self, protected: dict) -> list[VerificationKey]:
+        """Signers to try for a protected header. Every signer is scanned only
+        when the header names none."""
+        kind = self.lookup_kind(protected)
+        if kind == 'scan':
+            return self.keys
+        if kind == 'kid':
+            verification_key = self.by_kid.get(protected['kid'])
+        else:
+            verification_key = self.by_x5t.get(protected['x5t#S256'])
+        return [] if verification_key is None else [verification_key]
+
+class _SignerCacheEntry(NamedTuple):
+    signers: 'SignerIndex'
+    etags: dict[str, str]
+    expires: float
+
+class SignerCache:
+    """Parsed verification certificates per bucket, kept across warm invocations.
+
+    Within the TTL no S3 request is made. After it the bucket is listed once and
+    only certificates whose ETag changed, or that are new, are downloaded and
+    parsed again. When the listing fails the previous signers keep being used.
+    """
+    def __init__(self, ttl: int = VERIFICATION_CERTS_CACHE_TTL):
+        self.ttl = ttl
+        self._entries: dict[str, _SignerCacheEntry] = {}
+        self._lock = Lock()
+
+    def get(self, bucket: str, session: Session) -> 'SignerIndex':
+        """Signer index for the bucket, revalidated when the TTL has lapsed"""
+        with self._lock:
+            entry = self._entries.get(bucket)
+            if entry is not None and time.monotonic() < entry.expires:
+                return entry.signers
+
+            try:
+                listing = list_verification_certificates(bucket, session)
+            except Exception as e: # pylint: disable=broad-exception-caught
+                if entry is None:
+                    logger.error("Failed to list verification certificates: %s", str(e))
+                    return SignerIndex([])
+                logger.warning("Revalidating verification certificates failed, "
+                               "using cached signers: %s", str(e))
+                listing = list(entry.etags.items())
+
+            etags = dict(listing)
+            if entry is not None and etags == entry.etags:
+                signers = entry.signers
+            else:
+                signers = self._load(bucket, listing, entry, session)
+                # Only loaded certificates are recorded, so one that failed is
+                # tried again at the next revalidation
+                etags = {key.name: etags[key.name] for key in signers.keys}
+            self._entries[bucket] = _SignerCacheEntry(signers, etags,
+                                                      time.monotonic() + self.ttl)
+            return signers
+
+    @staticmethod
+    def _load(bucket: str, listing: list[tuple[str, str]],
+              entry: _SignerCacheEntry|None, session: Session) -> 'SignerIndex':
+        # Signers whose certificate is unchanged since they were parsed
+        etags = dict(listing)
+        cached = {} if entry is None else \
+                 {key.name: key for key in entry.signers.keys
+                  if entry.etags.get(key.name) == etags.get(key.name)}
+        keys = []
+        for cert_name, _ in listing:
+            if cert_name in cached:
+                keys.append(cached[cert_name])
+                continue
+            try:
+                cert_content = s3_object_bytes(bucket, cert_name, session=session)
+            except Exception as e: # pylint: disable=broad-exception-caught
+                logger.warning("Failed to load certificate %s: %s", cert_name, str(e))
+                continue
+            keys.extend(load_verification_keys([(cert_name, cert_content)]))
+            logger.info("Loaded verification certificate: %s", cert_name)
+
+        logger.info("Loaded %d verification certificates, will try in order: %s",
+                    len(keys), [key.name for key in keys])
+        return SignerIndex(keys)
+
+    def clear(self) -> None:
+        """Forget all cached signers"""
+        with self._lock:
+            self._entries.clear()
+
+signer_cache: SignerCache = SignerCache()
+
+class ManifestItem:
+    """Represents a single 'certificate' in the manifest"""
+    def __init__(self, signed_se, verification_key: VerificationKey,
+                 protected: dict|None = None):
+        self.signed_se = signed_se
+        self.verification_key = verification_key
+        self.protected = protected
         self.certificate_chain = ""
         self.run()
 
@@ -149,17 +276,16 @@ class ManifestItem:
         """Main procedure for decomposing a single certificate stanza"""
         self.identifier = self.signed_se['header']['uniqueId']
 
-        # Decode the protected header
-        protected = json.loads(
-            base64url_decode(
-                self.signed_se['protected'].encode('ascii')
-            )
-        )
+        # Decode the protected header unless the caller already has
+        protected = self.protected or decode_protected_header(self.signed_se)
 
-        if protected['kid'] != self.verification_cert_kid_b64:
+        if protected.get('kid', self.verification_key.kid) != self.verification_key.kid:
             raise ValueError('kid does not match certificate value')
-        if protected['x5t#S256'] != self.verification_cert_x5t_s256_b64:
+        if protected.get('x5t#S256', self.verification_key.x5t_s256) != \
+                self.verification_key.x5t_s256:
             raise ValueError('x5t#S256 does not match certificate value')
+        if protected.get('alg') not in verification_algorithms:
+            raise ValueError(f"Unsupported signing algorithm {protected.get('alg')}")
 
         # Convert JWS to compact form as required by python-jose
         jws_compact = '.'.join([
@@ -174,7 +300,7 @@ class ManifestItem:
         se = json.loads(
             jws.verify(
                 token=jws_compact,
-                key=self.verification_public_key_pem,
+                key=self.verification_key.key(protected['alg']),
                 algorithms=verification_algorithms
             ) )
 
@@ -184,8 +310,8 @@ class ManifestItem:
             public_keys = []
 
 
-        for jwk in public_keys:
-            for cert_b64 in jwk.get('x5c', []):
+        for public_jwk in public_keys:
+            for cert_b64 in public_jwk.get('x5c', []):
                 cert = x509.load_der_x509_certificate(
                     data=b64decode(cert_b64),
                     backend=default_backend()
@@ -195,98 +321,188 @@ class ManifestItem:
                 ).decode('ascii')
 
 
+def decode_protected_header(signed_se: dict) -> dict:
+    """Decode the JWS protected header of a signed secure element"""
+    return json.loads(base64url_decode(signed_se['protected'].encode('ascii')))
+
 def try_verify_with_certificates(signed_se: dict,
-                                 certificates: list[tuple[str, bytes]]
+                                 signers: SignerIndex,
+                                 protected: dict|None = None
                                  ) -> tuple[str, 'ManifestItem']:
     """
-    Try to verify a signed secure element with available verification certificates,
-    starting with newest.
+    Verify a signed secure element with the verification certificate named by
+    the kid or x5t#S256 of its protected header.
     
     Args:
         signed_se: The signed secure element data
-        certificates: List of (cert_name, cert_content) tuples, sorted newest first
+        signers: Parsed verification certificates indexed by kid and x5t#S256
+        protected: The decoded protected header, when the caller has it
     
     Returns:
         Tuple of (cert_name_used, ManifestItem) if successful
         
     Raises:
-        ValueError: If verification fails with all certificates
+        ValueError: If no certificate matches the header or verification fails
     """
-    verification_errors = []
+    if protected is None:
+        protected = decode_protected_header(signed_se)
+    candidates = signers.candidates(protected)
+    if not candidates:
+        raise ValueError(f"No verification certificate matches kid {protected.get('kid')} "
+                         f"among {len(signers)} certificates")
 
-    for cert_name, cert_content in certificates:
-        logger.info("Attempting verification with certificate: %s", cert_name)
+    verification_errors = []
+    for verification_key in candidates:
         try:
-            return cert_name, ManifestItem(signed_se, cert_content)
-        except Exception as e:
-            error_msg = f"Certificate {cert_name}: {str(e)}"
-            verification_errors.append(error_msg)
-            logger.warning("❌ Verification failed with %s: %s", cert_name, str(e))
-            continue
-
-    # If we get here, all certificates failed
-    error_summary = f"Verification failed with all %d{len(certificates)} certificates." \
+            return verification_key.name, ManifestItem(signed_se, verification_key, protected)
+        except Exception as e: # pylint: disable=broad-exception-caught
+            verification_errors.append(f"Certificate {verification_key.name}: {str(e)}")
+
+    error_summary = f"Verification failed with all {len(candidates)} matching certificates. " \
                     f"Errors: {'; '.join(verification_errors)}"
     logger.error(error_summary)
     raise ValueError(error_summary)
 
-def invoke_export(config, queue_url, session: Session):
-    """Main procedure with intelligent verification certificate selection"""
-    verification_certs_bucket = os.environ['VERIFICATION_CERTS_BUCKET']
-
-    # Load manifest file
-    manifest_file = s3_object_bytes(config['bucket'],
-                                    config['key'],
-    #                                getvalue=True,
-                                    session=session)
+class VerifiedEntry(NamedTuple):
+    """Outcome of verifying one signed secure element. Picklable, so it can
+    cross a process pool boundary."""
+    identifier: str
+    cert_used: str|None = None
+    certificate_chain: str = ""
+    error: str|None = None
+    lookup: str|None = None
+
+def verify_entry(signed_se: dict, signers: SignerIndex) -> VerifiedEntry:
+    """Verify a single manifest entry, capturing any failure in the result"""
+    identifier = signed_se.get('header', {}).get('uniqueId', 'unknown')
+    try:
+        protected = decode_protected_header(signed_se)
+    except Exception as e: # pylint: disable=broad-exception-caught
+        return VerifiedEntry(identifier, error=f"Undecodable protected header: {str(e)}")
 
-    # Ensure manifest_file is properly decoded for json.loads
-    if isinstance(manifest_file, bytes):
-        manifest_data = json.loads(manifest_file.decode('utf-8'))
-    else:
-        # Handle BytesIO case (though getvalue=True should return bytes)
-        manifest_data = json.loads(manifest_file.read().decode('utf-8'))
+    lookup = SignerIndex.lookup_kind(protected)
+    try:
+        cert_used, manifest_item = try_verify_with_certificates(signed_se, signers, protected)
+    except Exception as e: # pylint: disable=broad-exception-caught
+        return VerifiedEntry(identifier, error=str(e), lookup=lookup)
+    return VerifiedEntry(manifest_item.identifier, cert_used,
+                         manifest_item.get_certificate_chain(), lookup=lookup)
+
+class VerificationStats:
+    """Per-signer hit counts and signer lookup counts for a manifest"""
+    def __init__(self):
+        self.signer_hits: Counter[str] = Counter()
+        self.lookups: Counter[str] = Counter()
+        self.failures = 0
+
+    def record(self, entry: VerifiedEntry) -> None:
+        """Account for one verification outcome"""
+        if entry.lookup is not None:
+            self.lookups[entry.lookup] += 1
+        if entry.error is not None:
+            self.failures += 1
+        else:
+            self.signer_hits[entry.cert_used] += 1
+
+    def as_dict(self) -> dict:
+        """Statistics in a form suitable for structured logging"""
+        return {'signer_hits': dict(self.signer_hits),
+                'lookups': dict(self.lookups),
+                'failures': self.failures}
+
+# Signers of a process pool worker, set once by the pool initializer so that
+# tasks carry only their manifest entry
+# Signers held by a process pool worker, set once by its initializer
+_worker_state: dict[str, SignerIndex] = {}
+
+def _init_verify_worker(signers: SignerIndex) -> None:
+    """Process pool initializer: keep the signers for the life of the worker"""
+    _worker_state['signers'] = signers
+
+def _verify_in_worker(signed_se: dict) -> VerifiedEntry:
+    """Verify an entry against the signers loaded into this worker"""
+    return verify_entry(signed_se, _worker_state['signers'])
+
+def verification_executor(max_workers: int,
+                          signers: SignerIndex) -> tuple[Executor, Callable[[dict], VerifiedEntry]]:
+    """Executor for signature verification and the function to submit to it,
+    falling back to threads where process pools are unsupported"""
+    if VERIFY_EXECUTOR == 'process':
+        try:
+            return ProcessPoolExecutor(max_workers=max_workers,
+                                       initializer=_init_verify_worker,
+                                       initargs=(signers,)), _verify_in_worker
+        except (OSError, NotImplementedError) as e:
+            logger.warning("Process pool unavailable, verifying on threads: %s", str(e))
+    return ThreadPoolExecutor(max_workers=max_workers), partial(verify_entry, signers=signers)
+
+def verify_entries(entries: Iterable[dict],
+                   signers: SignerIndex,
+                   max_workers: int = VERIFY_WORKERS) -> Iterator[VerifiedEntry]:
+    """Verify manifest entries concurrently, yielding results in manifest order"""
+    if max_workers <= 1:
+        yield from map(partial(verify_entry, signers=signers), entries)
+        return
+    executor, verify = verification_executor(max_workers, signers)
+    with executor:
+        yield from ordered_map(executor, verify, entries,
+                               max_workers * VERIFY_WINDOW_PER_WORKER)
+
+def ordered_map(executor: Executor, fn: Callable, items: Iterable, window: int) -> Iterator:
+    """Like Executor.map, but with at most window items in flight so that a
+    streamed input is consumed as results are taken rather than all up front"""
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def invoke_export(config, queue_url, session: Session) -> dict:
+    """Main procedure with intelligent verification certificate selection.
+    Returns the verification statistics of the manifest."""
+    verification_certs_bucket = os.environ['VERIFICATION_CERTS_BUCKET']
 
     # Load all verification certificates, sorted by priority (newest first)
-    verification_certificates = get_verification_certificates(verification_certs_bucket, session)
-    if not verification_certificates:
+    # Parsed signers are reused across warm invocations
+    signers = signer_cache.get(verification_certs_bucket, session)
+    if not signers:
         raise ValueError("No verification certificates available - cannot process manifest")
 
-    manifest_iterator = ManifestIterator(manifest_data)
-
     # Process certificates in batches for optimal SQS throughput
     batch_messages = []
-    batch_size = 10  # SQS batch limit
+    batch_size = IMPORTER_BATCH_SIZE  # SQS batch limit, times certificates per message and sends
     total_count = 0
-    verification_stats = {}
+    verification_stats = VerificationStats()
 
     # Initialize standardized throttler
     throttler = create_standardized_throttler()
 
-    logger.info("Processing %d certificates from manifest", len(manifest_data))
-
-    while manifest_iterator.index != 0:
-        signed_se = next(manifest_iterator)
-
-        try:
-            # Try verification with certificates in priority order
-            cert_used, manifest_item = try_verify_with_certificates(signed_se,
-                                                                    verification_certificates)
-
-            # Track which certificates are being used
-            verification_stats[cert_used] = verification_stats.get(cert_used, 0) + 1
+    logger.info("Processing certificates from manifest s3://%s/%s",
+                config['bucket'], config['key'])
+
+    # Stream the manifest one signed secure element at a time so verification
+    # starts before the download finishes. A chunk message names the
+    # [index_start, index_end) slice of the manifest to process.
+    with closing(s3_object_chunks(config['bucket'], config['key'], session=session)) as chunks:
+        entries = islice(iter_json_array(chunks),
+                         config.get(ProviderMessageKey.INDEX_START.value) or 0,
+                         config.get(ProviderMessageKey.INDEX_END.value))
+        for entry in verify_entries(entries, signers):
+            verification_stats.record(entry)
+            if entry.error is not None:
+                logger.error("Failed to verify certificate %s: %s", entry.identifier, entry.error)
+                # Continue processing other certificates rather than failing the entire batch
+                continue
 
-            block = manifest_item.get_certificate_chain()
-            if len(block) == 0:
-                logger.error("Certificate %s could not be extracted", manifest_item.identifier)
+            if len(entry.certificate_chain) == 0:
+                logger.error("Certificate %s could not be extracted", entry.identifier)
                 continue
 
-            cert_config = config.copy()
-            cert_config['certificate'] = str(b64encode(block.encode('ascii')))
             # Set thing name from certificate identifier
-            cert_config['thing'] = manifest_item.identifier
-
-            batch_messages.append(cert_config)
+            info = certificate_info(entry.certificate_chain.encode('ascii'))
+            batch_messages.append(importer_message(config, info, thing_name=entry.identifier))
             total_count += 1
 
             # Send batch when full
@@ -294,16 +510,6 @@ def invoke_export(config, queue_url, session: Session):
                 throttler.send_batch_with_throttling(batch_messages, queue_url, session)
                 batch_messages = []
 
-        except ValueError as e:
-            logger.error("Failed to verify certificate %s: %s", 
-                        signed_se.get('header', {}).get('uniqueId', 'unknown'), str(e))
-            # Continue processing other certificates rather than failing the entire batch
-            continue
-        except Exception as e:
-            logger.error("Unexpected error processing certificate %s: %s", 
-                        signed_se.get('header', {}).get('uniqueId', 'unknown'), str(e))
-            continue
-
     # Send remaining messages
     if batch_messages:
         throttler.send_batch_with_throttling(
@@ -311,8 +517,10 @@ def invoke_export(config, queue_url, session: Session):
 
     # Log verification statistics
     logger.info("Processing completed. Total certificates processed: %d", total_count)
-    logger.info("Verification certificate usage: %s", verification_stats)
+    logger.info("Verification statistics: %s", json.dumps(verification_stats.as_dict()))
 
     if total_count == 0:
         logger.warning("No certificates could be processed - all verification attempts failed")
         # Don't raise an exception to maintain backward compatibility with unit tests
+
+    return verification_stats.as_dict()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Certificate Parse Micro-benchmark
+Compares the per-certificate work of provider_generated and provider_infineon
+before and after the single parse path in cert_utils, from certificate to
+importer message. The previous code only produced the thing name and legacy
+payload; the single parse path also produces the fingerprint and the compact
+message. No AWS access needed.
+
+Run from the repository root:
+    python test/performance/cert_parse_benchmark.py --certificates 2000
+"""
+import argparse
+import base64
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src', 'layer_utils'))
+
+# pylint: disable=wrong-import-position
+from layer_utils.cert_utils import certificate_info, decode_certificate, get_cn
+from layer_utils.message_utils import importer_message, message_certificate
+
+ARTIFACT = os.path.join(os.path.dirname(__file__), '..', 'artifacts', 'certificates_test.txt')
+
+def generated_before(line: bytes) -> tuple[str, str]:
+    """provider_generated: decode, parse for the CN, encode again"""
+    cert_bytes = base64.b64decode(line)
+    return get_cn(cert_bytes), str(base64.b64encode(cert_bytes))
+
+def generated_after(line: bytes) -> dict:
+    """provider_generated with the single parse path"""
+    return importer_message({}, certificate_info(base64.b64decode(line)))
+
+def infineon_before(data: bytes) -> tuple[str, str]:
+    """provider_infineon: ascii round trip, encode, parse for the CN"""
+    j = data.decode('ascii')
+    k = str(base64.b64encode(j.encode('ascii')))
+    return get_cn(j), k
+
+def infineon_after(data: bytes) -> dict:
+    """provider_infineon with the single parse path"""
+    return importer_message({}, certificate_info(data))
+
+def rate(fn, items: list[bytes], rounds: int) -> float:
+    """Best certificates per second over a number of rounds"""
+    best = 0.0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = max(best, len(items) / (time.perf_counter() - start))
+    return best
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="Certificate Parse Micro-benchmark")
+    parser.add_argument("--certificates", type=int, default=2000,
+                        help="Certificates per round (default: 2000)")
+    parser.add_argument("--rounds", type=int, default=5,
+                        help="Rounds per variant, best is reported (default: 5)")
+    args = parser.parse_args()
+
+    with open(ARTIFACT, 'rb') as data:
+        lines = data.read().split()
+    lines = (lines * (args.certificates // len(lines) + 1))[:args.certificates]
+    pems = [base64.b64decode(line) for line in lines]
+
+    for name, before, after, items in (
+            ("generated", generated_before, generated_after, lines),
+            ("infineon", infineon_before, infineon_after, pems)):
+        thing_name, payload = before(items[0])
+        message = after(items[0])
+        assert (message['thing'], message_certificate(message)) == \
+            (thing_name, decode_certificate(payload))
+        old = rate(before, items, args.rounds)
+        new = rate(after, items, args.rounds)
+        print(f"{name:10} before {old:10,.0f} certs/s  after {new:10,.0f} certs/s  "
+              f"({new / old:.2f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -65,6 +65,20 @@ except ImportError:
     # Handle case where modules aren't found
     pass
 
+# Reset pooled boto3 clients before each test so patched sessions take effect
+@pytest.fixture(autouse=True)
+def reset_client_pool():
+    """Reset the process-wide client pool before each test"""
+    try:
+        from src.layer_utils.layer_utils.client_utils import client_pool as src_client_pool
+        src_client_pool.clear()
+        from layer_utils.client_utils import client_pool
+        client_pool.clear()
+    except ImportError:
+        pass
+
+    yield
+
 # Reset circuit state before each test
 @pytest.fixture(autouse=True)
 def reset_circuit_state(request):
@@ -8,6 +8,10 @@ import os
 import io
 import json
 import base64
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
 from unittest import TestCase
 from unittest.mock import MagicMock, patch
 from pytest import raises
@@ -19,12 +23,15 @@ from cryptography import x509
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import serialization
 from layer_utils.aws_utils import s3_object, s3_object_bytes, verify_queue
+from layer_utils.aws_utils import s3_object_buffer, s3_object_chunks, s3_object_lines
 from layer_utils.aws_utils import get_policy_arn, get_thing_group_arn, get_thing_type_arn, get_thing_arn
-from layer_utils.aws_utils import send_sqs_message, send_sqs_message_batch, send_sqs_message_batch_with_retry
-from layer_utils.aws_utils import get_queue_depth, calculate_optimal_delay, send_sqs_message_with_throttling, send_sqs_message_with_adaptive_throttling
-from layer_utils.aws_utils import get_certificate_arn, register_certificate
+from layer_utils.sqs_utils import send_sqs_message, send_sqs_message_batch_with_retry
+from layer_utils.sqs_utils import send_sqs_message_batch_prepare, sqs_entry_batches, SqsSendError
+from layer_utils.sqs_utils import get_queue_depth, calculate_optimal_delay, send_sqs_message_with_throttling, send_sqs_message_with_adaptive_throttling
+from layer_utils.aws_utils import get_certificate, get_certificate_arn, register_certificate
 from layer_utils.aws_utils import process_thing, process_thing_type, process_policy
 from layer_utils.aws_utils import process_thing_group, boto_errorcode
+from layer_utils.client_utils import client_pool, get_client
 from layer_utils.cert_utils import decode_certificate
 from layer_utils.circuit_state import clear_circuits, reset_circuit
 
@@ -166,10 +173,9 @@ class TestAwsUtils(TestCase):
         iot_client.create_policy(policyName=policy_name, policyDocument=policy_document)
 
         cert = decode_certificate(self.local_cert_loaded)
-        certificate_id = register_certificate(cert, session=_get_default_session())
-        certificate_arn = get_certificate_arn(certificate_id, _get_default_session())
+        certificate = register_certificate(cert, session=_get_default_session())
 
-        process_policy(policy_name, certificate_arn, _get_default_session())
+        process_policy(policy_name, certificate.certificate_arn, _get_default_session())
 
     def test_pos_process_thing_group(self):
         iot_client = _get_default_session().client('iot')
@@ -339,7 +345,8 @@ class TestAwsUtils(TestCase):
             mock_iot.get_policy.side_effect = None
 
         # Now make the call succeed and verify circuit resets
-        # We need to patch the client again to return success
+        # We need to patch the client again to return success, dropping the pooled mock
+        client_pool.clear()
         with patch('boto3.Session.client') as mock_client:
             mock_iot = MagicMock()
             mock_iot.get_policy.return_value = {'policyArn': 'arn:aws:iot:us-east-1:123456789012:policy/test_policy'}
@@ -370,9 +377,17 @@ class TestAwsUtils(TestCase):
     def test_pos_get_certificate_arn(self):
         """Positive test for get_certificate_arn"""
         cert = decode_certificate(self.local_cert_loaded)
-        certificate_id = register_certificate(cert, session=_get_default_session())
-        certificate_arn = get_certificate_arn(certificate_id, _get_default_session())
+        certificate = register_certificate(cert, session=_get_default_session())
+        certificate_arn = get_certificate_arn(certificate.certificate_id, _get_default_session())
         assert certificate_arn is not None
+        assert certificate_arn == certificate.certificate_arn
+
+    def test_pos_get_certificate(self):
+        """get_certificate returns the id and ARN from one describe call"""
+        cert = decode_certificate(self.local_cert_loaded)
+        registered = register_certificate(cert, session=_get_default_session())
+        found = get_certificate(registered.certificate_id, _get_default_session())
+        assert found == registered
 
     def test_neg_get_certificate_arn(self):
         """Negative test for get_certificate_arn"""
@@ -391,13 +406,14 @@ class TestAwsUtils(TestCase):
         """Positive test case for attaching policy to certificate"""
         iot_client = _get_default_session().client('iot')
         cert = decode_certificate(self.local_cert_loaded)
-        certificate_id = register_certificate(cert, session=_get_default_session())
-        certificate_arn = get_certificate_arn(certificate_id, _get_default_session())
+        certificate = register_certificate(cert, session=_get_default_session())
         thing_name = "process_thing"
-        iot_client.create_thing(thingName=thing_name)
+        thing_arn = iot_client.create_thing(thingName=thing_name)['thingArn']
 
-        # Assume operation success with no raise
-        process_thing(thing_name, certificate_arn=certificate_arn, session=_get_default_session())
+        thing = process_thing(thing_name,
+                              certificate_arn=certificate.certificate_arn,
+                              session=_get_default_session())
+        assert thing == (thing_name, thing_arn)
 
     def test_pos_process_thing_with_type(self):
         """ Positive test case for attaching policy to certificate """
@@ -412,17 +428,17 @@ class TestAwsUtils(TestCase):
         """Positive test case for attaching policy to certificate"""
         cert = decode_certificate(self.local_cert_loaded)
         cr = register_certificate(cert, session=_get_default_session())
-        cr_arn = get_certificate_arn(cr, _get_default_session())
-        # Assume operation success with no raise
-        process_thing('my_thing', cr_arn, session=_get_default_session())
+        # The created thing's ARN comes back from create_thing
+        thing = process_thing('my_thing', cr.certificate_arn, session=_get_default_session())
+        assert thing.thing_arn is not None
 
     def test_pos_process_thing_with_type_no_prev_thing(self):
         """Positive test case for attaching policy to certificate"""
         cert = decode_certificate(self.local_cert_loaded)
         cr = register_certificate(cert, session=_get_default_session())
-        cr_arn = get_certificate_arn(cr, _get_default_session())
-        # Assume operation success with no raise
-        process_thing('my_thing', cr_arn, session=_get_default_session())
+        # The created thing's ARN comes back from create_thing
+        thing = process_thing('my_thing', cr.certificate_arn, session=_get_default_session())
+        assert thing.thing_arn is not None
 
         # Assume operation success with no raise
         process_thing_type('my_thing', self.thing_type_name, _get_default_session())
@@ -449,7 +465,7 @@ class TestAwsUtils(TestCase):
             assert boto_errorcode(exc.value) == 'InvalidParameterValue'
             mock_sqs.send_message.assert_called_once()
 
-    def test_pos_send_sqs_message_batch(self):
+    def test_pos_send_sqs_message_batch_with_retry_single_batch(self):
         """Test sending multiple messages to SQS in batch"""
         messages = [
             {"thing": "device-001", "certificate": "cert1"},
@@ -469,7 +485,8 @@ class TestAwsUtils(TestCase):
             }
             mock_client.return_value = mock_sqs
 
-            result = send_sqs_message_batch(messages, self.queue_url, _get_default_session())
+            result = send_sqs_message_batch_with_retry(messages, self.queue_url,
+                                                       _get_default_session())
 
             # Verify batch was sent
             assert len(result) == 1
@@ -483,7 +500,7 @@ class TestAwsUtils(TestCase):
             assert entries[0]['Id'] == '0'
             assert 'device-001' in entries[0]['MessageBody']
 
-    def test_pos_send_sqs_message_batch_large(self):
+    def test_pos_send_sqs_message_batch_with_retry_large(self):
         """Test sending more than 10 messages (multiple batches)"""
         messages = [{"thing": f"device-{i:03d}", "certificate": f"cert{i}"} for i in range(25)]
         
@@ -495,40 +512,13 @@ class TestAwsUtils(TestCase):
             }
             mock_client.return_value = mock_sqs
 
-            result = send_sqs_message_batch(messages, self.queue_url, _get_default_session())
+            result = send_sqs_message_batch_with_retry(messages, self.queue_url,
+                                                       _get_default_session())
 
             # Should make 3 batch calls (10 + 10 + 5)
             assert len(result) == 3
             assert mock_sqs.send_message_batch.call_count == 3
 
-    def test_pos_send_sqs_message_batch_partial_failure(self):
-        """Test handling partial failures in batch send"""
-        messages = [
-            {"thing": "device-001", "certificate": "cert1"},
-            {"thing": "device-002", "certificate": "cert2"},
-            {"thing": "device-003", "certificate": "cert3"}
-        ]
-        
-        with patch('boto3.Session.client') as mock_client:
-            mock_sqs = MagicMock()
-            mock_sqs.send_message_batch.return_value = {
-                'Successful': [
-                    {'Id': '0', 'MessageId': 'msg-001'},
-                    {'Id': '2', 'MessageId': 'msg-003'}
-                ],
-                'Failed': [
-                    {'Id': '1', 'Code': 'InvalidParameterValue', 'Message': 'Invalid message'}
-                ]
-            }
-            mock_client.return_value = mock_sqs
-
-            result = send_sqs_message_batch(messages, self.queue_url, _get_default_session())
-
-            # Should still return result with partial success
-            assert len(result) == 1
-            assert len(result[0]['Successful']) == 2
-            assert len(result[0]['Failed']) == 1
-
     def test_pos_send_sqs_message_batch_with_retry(self):
         """Test batch send with retry functionality"""
         messages = [
@@ -558,23 +548,163 @@ class TestAwsUtils(TestCase):
             assert mock_sqs.send_message_batch.call_count == 2
             assert len(result) == 2
 
-    def test_neg_send_sqs_message_batch_client_error(self):
-        """Test handling of ClientError in send_sqs_message_batch function"""
-        messages = [{"thing": "device-001", "certificate": "cert1"}]
-        
-        with patch('boto3.Session.client') as mock_client:
+    def test_pos_send_sqs_message_batch_with_retry_concurrent(self):
+        """Batches are sent concurrently and results keep message order"""
+        messages = [{"thing": f"device-{i:03d}"} for i in range(45)]
+        lock = Lock()
+        active = [0, 0]
+
+        def send_message_batch(QueueUrl, Entries):
+            with lock:
+                active[0] += 1
+                active[1] = max(active[1], active[0])
+            # Later batches finish first
+            time.sleep(0.05 - int(Entries[0]['Id']) / 1000)
+            with lock:
+                active[0] -= 1
+            failed = [e for e in Entries if e['Id'] == '23']
+            return {'Successful': [{'Id': e['Id'], 'MessageId': e['Id']}
+                                   for e in Entries if e not in failed],
+                    'Failed': [{'Id': e['Id'], 'Code': 'InvalidParameterValue',
+                                'Message': 'Invalid message', 'SenderFault': True}
+                               for e in failed]}
+
+        failure_sink = MagicMock()
+        with patch('boto3.Session.client') as mock_client, \
+             patch('layer_utils.sqs_utils.SQS_SEND_CONCURRENCY', 4):
             mock_sqs = MagicMock()
-            mock_sqs.send_message_batch.side_effect = ClientError(
-                error_response={'Error': {'Code': 'InvalidParameterValue', 'Message': 'Invalid queue URL'}},
-                operation_name='SendMessageBatch'
-            )
+            mock_sqs.send_message_batch.side_effect = send_message_batch
             mock_client.return_value = mock_sqs
 
-            with raises(ClientError) as exc:
-                send_sqs_message_batch(messages, "invalid-queue-url", _get_default_session())
-                
-            assert boto_errorcode(exc.value) == 'InvalidParameterValue'
-            mock_sqs.send_message_batch.assert_called_once()
+            result = send_sqs_message_batch_with_retry(messages, self.queue_url,
+                                                       _get_default_session(),
+                                                       failure_sink=failure_sink)
+
+        assert active[1] > 1
+        assert [r['Successful'][0]['Id'] for r in result] == ['0', '10', '20', '30', '40']
+        assert [f.entry_id for f in failure_sink.call_args.args[0]] == ['23']
+
+    def test_pos_sqs_entry_batches_payload_limit(self):
+        """Batches are split at the payload limit as well as the entry limit"""
+        messages = [{"certificate": "x" * 100 * 1024} for _ in range(5)]
+        messages += [{"thing": f"device-{i}"} for i in range(12)]
+        entries = send_sqs_message_batch_prepare(0, messages)
+
+        batches = sqs_entry_batches(entries)
+
+        assert [len(b) for b in batches] == [2, 2, 10, 3]
+        assert [e for b in batches for e in b] == entries
+        assert all(sum(len(e['MessageBody']) for e in b) <= 256 * 1024 for b in batches)
+
+    def test_pos_send_sqs_message_batch_with_retry_targets_failures(self):
+        """Only failed messages are retried, matched by their original index"""
+        messages = [{"thing": f"device-{i:03d}"} for i in range(25)]
+        sent = []
+
+        def send_message_batch(QueueUrl, Entries):
+            sent.append(Entries)
+            # The first batch has no Failed key at all
+            failed = [e for e in Entries if len(sent) <= 3 and e['Id'] in ('13', '21')]
+            response = {'Successful': [{'Id': e['Id'], 'MessageId': e['Id']}
+                                       for e in Entries if e not in failed]}
+            if failed:
+                response['Failed'] = [{'Id': e['Id'], 'Code': 'Throttling',
+                                       'Message': 'Rate exceeded', 'SenderFault': False}
+                                      for e in failed]
+            return response
+
+        with patch('boto3.Session.client') as mock_client, \
+             patch('layer_utils.sqs_utils.SQS_SEND_CONCURRENCY', 1), \
+             patch('time.sleep') as mock_sleep:
+            mock_sqs = MagicMock()
+            mock_sqs.send_message_batch.side_effect = send_message_batch
+            mock_client.return_value = mock_sqs
+
+            result = send_sqs_message_batch_with_retry(messages, self.queue_url,
+                                                       _get_default_session())
+
+        assert len(sent) == 4
+        retried = sent[3]
+        assert [e['Id'] for e in retried] == ['13', '21']
+        assert [json.loads(e['MessageBody']) for e in retried] == [messages[13], messages[21]]
+        assert sum(len(r['Successful']) for r in result) == 25
+        mock_sleep.assert_called_once()
+        assert 0 <= mock_sleep.call_args[0][0] <= 1
+
+    def test_neg_send_sqs_message_batch_with_retry_failure_sink(self):
+        """Messages that cannot be sent are handed to the failure sink"""
+        messages = [{"thing": f"device-{i:03d}"} for i in range(3)]
+        sink = MagicMock()
+
+        with patch('boto3.Session.client') as mock_client, patch('time.sleep'):
+            mock_sqs = MagicMock()
+            mock_sqs.send_message_batch.side_effect = lambda QueueUrl, Entries: {
+                'Successful': [{'Id': e['Id'], 'MessageId': e['Id']}
+                               for e in Entries if e['Id'] == '1'],
+                'Failed': [{'Id': '0', 'Code': 'InvalidParameterValue', 'Message': 'Too big',
+                            'SenderFault': True}] * any(e['Id'] == '0' for e in Entries) +
+                          [{'Id': '2', 'Code': 'InternalError', 'Message': 'Try again',
+                            'SenderFault': False}]
+            }
+            mock_client.return_value = mock_sqs
+
+            send_sqs_message_batch_with_retry(messages, self.queue_url, _get_default_session(),
+                                              max_retries=3, failure_sink=sink)
+
+        # The sender fault is not retried; the other failure is tried three times
+        assert [len(c.kwargs['Entries']) for c in mock_sqs.send_message_batch.call_args_list] \
+            == [3, 1, 1]
+        sink.assert_called_once()
+        failures = sink.call_args[0][0]
+        assert [(f.entry_id, f.message, f.code, f.sender_fault) for f in failures] == [
+            ('0', messages[0], 'InvalidParameterValue', True),
+            ('2', messages[2], 'InternalError', False)]
+
+    def test_neg_send_sqs_message_batch_with_retry_raises_without_sink(self):
+        """Without a failure sink, messages that cannot be sent raise SqsSendError"""
+        messages = [{"thing": f"device-{i:03d}"} for i in range(3)]
+
+        with patch('boto3.Session.client') as mock_client, patch('time.sleep'):
+            mock_sqs = MagicMock()
+            mock_sqs.send_message_batch.side_effect = lambda QueueUrl, Entries: {
+                'Successful': [{'Id': e['Id'], 'MessageId': e['Id']}
+                               for e in Entries if e['Id'] != '1'],
+                'Failed': [{'Id': '1', 'Code': 'InvalidParameterValue', 'Message': 'Too big',
+                            'SenderFault': True}] * any(e['Id'] == '1' for e in Entries)
+            }
+            mock_client.return_value = mock_sqs
+
+            with raises(SqsSendError) as exc:
+                send_sqs_message_batch_with_retry(messages, self.queue_url,
+                                                  _get_default_session())
+
+        mock_sqs.send_message_batch.assert_called_once()
+        assert [(f.entry_id, f.message) for f in exc.value.failures] == [('1', messages[1])]
+
+    def test_neg_send_sqs_message_batch_with_retry_request_error(self):
+        """A failed request only retries the messages in that request"""
+        messages = [{"thing": f"device-{i:03d}"} for i in range(15)]
+        error = ClientError({'Error': {'Code': 'ServiceUnavailable', 'Message': 'Unavailable'}},
+                            'SendMessageBatch')
+        calls = []
+
+        def send_message_batch(QueueUrl, Entries):
+            calls.append([e['Id'] for e in Entries])
+            if len(calls) == 2:
+                raise error
+            return {'Successful': [{'Id': e['Id'], 'MessageId': e['Id']} for e in Entries]}
+
+        with patch('boto3.Session.client') as mock_client, \
+             patch('layer_utils.sqs_utils.SQS_SEND_CONCURRENCY', 1), patch('time.sleep'):
+            mock_sqs = MagicMock()
+            mock_sqs.send_message_batch.side_effect = send_message_batch
+            mock_client.return_value = mock_sqs
+
+            result = send_sqs_message_batch_with_retry(messages, self.queue_url,
+                                                       _get_default_session())
+
+        assert calls[2] == [str(i) for i in range(10, 15)]
+        assert sum(len(r['Successful']) for r in result) == 15
 
     def test_neg_send_sqs_message_batch_with_retry_max_retries(self):
         """Test batch send with retry when max retries exceeded"""
@@ -595,6 +725,15 @@ class TestAwsUtils(TestCase):
             assert boto_errorcode(exc.value) == 'ServiceUnavailable'
             assert mock_sqs.send_message_batch.call_count == 2  # Initial + 1 retry
 
+    def test_neg_send_sqs_message_batch_with_retry_zero_retries(self):
+        """max_retries below 1 is rejected before anything is sent"""
+        with patch('boto3.Session.client') as mock_client:
+            with raises(ValueError):
+                send_sqs_message_batch_with_retry([{"thing": "device-000"}], self.queue_url,
+                                                  _get_default_session(), max_retries=0)
+
+        mock_client.return_value.send_message_batch.assert_not_called()
+
     def test_pos_get_queue_depth(self):
         """Test getting queue depth metrics for throttling"""
         with patch('boto3.Session.client') as mock_client:
@@ -948,3 +1087,95 @@ class TestAwsUtils(TestCase):
                 thingTypeName=thing_type_name,
                 removeThingType=False
             )
+
+    def test_pos_client_pool_reuse(self):
+        """Pooled clients are reused per session, service, and region"""
+        client_pool.clear()
+        session = _get_default_session()
+        c1 = get_client('iot', session)
+        c2 = get_client('iot', session)
+        c3 = get_client('iot', session, region_name='us-west-2')
+        c4 = get_client('sqs', session)
+
+        assert c1 is c2
+        assert c1 is not c3
+        assert c1 is not c4
+        assert c1.meta.config.max_pool_connections == 50
+        assert client_pool.stats() == {'hits': 1, 'misses': 3, 'clients': 3}
+
+    def test_pos_client_pool_distinct_sessions(self):
+        """A different session never receives another session's client"""
+        client_pool.clear()
+        c1 = get_client('iot', _get_default_session())
+        c2 = get_client('iot', Session(region_name='us-east-1'))
+        assert c1 is not c2
+        assert client_pool.stats()['misses'] == 2
+
+    def test_pos_client_pool_threaded(self):
+        """Concurrent lookups create exactly one client"""
+        client_pool.clear()
+        session = _get_default_session()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            clients = list(executor.map(lambda _: get_client('iot', session), range(32)))
+        assert len({id(c) for c in clients}) == 1
+        assert client_pool.stats() == {'hits': 31, 'misses': 1, 'clients': 1}
+
+    def test_pos_s3_object_lines(self):
+        """Streamed lines reassemble to the object content"""
+        lines = list(s3_object_lines("unit_test_s3_bucket", "manifest.csv",
+                                     session=_get_default_session(), keepends=True,
+                                     chunk_size=100))
+        assert b"".join(lines) == self.test_s3_object_content
+        assert lines[0].rstrip() == b"MAC,cn,cert"
+
+    def test_pos_s3_object_chunks_range(self):
+        """Ranged reads return only the requested inclusive byte range"""
+        chunks = list(s3_object_chunks("unit_test_s3_bucket", "manifest.csv",
+                                       session=_get_default_session(), chunk_size=7,
+                                       range_start=4, range_end=49))
+        assert max(len(c) for c in chunks) <= 7
+        assert b"".join(chunks) == self.test_s3_object_content[4:50]
+
+    def test_neg_s3_object_stream(self):
+        """Missing objects raise when the stream is opened"""
+        with raises(ClientError):
+            list(s3_object_lines("unit_test_s3_bucket", "missing.csv",
+                                 session=_get_default_session()))
+
+    def test_pos_s3_object_buffer_per_call(self):
+        """Each call without a buffer gets its own, sized to the object"""
+        first = s3_object("unit_test_s3_bucket", "manifest.csv", session=_get_default_session())
+        second = s3_object("unit_test_s3_bucket", "manifest.csv", session=_get_default_session())
+        assert first is not second
+        assert first.getvalue() == second.getvalue() == self.test_s3_object_content
+
+    def test_pos_s3_object_buffer_released(self):
+        """The context managed buffer is closed when the block exits"""
+        with s3_object_buffer("unit_test_s3_bucket", "manifest.csv",
+                              session=_get_default_session()) as fs:
+            assert fs.read() == self.test_s3_object_content
+        assert fs.closed
+
+    def test_pos_s3_object_memory_regression(self):
+        """Downloading many objects in one process does not accumulate memory"""
+        s3_client = client('s3', region_name="us-east-1")
+        blob_size = 64 * 1024
+        for i in range(5):
+            s3_client.put_object(Bucket=self.test_s3_bucket_name, Key=f"blob-{i}",
+                                 Body=os.urandom(blob_size))
+
+        s3_object(self.test_s3_bucket_name, "blob-0", session=_get_default_session())
+        tracemalloc.start()
+        try:
+            baseline = tracemalloc.get_traced_memory()[0]
+            for i in range(50):
+                r = s3_object(self.test_s3_bucket_name, f"blob-{i % 5}",
+                              session=_get_default_session())
+                assert len(r.getvalue()) == blob_size
+                s3_object_bytes(self.test_s3_bucket_name, f"blob-{i % 5}",
+                                session=_get_default_session())
+            growth = tracemalloc.get_traced_memory()[0] - baseline
+        finally:
+            tracemalloc.stop()
+        # A shared buffer would retain all 50 downloads (3.2MB)
+        assert growth < 10 * blob_size
@@ -8,6 +8,7 @@ import os
 import base64
 import json
 import logging
+import unittest.mock
 from unittest import TestCase
 from unittest.mock import MagicMock, patch
 from moto import mock_aws
@@ -40,7 +41,12 @@ os.environ["POWERTOOLS_LOG_LEVEL"] = "CRITICAL"
 # Mock the idempotency module before importing the main module
 with patch('aws_lambda_powertools.utilities.idempotency.idempotent_function', lambda *args, **kwargs: lambda f: f):
     from bulk_importer.main import get_certificate_fingerprint, process_certificate
-    from bulk_importer.main import lambda_handler, certificate_key_generator
+    from bulk_importer.main import lambda_handler, certificate_key_generator, process_batch
+    from bulk_importer.main import AssociationError, association_steps, process_associations
+
+from layer_utils.aws_utils import CertificateRef
+from layer_utils.cert_utils import certificate_info
+from layer_utils.message_utils import importer_message, pack_messages
 
 from .model_bulk_importer import LambdaSQSClass
 
@@ -147,28 +153,89 @@ class TestBulkImporter(TestCase):
                 )
                 
                 # Mock register_certificate to return a fixed fingerprint
-                with patch('bulk_importer.main.register_certificate') as mock_register, \
-                             patch('bulk_importer.main.get_certificate_arn') as mock_arn:
+                with patch('bulk_importer.main.register_certificate') as mock_register:
 
                     fingerprint = get_certificate_fingerprint(pem_obj)
-                    mock_register.return_value = fingerprint
-                    mock_arn.return_value = "test-certificate-arn"
+                    mock_register.return_value = CertificateRef(fingerprint,
+                                                                "test-certificate-arn")
 
                     r, arn = process_certificate(c, _get_default_session())
                     self.assertEqual(r, fingerprint)
+                    self.assertEqual(arn, "test-certificate-arn")
                     mock_register.assert_called_once()
 
+    def test_process_certificate_compact_message(self):
+        """A version 2 message registers the same PEM as the legacy format"""
+        with open('./test/artifacts/single.pem', 'rb') as data:
+            pem = data.read()
+        message = importer_message({}, certificate_info(pem), thing_name='test-thing')
+        legacy = {'certificate': str(base64.b64encode(pem)), 'thing': 'test-thing'}
+        self.assertNotEqual(certificate_key_generator(message, None).split(':')[:2],
+                            certificate_key_generator(legacy, None).split(':')[:2])
+
+        with patch('bulk_importer.main.get_certificate') as mock_get, \
+             patch('bulk_importer.main.register_certificate') as mock_register, \
+             patch('bulk_importer.main.logger'):
+            mock_get.side_effect = ClientError(
+                {'Error': {'Code': 'ResourceNotFoundException', 'Message': 'Not found'}},
+                'get_certificate'
+            )
+            mock_register.return_value = CertificateRef("id", "arn")
+            for config in (message, legacy):
+                self.assertEqual(process_certificate(config, _get_default_session()),
+                                 ("id", "arn"))
+
+        registered = [c.kwargs['certificate'] for c in mock_register.call_args_list]
+        self.assertEqual(registered, [pem.decode('ascii')] * 2)
+        fingerprints = [c.args[0] for c in mock_get.call_args_list]
+        self.assertEqual(fingerprints, [message['fp']] * 2)
+
+    def test_process_certificate_trusts_fingerprint(self):
+        """A known certificate is found by the provider's fingerprint without decoding it"""
+        with open('./test/artifacts/single.pem', 'rb') as data:
+            message = importer_message({}, certificate_info(data.read()))
+        with patch('bulk_importer.main.get_certificate') as mock_get, \
+             patch('bulk_importer.main.load_certificate') as mock_load, \
+             patch('bulk_importer.main.message_certificate') as mock_decode, \
+             patch('bulk_importer.main.logger'):
+            mock_get.return_value = CertificateRef(message['fp'], "arn")
+            self.assertEqual(process_certificate(message, _get_default_session()),
+                             (message['fp'], "arn"))
+        mock_get.assert_called_once_with(message['fp'], unittest.mock.ANY)
+        mock_load.assert_not_called()
+        mock_decode.assert_not_called()
+
+    def test_process_certificate_fingerprint_mismatch(self):
+        """A wrong fingerprint is reported once IoT Core registers the certificate"""
+        with open('./test/artifacts/single.pem', 'rb') as data:
+            pem = data.read()
+        message = importer_message({}, certificate_info(pem)) | {'fp': '0' * 64}
+        actual = certificate_info(pem).fingerprint
+        with patch('bulk_importer.main.get_certificate') as mock_get, \
+             patch('bulk_importer.main.register_certificate') as mock_register, \
+             patch('bulk_importer.main.logger') as mock_logger:
+            mock_get.side_effect = ClientError(
+                {'Error': {'Code': 'ResourceNotFoundException', 'Message': 'Not found'}},
+                'get_certificate'
+            )
+            mock_register.return_value = CertificateRef(actual, "arn")
+            self.assertEqual(process_certificate(message, _get_default_session()),
+                             (actual, "arn"))
+        mock_register.assert_called_once_with(certificate=pem.decode('ascii'),
+                                              session=unittest.mock.ANY)
+        mock_logger.warning.assert_called_once()
+        self.assertEqual(mock_logger.warning.call_args.args[0]['certificate_id'], actual)
+
     def test_idempotency_process_certificate(self):
         """Test idempotency of process_certificate function"""
         # This test verifies that calling process_certificate multiple times with the same input
         # returns the same result without actually processing it again
         
         with patch('bulk_importer.main.register_certificate') as mock_register, \
-             patch('bulk_importer.main.get_certificate_arn') as mock_arn, \
              patch('bulk_importer.main.logger'):  # Suppress logger output
             # Mock register_certificate to return a fixed certificate ID
-            mock_register.return_value = "test-certificate-id"
-            mock_arn.return_value = "test-certificate-arn"
+            certificate = CertificateRef("test-certificate-id", "test-certificate-arn")
+            mock_register.return_value = certificate
 
             # First call should process normally
             config = {'certificate': self.local_cert_loaded, 'thing': 'test-thing-idempotent'}
@@ -191,7 +258,7 @@ class TestBulkImporter(TestCase):
                 
                 # Second call should find the certificate
                 mock_get.side_effect = None
-                mock_get.return_value = "test-certificate-id"
+                mock_get.return_value = certificate
                 
                 result2 = process_certificate(config, _get_default_session())
                 
@@ -204,7 +271,8 @@ class TestBulkImporter(TestCase):
     def test_pos_main(self):
         """ Positive test case for the lambda function main entry """
         config = {'certificate': self.local_cert_loaded, 'thing': 'foo'}
-        e = { "Records": [{'eventSource': 'aws:sqs', 'body': json.dumps(config)}]}
+        e = { "Records": [{'messageId': 'msg-1', 'eventSource': 'aws:sqs',
+                           'body': json.dumps(config)}]}
         os.environ['QUEUE_TARGET']=self.test_sqs_queue_name
         with patch('bulk_importer.main.process_sqs') as mock_process, \
              patch('bulk_importer.main.logger'):  # Suppress logger output
@@ -212,7 +280,153 @@ class TestBulkImporter(TestCase):
             mock_entry.process_sqs.return_value = None
             mock_process.return_value = mock_entry
             v = lambda_handler(e, LambdaContext())  # Pass raw dict like AWS sends
-        assert v == e
+        assert v == {'batchItemFailures': []}
+
+    def test_main_packed_message(self):
+        """Each certificate of a packed message is imported, and a failure returns the message once"""
+        with open('./test/artifacts/certificates_test.txt', 'rb') as data:
+            pems = [base64.b64decode(line) for line in data.read().split()[:3]]
+        messages = [importer_message({'thing_type_name': 'type'}, certificate_info(pem))
+                    for pem in pems]
+        packed = pack_messages(messages, pack_size=10)
+        self.assertEqual(len(packed), 1)
+        single = {'certificate': self.local_cert_loaded, 'thing': 'foo'}
+        e = {"Records": [{'messageId': 'packed', 'eventSource': 'aws:sqs',
+                          'body': json.dumps(packed[0])},
+                         {'messageId': 'single', 'eventSource': 'aws:sqs',
+                          'body': json.dumps(single)}]}
+
+        def process(config, session):
+            if config['thing'] != 'foo' and config['der'] == messages[1]['der']:
+                raise RuntimeError("import failed")
+            return {'thing_name': config['thing']}
+
+        with patch('bulk_importer.main.process_sqs', side_effect=process) as mock_process, \
+             patch('bulk_importer.main.logger'):
+            v = lambda_handler(e, LambdaContext())
+        self.assertEqual(mock_process.call_count, 4)
+        self.assertEqual(sorted(c.args[0]['thing'] for c in mock_process.call_args_list),
+                         sorted([m['thing'] for m in messages] + ['foo']))
+        self.assertEqual(v, {'batchItemFailures': [{'itemIdentifier': 'packed'}]})
+
+    def test_process_batch_collapses_duplicates(self):
+        """Duplicate records in a batch are imported once and share the result"""
+        config = {'certificate': self.local_cert_loaded, 'thing': 'foo'}
+        other = {'certificate': self.local_cert_loaded, 'thing': 'bar'}
+        records = [('msg-1', config), ('msg-2', dict(config)), ('msg-3', other)]
+        with patch('bulk_importer.main.process_sqs') as mock_process, \
+             patch('bulk_importer.main.logger'):
+            mock_process.side_effect = lambda c, session: {'thing_name': c['thing']}
+            results = process_batch(records, _get_default_session())
+
+        self.assertEqual(mock_process.call_count, 2)
+        self.assertEqual([r['message_id'] for r in results], ['msg-1', 'msg-2', 'msg-3'])
+        self.assertTrue(all(r['status'] == 'success' for r in results))
+        self.assertEqual(results[1]['result'], {'thing_name': 'foo'})
+        self.assertEqual(results[2]['result'], {'thing_name': 'bar'})
+
+    def test_process_batch_legacy_associations_not_collapsed(self):
+        """Records differing only in legacy association fields are imported separately"""
+        config = {'certificate': self.local_cert_loaded, 'thing': 'foo', 'policy_name': 'p1'}
+        records = [('msg-1', config),
+                   ('msg-2', config | {'policy_name': 'p2'}),
+                   ('msg-3', config | {'thing_group_arn': 'g1'}),
+                   ('msg-4', config | {'policies': [{'name': 'p1'}]})]
+        with patch('bulk_importer.main.process_sqs') as mock_process, \
+             patch('bulk_importer.main.logger'):
+            mock_process.side_effect = lambda c, session: {'thing_name': c['thing']}
+            process_batch(records, _get_default_session())
+
+        # The list form naming the same policy is the same association set as msg-1
+        self.assertEqual(mock_process.call_count, 3)
+
+    def test_process_batch_reports_failures(self):
+        """A failing record is reported without stopping the rest of the batch"""
+        records = [('msg-%d' % i, {'certificate': self.local_cert_loaded, 'thing': f't{i}'})
+                   for i in range(4)]
+        error = ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate'}},
+                            'CreateThing')
+
+        def fake_process(config, session):
+            if config['thing'] == 't2':
+                raise error
+            return {'thing_name': config['thing']}
+
+        with patch('bulk_importer.main.process_sqs', side_effect=fake_process), \
+             patch('bulk_importer.main.logger'):
+            results = process_batch(records, _get_default_session())
+
+        self.assertEqual([r['status'] for r in results],
+                         ['success', 'success', 'failed', 'success'])
+        self.assertIs(results[2]['error'], error)
+
+    def test_main_partial_batch_failure(self):
+        """Only the failed message is reported back to SQS for retry"""
+        records = [{'messageId': f'msg-{i}', 'eventSource': 'aws:sqs',
+                    'body': json.dumps({'certificate': self.local_cert_loaded, 'thing': f't{i}'})}
+                   for i in range(3)]
+
+        def fake_process(config, session):
+            if config['thing'] == 't1':
+                raise ValueError("bad record")
+            return {'thing_name': config['thing']}
+
+        with patch('bulk_importer.main.process_sqs', side_effect=fake_process), \
+             patch('bulk_importer.main.logger'):
+            v = lambda_handler({"Records": records}, LambdaContext())
+        assert v == {'batchItemFailures': [{'itemIdentifier': 'msg-1'}]}
+
+    def test_main_malformed_message(self):
+        """A malformed body fails only its own message"""
+        good = {'certificate': self.local_cert_loaded, 'thing': 'good'}
+        records = [{'messageId': 'msg-0', 'eventSource': 'aws:sqs', 'body': json.dumps(good)},
+                   {'messageId': 'bad-json', 'eventSource': 'aws:sqs', 'body': '{"thing": '},
+                   {'messageId': 'bad-pack', 'eventSource': 'aws:sqs',
+                    'body': json.dumps({'v': 2, 'certs': 'not a list'})},
+                   {'messageId': 'msg-3', 'eventSource': 'aws:sqs',
+                    'body': json.dumps(good | {'thing': 'also-good'})}]
+
+        with patch('bulk_importer.main.process_sqs') as mock_process, \
+             patch('bulk_importer.main.logger'):
+            mock_process.side_effect = lambda c, session: {'thing_name': c['thing']}
+            v = lambda_handler({"Records": records}, LambdaContext())
+
+        self.assertEqual(sorted(c.args[0]['thing'] for c in mock_process.call_args_list),
+                         ['also-good', 'good'])
+        self.assertEqual(v, {'batchItemFailures': [{'itemIdentifier': 'bad-json'},
+                                                   {'itemIdentifier': 'bad-pack'}]})
+
+    def test_association_steps(self):
+        """Association steps cover policies, thing groups and thing type in order"""
+        config = {
+            'thing': 'foo',
+            'policies': [{'name': 'p1'}, {'name': 'p2'}],
+            'thing_groups': [{'arn': 'g1'}],
+            'thing_type_name': 't1'
+        }
+        steps = association_steps(config, 'cert-arn', 'thing-arn', _get_default_session())
+        self.assertEqual([step for step, _ in steps],
+                         ['policy p1', 'policy p2', 'thing group g1', 'thing type t1'])
+
+    def test_process_associations_aggregates_errors(self):
+        """All steps run, and failures are reported in step order"""
+        calls = []
+
+        def ok(name):
+            calls.append(name)
+
+        def fail(name):
+            calls.append(name)
+            raise ValueError(name)
+
+        steps = [('a', lambda: ok('a')), ('b', lambda: fail('b')),
+                 ('c', lambda: ok('c')), ('d', lambda: fail('d'))]
+        with self.assertRaises(AssociationError) as ctx:
+            process_associations('foo', steps, max_workers=4)
+
+        self.assertEqual(sorted(calls), ['a', 'b', 'c', 'd'])
+        self.assertEqual([step for step, _ in ctx.exception.errors], ['b', 'd'])
+        self.assertIsInstance(ctx.exception.__cause__, ValueError)
 
     def tearDown(self):
         # Suppress logs during test teardown
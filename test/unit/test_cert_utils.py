@@ -0,0 +1,64 @@
+"""
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+Unit tests for cert_utils.py
+"""
+import base64
+import unittest
+from unittest.mock import patch
+
+from cryptography.hazmat.primitives import serialization
+from layer_utils.cert_utils import (certificate_info, decode_certificate, der_to_pem, get_cn,
+                                    get_certificate_fingerprint, load_certificate, pem_blocks)
+
+class TestCertificateInfo(unittest.TestCase):
+    """Test cases for the single parse certificate path"""
+
+    def setUp(self):
+        with open("./test/artifacts/single.pem", "rb") as data:
+            self.pem = data.read()
+        with open("./test/artifacts/certificates_test.txt", "rb") as data:
+            self.lines = data.read().split()
+
+    def test_matches_separate_calls(self):
+        """The thing name and fingerprint agree with the individual routines"""
+        certificate = load_certificate(self.pem)
+        info = certificate_info(self.pem)
+        assert info.thing_name == get_cn(self.pem)
+        assert info.fingerprint == get_certificate_fingerprint(certificate)
+        assert base64.b64decode(info.certificate) == \
+            certificate.public_bytes(serialization.Encoding.DER)
+        assert info.chain == ()
+        assert der_to_pem(info.certificate) == self.pem.decode('ascii')
+
+    def test_chain(self):
+        """Further PEM blocks are carried as the chain, leaf first"""
+        leaf, other = (base64.b64decode(line) for line in self.lines[:2])
+        info = certificate_info(leaf + other)
+        assert info == certificate_info(leaf)._replace(chain=info.chain)
+        assert info.chain == (certificate_info(other).certificate,)
+        assert [der_to_pem(b.decode()) for b in pem_blocks(leaf + other)] == \
+            [der_to_pem(info.certificate), der_to_pem(info.chain[0])]
+
+    def test_malformed(self):
+        """Data that is not a certificate is rejected"""
+        for data in (b"-----BEGIN CERTIFICATE-----\nAAAA\n-----END CERTIFICATE-----\n",
+                     b"-----BEGIN CERTIFICATE-----\n!!!!\n-----END CERTIFICATE-----\n",
+                     b"not a certificate"):
+            with self.assertRaises(ValueError, msg=data):
+                certificate_info(data)
+
+    def test_missing_cn(self):
+        """A certificate without a CN gets a generated thing name"""
+        with patch('layer_utils.cert_utils.get_cn_value', side_effect=IndexError):
+            info = certificate_info(self.pem)
+        assert info.thing_name.startswith("Device-")
+
+    def test_decode_certificate(self):
+        """The legacy payload decodes without evaluating it"""
+        payload = str(base64.b64encode(self.pem))
+        assert decode_certificate(payload) == self.pem.decode('ascii')
+        assert decode_certificate(base64.b64encode(self.pem).decode()) == self.pem.decode('ascii')
+        with self.assertRaises(ValueError):
+            decode_certificate("b'__import__(\"os\")'")
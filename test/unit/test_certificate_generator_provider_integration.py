@@ -23,6 +23,7 @@ from src.certificate_generator.generate_certificates import (
 from src.provider_generated.provider_generated.main import (
     process_certificate_file, lambda_handler
 )
+from src.layer_utils.layer_utils.message_utils import message_certificate
 from .model_provider_generated import LambdaS3Class, LambdaSQSClass
 
 
@@ -188,10 +189,12 @@ class TestCertificateGeneratorProviderIntegration(TestCase):
             body = json.loads(message['Body'])
 
             # Check that the message contains the required fields
-            self.assertIn('certificate', body, "Message should contain certificate data")
+            self.assertEqual(body['v'], 2, "Message should use the compact format")
+            self.assertIn('der', body, "Message should contain certificate data")
+            self.assertIn('fp', body, "Message should contain the certificate fingerprint")
             self.assertIn('thing', body, "Message should contain thing name")
-            self.assertIn('bucket', body, "Message should contain bucket name")
-            self.assertIn('key', body, "Message should contain key name")
+            self.assertNotIn('bucket', body, "Provider details should not reach the importer")
+            self.assertNotIn('key', body, "Provider details should not reach the importer")
 
             # Verify the thing name matches the expected pattern
             self.assertTrue(body['thing'].startswith("Device-"),
@@ -199,9 +202,8 @@ class TestCertificateGeneratorProviderIntegration(TestCase):
 
             cert_bytes:bytes = base64.b64decode(certificates[i])
             cert_str:str = cert_bytes.decode('ascii')
-            post_process_certificate = str(base64.b64encode(cert_str.encode('ascii')))
             # Verify the certificate data is the same as what we generated
-            self.assertEqual(body['certificate'], post_process_certificate,
+            self.assertEqual(message_certificate(body), cert_str,
                             "Certificate data in message should match generated certificate")
 
     def test_lambda_handler_with_generated_certificates(self):
@@ -238,7 +240,8 @@ class TestCertificateGeneratorProviderIntegration(TestCase):
         result = lambda_handler(event, LambdaContext())  # Pass raw dict like AWS sends
 
         # Verify the result
-        self.assertEqual(result, event, "Lambda handler should return the original event")
+        self.assertEqual(result, {"batchItemFailures": []},
+                         "Lambda handler should report no failed messages")
 
         # Check that messages were sent to the queue
         sqs_client = self.session.client("sqs")
@@ -0,0 +1,85 @@
+"""
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+Unit tests for json_utils.py
+"""
+import json
+import tracemalloc
+import unittest
+
+from src.layer_utils.layer_utils.json_utils import iter_json_array
+
+def split(data: bytes, size: int) -> list[bytes]:
+    """Cut a document into chunks of size bytes"""
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+class TestIterJsonArray(unittest.TestCase):
+    """Test cases for the incremental JSON array parser"""
+
+    def test_chunk_boundaries(self):
+        """Elements parse identically however the stream is cut"""
+        documents = [
+            [],
+            [1, 22, 333],
+            [{"uniqueId": "é✓" * 5, "values": [1, 2.5e3, None, True, False]}] * 20,
+            ["a, ]", {"nested": [[], {}]}],
+        ]
+        for document in documents:
+            data = json.dumps(document, ensure_ascii=False).encode()
+            for size in (1, 2, 3, 7, 64, len(data) + 1):
+                self.assertEqual(list(iter_json_array(split(data, size))), document)
+
+    def test_split_numbers_and_literals(self):
+        """A number or literal cut at a chunk boundary is read whole"""
+        cases = [
+            ([b'[1.', b'5]'], [1.5]),
+            ([b'[2e', b'3]'], [2e3]),
+            ([b'[2E', b'+', b'3, -', b'4]'], [2e3, -4]),
+            ([b'[1', b'0', b'.2', b'5e-', b'1]'], [1.025]),
+            ([b'[tr', b'ue, nu', b'll, f', b'alse]'], [True, None, False]),
+        ]
+        for chunks, expected in cases:
+            self.assertEqual(list(iter_json_array(chunks)), expected, msg=chunks)
+
+    def test_whitespace_and_trailing_text(self):
+        """Whitespace is skipped and nothing after the closing bracket is read"""
+        chunks = iter([b' \n[ 1 ,\r\n "x" ]', b'not json'])
+        self.assertEqual(list(iter_json_array(chunks)), [1, "x"])
+        self.assertEqual(next(chunks), b'not json')
+
+    def test_malformed(self):
+        """Documents that are not a well formed array are rejected"""
+        for data in (b'', b'{"a": 1}', b'[1, 2', b'[1 2]', b'[1,]', b'[{"a": }]', b'[1.]',
+                     b'[2e]'):
+            with self.assertRaises(ValueError, msg=data):
+                list(iter_json_array(split(data, 3)))
+
+    def test_incremental(self):
+        """Each element is yielded before the rest of the stream is read"""
+        consumed = []
+        def chunks():
+            for chunk in (b'[{"n": 1},', b' {"n": 2}', b']'):
+                consumed.append(chunk)
+                yield chunk
+        elements = iter_json_array(chunks())
+        self.assertEqual(next(elements), {"n": 1})
+        self.assertEqual(len(consumed), 1)
+
+    def test_memory_is_flat(self):
+        """Peak memory does not grow with the number of elements"""
+        element = json.dumps({"protected": "x" * 1024, "payload": "y" * 1024}).encode()
+        def stream(count):
+            yield b'['
+            for i in range(count):
+                yield (b',' if i else b'') + element
+            yield b']'
+
+        peaks = []
+        for count in (100, 2000):
+            tracemalloc.start()
+            seen = sum(1 for _ in iter_json_array(stream(count)))
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            self.assertEqual(seen, count)
+        self.assertLess(peaks[1], peaks[0] * 2)
@@ -0,0 +1,115 @@
+"""
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+Unit tests for message_utils.py
+"""
+import base64
+import json
+import unittest
+
+from layer_utils.cert_utils import certificate_info
+from layer_utils.message_utils import (importer_message, message_certificate,
+                                       message_certificate_key, message_fingerprint,
+                                       message_version, pack_messages, unpack_message)
+
+class TestImporterMessage(unittest.TestCase):
+    """Test cases for the importer message formats"""
+
+    def setUp(self):
+        with open("./test/artifacts/single.pem", "rb") as data:
+            self.pem = data.read()
+        self.config = {
+            'bucket': 'thingpress-generated-stack',
+            'key': 'certificates.txt',
+            'range_start': 0,
+            'range_end': 4095,
+            'policies': [{'name': 'policy', 'arn': 'arn:aws:iot:policy/policy'}],
+            'thing_groups': [{'name': 'group', 'arn': 'arn:aws:iot:thinggroup/group'}],
+            'thing_type_name': 'type'
+        }
+
+    def test_compact_message(self):
+        """Only importer configuration travels, with the certificate encoded once"""
+        info = certificate_info(self.pem)
+        message = importer_message(self.config, info)
+        assert message == {
+            'v': 2,
+            'thing': info.thing_name,
+            'der': info.certificate,
+            'fp': info.fingerprint,
+            'policies': self.config['policies'],
+            'thing_groups': self.config['thing_groups'],
+            'thing_type_name': 'type'
+        }
+        assert importer_message(self.config, info, thing_name='AA:BB')['thing'] == 'AA:BB'
+        # The configuration is referenced, not copied
+        assert message['policies'] is self.config['policies']
+        assert message['thing_groups'] is self.config['thing_groups']
+
+        legacy = self.config | {'thing': info.thing_name,
+                                'certificate': str(base64.b64encode(self.pem))}
+        assert len(json.dumps(message)) < len(json.dumps(legacy))
+
+    def test_both_formats_decode(self):
+        """The importer reads the same certificate from either format"""
+        info = certificate_info(self.pem)
+        message = importer_message(self.config, info)
+        legacy = {'thing': info.thing_name, 'certificate': str(base64.b64encode(self.pem))}
+        assert message_version(message) == 2
+        assert message_version(legacy) == 1
+        assert message_certificate(message) == self.pem.decode('ascii')
+        assert message_certificate(legacy) == self.pem.decode('ascii')
+        assert message_certificate_key(message) == info.certificate
+        assert message_certificate_key(legacy) == legacy['certificate']
+        assert message_certificate_key({'thing': 'x'}) is None
+
+    def test_chain_round_trip(self):
+        """A certificate chain survives the compact format"""
+        with open("./test/artifacts/certificates_test.txt", "rb") as data:
+            chain = b"".join(base64.b64decode(line) for line in data.read().split()[:3])
+        message = importer_message(self.config, certificate_info(chain))
+        assert len(message['chain']) == 2
+        assert message_certificate(message) == chain.decode('ascii')
+
+    def test_fingerprint_hint(self):
+        """Only a well formed SHA-256 fingerprint is offered to the importer"""
+        message = importer_message(self.config, certificate_info(self.pem))
+        assert message_fingerprint(message) == message['fp']
+        for fingerprint in (None, '', 'A' * 64, 'a' * 63, 123):
+            assert message_fingerprint(message | {'fp': fingerprint}) is None
+        assert message_fingerprint({'certificate': str(base64.b64encode(self.pem))}) is None
+
+    def test_pack_round_trip(self):
+        """Packing stores the configuration once and unpacks to the same messages"""
+        with open("./test/artifacts/certificates_test.txt", "rb") as data:
+            pems = [base64.b64decode(line) for line in data.read().split()[:25]]
+        messages = [importer_message(self.config, certificate_info(pem)) for pem in pems]
+
+        packed = pack_messages(messages, pack_size=10, max_bytes=256 * 1024)
+        assert [len(m['certs']) for m in packed] == [10, 10, 5]
+        assert all(m['policies'] == self.config['policies'] for m in packed)
+        assert all('policies' not in c for m in packed for c in m['certs'])
+        assert [u for m in packed for u in unpack_message(m)] == messages
+        assert sum(len(json.dumps(m)) for m in packed) < \
+            sum(len(json.dumps(m)) for m in messages)
+
+        assert pack_messages(messages, pack_size=1) is messages
+        assert unpack_message(messages[0]) == [messages[0]]
+
+    def test_pack_limits(self):
+        """Packs respect the byte cap and never mix configurations or formats"""
+        with open("./test/artifacts/certificates_test.txt", "rb") as data:
+            pems = [base64.b64decode(line) for line in data.read().split()[:12]]
+        messages = [importer_message(self.config, certificate_info(pem)) for pem in pems]
+
+        for packed_message in pack_messages(messages, pack_size=100, max_bytes=4096):
+            assert len(json.dumps(packed_message)) <= 4096
+        assert len(pack_messages(messages, pack_size=100, max_bytes=10)) == 12
+
+        other = importer_message({}, certificate_info(pems[0]))
+        legacy = {'thing': 'x', 'certificate': str(base64.b64encode(pems[0]))}
+        packed = pack_messages(messages[:3] + [other, legacy] + messages[3:5], pack_size=10)
+        assert [len(m.get('certs', [])) for m in packed] == [3, 1, 0, 2]
+        assert packed[2] == legacy
+        assert unpack_message(packed[1]) == [other]
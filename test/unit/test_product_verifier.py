@@ -5,14 +5,17 @@
 Unit tests for bulk_importer
 """
 import os
+import csv
 import json
 from unittest import TestCase
+from unittest.mock import patch
 from pytest import raises
 from moto import mock_aws
 from boto3 import resource, client, _get_default_session
 from aws_lambda_powertools.utilities.data_classes import S3Event
 from aws_lambda_powertools.utilities.typing import LambdaContext
-from src.product_verifier.main import lambda_handler, get_provider_queue
+from src.product_verifier.main import (lambda_handler, get_provider_queue, record_ranges,
+                                      index_ranges, manifest_chunks, generated_chunks)
 from src.layer_utils.layer_utils.circuit_state import reset_circuit
 from .model_product_verifier import LambdaS3Class, LambdaSQSClass
 
@@ -149,6 +152,97 @@ class TestProductProvider(TestCase):
             get_provider_queue(bucket)
         assert e.typename == 'ValueError'
 
+    def test_record_ranges_quoted(self):
+        """ Multi-line quoted fields stay inside one range """
+        lines = [b'a,"x\n', b'y"\n', b'b,z\n', b'\n', b'c,"1\n', b'2\n', b'3"\n']
+        ranges = list(record_ranges(lines, 2, quotechar=b'"'))
+        data = b''.join(lines)
+        assert ranges == [(0, 11), (12, len(data) - 1)]
+        assert data[ranges[1][0]:ranges[1][1] + 1] == b'\nc,"1\n2\n3"\n'
+
+    def test_index_ranges(self):
+        """ Index ranges cover every entry exactly once """
+        assert list(index_ranges(10, 4)) == [(0, 4), (4, 8), (8, 10)]
+        assert not list(index_ranges(0, 4))
+
+    def test_manifest_chunks_espressif(self):
+        """ Chunks of the Espressif manifest parse back to every row """
+        config = {'bucket': self.bucket_espressif_pos, 'key': self.obj_espressif}
+        with patch('src.product_verifier.main.MANIFEST_SPLIT_MIN_BYTES', 0):
+            chunks = manifest_chunks(config, 3, self.session)
+        assert len(chunks) == 3
+
+        with open(self.obj_espressif_local, 'rb') as data:
+            manifest = data.read()
+        with open(self.obj_espressif_local, newline='', encoding='ascii') as data:
+            expected = list(csv.DictReader(data))
+        rows = []
+        for chunk in chunks:
+            assert chunk['key'] == self.obj_espressif
+            part = manifest[chunk['range_start']:chunk['range_end'] + 1].decode()
+            rows.extend(csv.DictReader(part.splitlines(keepends=True),
+                                       fieldnames=chunk['fieldnames']))
+        assert rows == expected
+
+    def test_generated_chunks(self):
+        """ Generated files split into contiguous byte ranges sized from the first line """
+        s3_client = client('s3', region_name='us-east-1')
+        with open(self.obj_generated_local, 'rb') as data:
+            content = data.read()
+        s3_client.put_object(Bucket=self.bucket_generated_pos,
+                             Key=self.obj_generated, Body=content)
+        line_size = len(content.splitlines(keepends=True)[0])
+
+        chunks = generated_chunks(self.bucket_generated_pos, self.obj_generated, 2, self.session)
+        assert chunks[0]['range_start'] == 0
+        assert chunks[0]['range_end'] == min(2 * line_size, len(content)) - 1
+        assert chunks[-1]['range_end'] == len(content) - 1
+        for previous, chunk in zip(chunks, chunks[1:]):
+            assert chunk['range_start'] == previous['range_end'] + 1
+
+    def test_manifest_chunks_small_object(self):
+        """ Objects below the split threshold are forwarded whole """
+        config = {'bucket': self.bucket_espressif_pos, 'key': self.obj_espressif}
+        assert manifest_chunks(config, 3, self.session) == [config]
+
+    def test_manifest_chunks_microchip(self):
+        """ Microchip manifests split by entry index """
+        s3_client = client('s3', region_name='us-east-1')
+        with open(self.obj_microchip_local, 'rb') as data:
+            s3_client.put_object(Bucket=self.bucket_microchip_pos,
+                                 Key=self.obj_microchip, Body=data)
+        config = {'bucket': self.bucket_microchip_pos, 'key': self.obj_microchip}
+        with patch('src.product_verifier.main.MANIFEST_SPLIT_MIN_BYTES', 0):
+            chunks = manifest_chunks(config, 4, self.session)
+        assert [(c['index_start'], c['index_end']) for c in chunks] == [(0, 4), (4, 8), (8, 10)]
+
+    def test_pos_lambda_handler_split(self):
+        """ A split manifest enqueues one message per chunk """
+        os.environ['POLICY_NAMES'] = "None"
+        os.environ['THING_GROUP_NAMES'] = "None"
+        os.environ['THING_TYPE_NAME'] = "None"
+        os.environ['QUEUE_TARGET_ESPRESSIF'] = self.env_queue_target_espressif
+        s3_event = {
+            'Records': [
+                {
+                    'eventSource': 'aws:s3',
+                    's3': {
+                        'bucket': {'name': self.bucket_espressif_pos},
+                        'object': {'key': self.obj_espressif}
+                    }
+                }
+            ]
+        }
+        with patch('src.product_verifier.main.MANIFEST_SPLIT_MIN_BYTES', 0), \
+             patch('src.product_verifier.main.MANIFEST_CHUNK_SIZE', 2):
+            lambda_handler(S3Event(s3_event), LambdaContext())
+        sqs_client = self.session.client("sqs")
+        sqs_queue_url = sqs_client.get_queue_url(
+            QueueName=self.env_queue_target_espressif)['QueueUrl']
+        p = sqs_client.get_queue_attributes(QueueUrl=sqs_queue_url,
+                                            AttributeNames=['ApproximateNumberOfMessages'])
+        assert p['Attributes']['ApproximateNumberOfMessages'] == '4'
+
     def test_pos_invoke_export(self):
         """ The number of items in the queue should be 7 since there are
             seven certificates in the test file """
@@ -19,6 +19,7 @@ from aws_lambda_powertools.utilities.data_classes import SQSEvent
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
 from src.provider_espressif.provider_espressif.main import lambda_handler, invoke_export
+from src.product_verifier.main import record_ranges
 from .model_provider_espressif import LambdaS3Class, LambdaSQSClass
 
 @mock_aws(config={
@@ -78,6 +79,29 @@ class TestProviderEspressif(TestCase):
                                             AttributeNames=['ApproximateNumberOfMessages'])
         assert p['Attributes']['ApproximateNumberOfMessages'] == '7'
 
+    def test_pos_invoke_export_range(self):
+        """ A chunk message only forwards the records inside its byte range """
+        with open('./test/artifacts/manifest-espressif.csv', 'rb') as data:
+            lines = data.read().splitlines(keepends=True)
+        ranges = list(record_ranges(lines[1:], 3, len(lines[0]), b'"'))
+        config = {
+            'bucket': self.test_s3_bucket_name,
+            'key': self.test_s3_key_name,
+            'range_start': ranges[1][0],
+            'range_end': ranges[1][1],
+            'fieldnames': ['MAC', 'cn', 'cert']
+        }
+        sqs_client = self.session.client("sqs")
+        sqs_queue_url = sqs_client.get_queue_url(QueueName=self.test_sqs_queue_name)['QueueUrl']
+
+        assert invoke_export(config, "provider", self.session) == 3
+        messages = sqs_client.receive_message(QueueUrl=sqs_queue_url,
+                                              MaxNumberOfMessages=10)['Messages']
+        for message in messages:
+            body = json.loads(message['Body'])
+            assert body['thing'] not in ('MAC', '')
+            assert 'BEGIN CERTIFICATE' not in body['thing']
+
     def test_pos_lambda_handler_1(self):
         """Invoke the main handler with one file"""
         r1 = {
@@ -93,7 +117,24 @@ class TestProviderEspressif(TestCase):
             }
         os.environ['QUEUE_TARGET'] = self.test_sqs_queue_name
         v = lambda_handler(e, LambdaContext())  # Pass raw dict like AWS sends
-        assert v == e
+        assert v == {'batchItemFailures': []}
+
+    def test_neg_lambda_handler_malformed_certificate(self):
+        """A malformed certificate row fails its message instead of dropping the device"""
+        self.session.client('s3').put_object(
+            Bucket=self.test_s3_bucket_name, Key="malformed.csv",
+            Body=b'MAC,cn,cert\n4BA2BB8764BD,cn,"-----BEGIN CERTIFICATE-----\nnot a cert\n'
+                 b'-----END CERTIFICATE-----\n"\n')
+        good = {'bucket': self.test_s3_bucket_name, 'key': self.test_s3_key_name}
+        bad = {'bucket': self.test_s3_bucket_name, 'key': "malformed.csv"}
+        e = { "Records": [
+                {'messageId': 'good-1', 'eventSource': 'aws:sqs', 'body': json.dumps(good)},
+                {'messageId': 'bad-1', 'eventSource': 'aws:sqs', 'body': json.dumps(bad)}
+            ]
+        }
+        os.environ['QUEUE_TARGET'] = self.test_sqs_queue_name
+        v = lambda_handler(e, LambdaContext())
+        assert v == {'batchItemFailures': [{'itemIdentifier': 'bad-1'}]}
 
     def tearDown(self):
         s3_resource = self.session.resource('s3')
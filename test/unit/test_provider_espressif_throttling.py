@@ -53,9 +53,9 @@ class TestEspressifThrottling:
             'policy': 'TestPolicy'
         }
     
-    @patch('src.provider_espressif.provider_espressif.main.s3_object_bytes')
+    @patch('src.provider_espressif.provider_espressif.main.s3_object_lines')
     @patch('src.provider_espressif.provider_espressif.main.create_standardized_throttler')
-    def test_throttler_initialization(self, mock_create_throttler, mock_s3_bytes):
+    def test_throttler_initialization(self, mock_create_throttler, mock_s3_lines):
         """Test that standardized throttler is properly initialized."""
         mock_throttler = MagicMock()
         mock_create_throttler.return_value = mock_throttler
@@ -64,7 +64,7 @@ class TestEspressifThrottling:
         csv_data = "MAC,cert\n" + "\n".join([
             f"AA:BB:CC:DD:EE:{i:02X},{ESPRESSIF_CERTIFICATE}" for i in range(5)
         ])
-        mock_s3_bytes.return_value = csv_data.encode()
+        mock_s3_lines.return_value = csv_data.encode().splitlines(keepends=True)
         
         invoke_export(self.config, self.queue_url, session=self.session)
         
@@ -74,9 +74,9 @@ class TestEspressifThrottling:
         # Verify throttler was used for batch sending
         assert mock_throttler.send_batch_with_throttling.call_count > 0
     
-    @patch('src.provider_espressif.provider_espressif.main.s3_object_bytes')
+    @patch('src.provider_espressif.provider_espressif.main.s3_object_lines')
     @patch('src.provider_espressif.provider_espressif.main.create_standardized_throttler')
-    def test_batch_processing_with_throttling(self, mock_create_throttler, mock_s3_bytes):
+    def test_batch_processing_with_throttling(self, mock_create_throttler, mock_s3_lines):
         """Test batch processing uses standardized throttling."""
         mock_throttler = MagicMock()
         mock_throttler.send_batch_with_throttling.return_value = [{"successful": True}]
@@ -91,7 +91,7 @@ class TestEspressifThrottling:
         csv_data = "MAC,cert\n" + "\n".join([
             f"AA:BB:CC:DD:EE:{i:02X},{ESPRESSIF_CERTIFICATE}" for i in range(25)
         ])
-        mock_s3_bytes.return_value = csv_data.encode()
+        mock_s3_lines.return_value = csv_data.encode().splitlines(keepends=True)
         
         result = invoke_export(self.config, self.queue_url, session=self.session)
         
@@ -108,9 +108,9 @@ class TestEspressifThrottling:
         # Verify throttling stats were retrieved
         mock_throttler.get_throttling_stats.assert_called_once()
     
-    @patch('src.provider_espressif.provider_espressif.main.s3_object_bytes')
+    @patch('src.provider_espressif.provider_espressif.main.s3_object_lines')
     @patch('src.provider_espressif.provider_espressif.main.create_standardized_throttler')
-    def test_single_batch_processing(self, mock_create_throttler, mock_s3_bytes):
+    def test_single_batch_processing(self, mock_create_throttler, mock_s3_lines):
         """Test processing with only one batch."""
         mock_throttler = MagicMock()
         mock_throttler.send_batch_with_throttling.return_value = [{"successful": True}]
@@ -124,7 +124,7 @@ class TestEspressifThrottling:
         csv_data = "MAC,cert\n" + "\n".join([
             f"AA:BB:CC:DD:EE:{i:02X},{ESPRESSIF_CERTIFICATE}" for i in range(5)
         ])
-        mock_s3_bytes.return_value = csv_data.encode()
+        mock_s3_lines.return_value = csv_data.encode().splitlines(keepends=True)
         
         result = invoke_export(self.config, self.queue_url, session=self.session)
         
@@ -138,9 +138,9 @@ class TestEspressifThrottling:
         call_args = mock_throttler.send_batch_with_throttling.call_args
         assert call_args[1]['is_final_batch'] is True
     
-    @patch('src.provider_espressif.provider_espressif.main.s3_object_bytes')
+    @patch('src.provider_espressif.provider_espressif.main.s3_object_lines')
     @patch('src.provider_espressif.provider_espressif.main.create_standardized_throttler')
-    def test_empty_manifest_handling(self, mock_create_throttler, mock_s3_bytes):
+    def test_empty_manifest_handling(self, mock_create_throttler, mock_s3_lines):
         """Test handling of empty manifest."""
         mock_throttler = MagicMock()
         mock_throttler.get_throttling_stats.return_value = {
@@ -151,7 +151,7 @@ class TestEspressifThrottling:
         
         # Mock empty CSV data
         csv_data = "MAC,cert\n"
-        mock_s3_bytes.return_value = csv_data.encode()
+        mock_s3_lines.return_value = csv_data.encode().splitlines(keepends=True)
         
         result = invoke_export(self.config, self.queue_url, session=self.session)
         
@@ -164,9 +164,9 @@ class TestEspressifThrottling:
         # Should still get throttling stats
         mock_throttler.get_throttling_stats.assert_called_once()
     
-    @patch('src.provider_espressif.provider_espressif.main.s3_object_bytes')
+    @patch('src.provider_espressif.provider_espressif.main.s3_object_lines')
     @patch('src.provider_espressif.provider_espressif.main.create_standardized_throttler')
-    def test_certificate_data_format(self, mock_create_throttler, mock_s3_bytes):
+    def test_certificate_data_format(self, mock_create_throttler, mock_s3_lines):
         """Test that certificate data is properly formatted for throttler."""
         mock_throttler = MagicMock()
         mock_throttler.send_batch_with_throttling.return_value = [{"successful": True}]
@@ -174,7 +174,7 @@ class TestEspressifThrottling:
         
         # Mock CSV data with specific certificate content
         csv_data = f"MAC,cert\nAA:BB:CC:DD:EE:FF,{ESPRESSIF_CERTIFICATE}"
-        mock_s3_bytes.return_value = csv_data.encode()
+        mock_s3_lines.return_value = csv_data.encode().splitlines(keepends=True)
         
         invoke_export(self.config, self.queue_url, session=self.session)
         
@@ -185,23 +185,16 @@ class TestEspressifThrottling:
         assert len(batch_messages) == 1
         message = batch_messages[0]
         
-        # Check message structure
-        assert 'thing' in message
-        assert 'certificate' in message
-        assert 'thing_type' in message
-        assert 'thing_group' in message
-        assert 'policy' in message
-        
+        # Check message structure; only keys the importer reads are carried
+        assert set(message) == {'v', 'thing', 'der', 'fp'}
+
         # Check specific values
+        assert message['v'] == 2
         assert message['thing'] == 'AA:BB:CC:DD:EE:FF'
-        assert message['thing_type'] == 'TestThingType'
-        assert message['thing_group'] == 'TestThingGroup'
-        assert message['policy'] == 'TestPolicy'
-        
-        # Certificate should be base64 encoded
-        import base64
-        from ast import literal_eval
 
-        decoded_cert = base64.b64decode(literal_eval(message['certificate'])).decode('ascii')
+        # Certificate should be carried as base64 DER
+        from src.layer_utils.layer_utils.message_utils import message_certificate
+
+        decoded_cert = message_certificate(message)
 
         assert ('"' + decoded_cert + '"') == ESPRESSIF_CERTIFICATE
@@ -40,7 +40,7 @@ os.environ["POWERTOOLS_LOG_LEVEL"] = "CRITICAL"
 
 # Mock the idempotency module before importing the main module
 with patch('aws_lambda_powertools.utilities.idempotency.idempotent_function', lambda *args, **kwargs: lambda f: f):
-    from src.provider_generated.provider_generated.main import lambda_handler, process_certificate_file, file_key_generator
+    from src.provider_generated.provider_generated.main import lambda_handler, process_certificate_file, certificate_lines
 
 from .model_provider_generated import LambdaS3Class, LambdaSQSClass
 
@@ -172,22 +172,6 @@ t2jWQRo841K6xmOZoqHg28MP0mEMhpc=
                 # Table already exists
                 pass
 
-    def test_file_key_generator(self):
-        """Test the file key generator function"""
-        # Test with valid input
-        test_event = {
-            "bucket": "test-bucket",
-            "key": "test-key.txt"
-        }
-        key = file_key_generator(test_event, None)
-        self.assertIsNotNone(key)
-        self.assertEqual(key, "test-bucket:test-key.txt")
-        
-        # Test with invalid input
-        invalid_event = {"not_bucket": "data"}
-        key = file_key_generator(invalid_event, None)
-        self.assertIsNone(key)
-
     def test_process_certificate_file(self):
         """Test processing a certificate file"""
         with patch('src.provider_generated.provider_generated.main.logger'):  # Suppress logger output
@@ -212,6 +196,75 @@ t2jWQRo841K6xmOZoqHg28MP0mEMhpc=
             self.assertEqual(queue_attrs['Attributes']['ApproximateNumberOfMessages'], '3',
                             "Expected 3 messages in the queue")
 
+    def test_certificate_lines_ranges(self):
+        """Every line is read by exactly one range, wherever the ranges split the file"""
+        config = {
+            'bucket': self.test_s3_bucket_name,
+            'key': self.test_s3_key_name
+        }
+        content = self.session.client('s3').get_object(
+            Bucket=self.test_s3_bucket_name, Key=self.test_s3_key_name)['Body'].read()
+        expected = content.splitlines(keepends=True)
+        line_size = len(expected[0])
+
+        for step in (97, line_size - 1, line_size, line_size + 1, len(content)):
+            lines = []
+            for start in range(0, len(content), step):
+                chunk = dict(config, range_start=start,
+                             range_end=min(start + step, len(content)) - 1)
+                lines.extend(certificate_lines(chunk, self.session))
+            self.assertEqual(lines, expected, f"step {step}")
+
+    def test_certificate_lines_bounded_reads(self):
+        """Ranged reads stop shortly past the range; a longer crossing line is read in pieces"""
+        config = {
+            'bucket': self.test_s3_bucket_name,
+            'key': self.test_s3_key_name
+        }
+        content = self.session.client('s3').get_object(
+            Bucket=self.test_s3_bucket_name, Key=self.test_s3_key_name)['Body'].read()
+        expected = content.splitlines(keepends=True)
+        line_size = len(expected[0])
+        s3_client = self.session.client('s3')
+        get_object = s3_client.get_object
+        ranges = []
+        def recording_get_object(**kwargs):
+            ranges.append(kwargs['Range'])
+            return get_object(**kwargs)
+
+        with patch('src.provider_generated.provider_generated.main.CERTIFICATE_LINE_MAX_BYTES', 64), \
+             patch('layer_utils.aws_utils.get_client', return_value=s3_client), \
+             patch.object(s3_client, 'get_object', side_effect=recording_get_object):
+            for step in (97, line_size - 1, line_size + 1):
+                lines = []
+                for start in range(0, len(content), step):
+                    chunk = dict(config, range_start=start,
+                                 range_end=min(start + step, len(content)) - 1)
+                    lines.extend(certificate_lines(chunk, self.session))
+                self.assertEqual(lines, expected, f"step {step}")
+
+        self.assertGreater(len(ranges), len(content) // 97)
+        for byte_range in ranges:
+            start, end = byte_range.removeprefix('bytes=').split('-')
+            self.assertTrue(end, byte_range)
+            self.assertLessEqual(int(end) - int(start), max(97, line_size + 1) + 64)
+
+    def test_process_certificate_file_range(self):
+        """Only the certificates starting inside the byte range are processed"""
+        content = self.session.client('s3').get_object(
+            Bucket=self.test_s3_bucket_name, Key=self.test_s3_key_name)['Body'].read()
+        line_size = len(content.splitlines(keepends=True)[0])
+        with patch('src.provider_generated.provider_generated.main.logger'):
+            # Skips the first line, which starts before the range, and takes the second
+            config = {
+                'bucket': self.test_s3_bucket_name,
+                'key': self.test_s3_key_name,
+                'range_start': 1,
+                'range_end': line_size
+            }
+            self.assertEqual(
+                process_certificate_file(config, self.test_sqs_queue_name, self.session), 1)
+
     def test_idempotency_process_certificate_file(self):
         """Test idempotency of process_certificate_file function"""
         with patch('src.provider_generated.provider_generated.main.logger'):  # Suppress logger output
@@ -275,7 +328,8 @@ t2jWQRo841K6xmOZoqHg28MP0mEMhpc=
             result = lambda_handler(event, LambdaContext())  # Pass raw dict like AWS sends
             
             # Verify the result
-            self.assertEqual(result, event, "Lambda handler should return the original event")
+            self.assertEqual(result, {"batchItemFailures": []},
+                             "Lambda handler should report no failed messages")
             
             # Check that 3 messages were sent to the queue
             sqs_client = self.session.client("sqs")
@@ -287,6 +341,23 @@ t2jWQRo841K6xmOZoqHg28MP0mEMhpc=
             self.assertEqual(queue_attrs['Attributes']['ApproximateNumberOfMessages'], '3',
                             "Expected 3 messages in the queue")
 
+    def test_lambda_handler_partial_failure(self):
+        """A message referencing a missing object fails alone"""
+        with patch('src.provider_generated.provider_generated.main.logger'):
+            good = {'bucket': self.test_s3_bucket_name, 'key': self.test_s3_key_name}
+            bad = {'bucket': self.test_s3_bucket_name, 'key': 'missing.txt'}
+            event = {
+                "Records": [
+                    {'messageId': 'good-1', 'eventSource': 'aws:sqs', 'body': json.dumps(good)},
+                    {'messageId': 'bad-1', 'eventSource': 'aws:sqs', 'body': json.dumps(bad)}
+                ]
+            }
+            os.environ['QUEUE_TARGET'] = self.test_sqs_queue_name
+
+            result = lambda_handler(event, LambdaContext())
+
+            self.assertEqual(result, {"batchItemFailures": [{"itemIdentifier": "bad-1"}]})
+
     def tearDown(self):
         # Suppress logs during test teardown
         with patch('logging.Logger.info'), patch('logging.Logger.warning'), patch('logging.Logger.error'):
@@ -10,8 +10,11 @@ set to the environment.
 import os
 import io
 import json
+from tempfile import SpooledTemporaryFile
 from unittest import TestCase
+from unittest.mock import patch, MagicMock
 #from pytest import raises, xfail
+import py7zr
 import pytest
 from botocore.exceptions import ClientError
 from boto3 import _get_default_session
@@ -28,6 +31,7 @@ os.environ["POWERTOOLS_IDEMPOTENCY_EXPIRY_SECONDS"] = "3600"
 from src.layer_utils.layer_utils.aws_utils import s3_object_bytes
 from src.provider_infineon.provider_infineon.main import lambda_handler
 from src.provider_infineon.provider_infineon.manifest_handler import verify_certtype, select_certificate_set, verify_certificate_set, send_certificates
+from src.provider_infineon.provider_infineon.manifest_handler import MemberStreamFactory, invoke_export
 from .model_provider_infineon import LambdaS3Class, LambdaSQSClass
 
 def cr_fileinfo(fn: str):
@@ -149,6 +153,105 @@ class TestProviderInfineon(TestCase):
         }
         send_certificates(x1, config, self.test_sqs_queue_name, self.session)
 
+    def test_member_stream_factory(self):
+        """Each member is delivered whole, before the next one is extracted"""
+        data = {f"{i:03}.pem": (f"member {i}\n" * (i + 1)).encode() for i in range(30)}
+        archive = io.BytesIO()
+        with py7zr.SevenZipFile(archive, 'w') as szf:
+            for name, content in data.items():
+                szf.writestr(content, name)
+        archive.seek(0)
+
+        delivered = {}
+        def on_member(name, content):
+            # Only the member after this one may have been started
+            self.assertEqual(name, fcty_calls[len(delivered)])
+            self.assertLessEqual(len(fcty_calls), len(delivered) + 2)
+            delivered[name] = content
+        fcty = MemberStreamFactory(on_member)
+        fcty_calls = []
+        create = fcty.create
+        fcty.create = lambda name: fcty_calls.append(name) or create(name)
+        with py7zr.SevenZipFile(archive) as szf:
+            szf.extract(factory=fcty)
+        fcty.finish()
+        assert delivered == data
+
+    def test_select_certificate_bundle_file(self):
+        """The selected bundle can be extracted into a caller supplied file"""
+        with SpooledTemporaryFile(max_size=1024) as fs:
+            x = select_certificate_set(io.BytesIO(self.test_s3_object_content.read()),
+                                       "E0E0", fs)
+            assert x is fs
+            with py7zr.SevenZipFile(x) as szf:
+                assert len(szf.list()) == 200
+
+    @patch('src.provider_infineon.provider_infineon.manifest_handler.create_standardized_throttler')
+    def test_invoke_export_streaming(self, mock_create_throttler):
+        """Every certificate in the bundle is sent, in batches of ten"""
+        throttler = MagicMock()
+        mock_create_throttler.return_value = throttler
+        config = {
+            'bucket': self.test_s3_bucket_name,
+            'key': self.artifact
+        }
+        with patch('src.provider_infineon.provider_infineon.manifest_handler.SPOOL_MAX_BYTES', 1024):
+            count = invoke_export(config, self.test_sqs_queue_name, "E0E0", self.session)
+        assert count == 200
+        batches = [c.args[0] for c in throttler.send_batch_with_throttling.call_args_list]
+        assert [len(b) for b in batches] == [10] * 20
+        names = {m['thing'] for b in batches for m in b}
+        assert len(names) == 200
+
+    @patch('src.provider_infineon.provider_infineon.manifest_handler.create_standardized_throttler')
+    def test_send_certificates_index_range(self, mock_create_throttler):
+        """Only the members in the index range are sent"""
+        throttler = MagicMock()
+        mock_create_throttler.return_value = throttler
+        config = {
+            'bucket': self.test_s3_bucket_name,
+            'key': self.artifact,
+            'index_start': 10,
+            'index_end': 25
+        }
+        x1 = select_certificate_set(io.BytesIO(self.test_s3_object_content.read()), "E0E0")
+        assert send_certificates(x1, config, self.test_sqs_queue_name, self.session) == 15
+        x1.seek(0)
+        assert send_certificates(x1, config | {'index_start': 200, 'index_end': 210},
+                                 self.test_sqs_queue_name, self.session) == 0
+
+    @patch('src.provider_infineon.provider_infineon.manifest_handler.create_standardized_throttler')
+    def test_invoke_export_index_chunks(self, mock_create_throttler):
+        """A large bundle is split into index-range work items covering every certificate"""
+        throttler = MagicMock()
+        mock_create_throttler.return_value = throttler
+        config = {
+            'bucket': self.test_s3_bucket_name,
+            'key': self.artifact
+        }
+        sqs_client = self.session.client('sqs', region_name="us-east-1")
+        queue_url = sqs_client.get_queue_url(QueueName=self.test_sqs_queue_name)['QueueUrl']
+
+        assert invoke_export(config, "target", "E0E0", self.session,
+                             chunk_queue_url=queue_url, chunk_size=60) == 0
+        throttler.send_batch_with_throttling.assert_not_called()
+
+        messages = sqs_client.receive_message(QueueUrl=queue_url,
+                                              MaxNumberOfMessages=10)['Messages']
+        chunks = sorted((json.loads(m['Body']) for m in messages),
+                        key=lambda c: c['index_start'])
+        assert [(c['index_start'], c['index_end']) for c in chunks] == \
+            [(0, 60), (60, 120), (120, 180), (180, 200)]
+
+        # Work items are processed directly rather than split again
+        counts = [invoke_export(chunk, "target", "E0E0", self.session,
+                                chunk_queue_url=queue_url, chunk_size=60)
+                  for chunk in chunks]
+        assert counts == [60, 60, 60, 20]
+        names = {m['thing'] for c in throttler.send_batch_with_throttling.call_args_list
+                 for m in c.args[0]}
+        assert len(names) == 200
+
     def test_pos_lambda_handler_1(self):
         """Invoke the main handler with one file"""
         r1 = {
@@ -168,7 +271,7 @@ class TestProviderInfineon(TestCase):
         v = lambda_handler(e, LambdaContext())  # Pass raw dict like AWS sends
         os.environ['QUEUE_TARGET']=""
         os.environ['CERT_TYPE']=""
-        assert v == e
+        assert v == {'batchItemFailures': []}
 
 
     def test_neg_lambda_handler_no_queue(self):
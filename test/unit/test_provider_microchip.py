@@ -9,16 +9,21 @@ set to the environment.
 """
 import os
 import json
-from collections.abc import Iterator
+import pickle
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from unittest import TestCase
+from unittest.mock import patch
 from boto3 import Session, _get_default_session
 from moto import mock_aws
+from jose.utils import base64url_decode
 #from types_boto3_s3.service_resource import S3ServiceResource
 from aws_lambda_powertools.utilities.data_classes import SQSEvent
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
 from src.provider_microchip.provider_microchip.main import lambda_handler, invoke_export
-from src.provider_microchip.provider_microchip.manifest_handler import get_iterator
+from src.provider_microchip.provider_microchip.manifest_handler import (
+    verify_entries, load_verification_keys, VerificationKey, SignerIndex,
+    SignerCache, signer_cache, ordered_map, verification_executor, verify_entry)
 from src.layer_utils.layer_utils.aws_utils import s3_object_bytes
 from .model_provider_infineon import LambdaS3Class, LambdaSQSClass
 
@@ -42,6 +47,7 @@ class TestProviderMicrochip(TestCase):
         self.session = _get_default_session()
 
     def setUp(self):
+        signer_cache.clear()
         # Separate buckets for manifest files and verification certificates
         self.test_s3_bucket_name = "unit_test_s3_bucket"
         self.test_verification_certs_bucket_name = "unit_test_verification_certs_bucket"
@@ -112,13 +118,174 @@ class TestProviderMicrochip(TestCase):
             'bucket': self.test_s3_bucket_name,
             'key': self.o_manifest_tlsu_b
         }
+        stats = invoke_export(config, self.test_sqs_queue_name, self.session)
+        assert stats == {'signer_hits': {self.o_validator: 10},
+                         'lookups': {'kid': 10},
+                         'failures': 0}
+
+    def test_pos_invoke_export_index_range(self):
+        """ A chunk message only forwards the entries inside its index range """
+        os.environ['VERIFY_CERT'] = self.o_validator
+        os.environ['VERIFICATION_CERTS_BUCKET'] = self.test_verification_certs_bucket_name
+        config = {
+            'policy_arn': 'dev_policy',
+            'bucket': self.test_s3_bucket_name,
+            'key': self.o_manifest_tlsu_b,
+            'index_start': 2,
+            'index_end': 5
+        }
         invoke_export(config, self.test_sqs_queue_name, self.session)
+        sqs_client = self.session.client('sqs')
+        sqs_queue_url = sqs_client.get_queue_url(QueueName=self.test_sqs_queue_name)['QueueUrl']
+        p = sqs_client.get_queue_attributes(QueueUrl=sqs_queue_url,
+                                            AttributeNames=['ApproximateNumberOfMessages'])
+        assert p['Attributes']['ApproximateNumberOfMessages'] == '3'
+
+    def test_verify_entries_order(self):
+        """ Concurrent verification yields results in manifest order, failures in place """
+        with open('./test/artifacts/' + self.o_manifest_tlsu_b, 'rb') as data:
+            entries = json.load(data)
+        with open('./test/artifacts/mchp_verifiers/' + self.o_validator, 'rb') as data:
+            certificates = SignerIndex(load_verification_keys([(self.o_validator, data.read())]))
+        entries[3] = dict(entries[3], signature=entries[4]['signature'])
+        expected = [e['header']['uniqueId'] for e in entries]
+
+        serial = list(verify_entries(entries, certificates, max_workers=1))
+        threaded = list(verify_entries(entries, certificates, max_workers=4))
+        # Without /dev/shm, as on Lambda, process pools cannot be created
+        with patch('src.provider_microchip.provider_microchip.manifest_handler.VERIFY_EXECUTOR',
+                   'process'), \
+             patch('src.provider_microchip.provider_microchip.manifest_handler.ProcessPoolExecutor',
+                   side_effect=OSError("[Errno 38] Function not implemented")):
+            processes = list(verify_entries(entries, certificates, max_workers=2))
+
+        with patch('src.provider_microchip.provider_microchip.manifest_handler.VERIFY_EXECUTOR',
+                   'process'):
+            pooled = list(verify_entries(entries, certificates, max_workers=2))
+
+        assert [r.identifier for r in serial] == expected
+        assert threaded == serial
+        assert processes == serial
+        assert pooled == serial
+        assert serial[3].error is not None
+        assert all(r.error is None and r.certificate_chain
+                   for i, r in enumerate(serial) if i != 3)
+
+    def test_verification_executor_process(self):
+        """ Process pool workers load the signers once; tasks carry only the entry """
+        with open('./test/artifacts/' + self.o_manifest_tlsu_b, 'rb') as data:
+            entry = json.load(data)[0]
+        with open('./test/artifacts/mchp_verifiers/' + self.o_validator, 'rb') as data:
+            certificates = SignerIndex(load_verification_keys([(self.o_validator, data.read())]))
+
+        with patch('src.provider_microchip.provider_microchip.manifest_handler.VERIFY_EXECUTOR',
+                   'process'):
+            executor, verify = verification_executor(1, certificates)
+        with executor:
+            assert isinstance(executor, ProcessPoolExecutor)
+            result = executor.submit(verify, entry).result()
+        assert result == verify_entry(entry, certificates)
+        assert result.error is None
+
+    def test_ordered_map_window(self):
+        """ Results keep input order and no more than the window is read ahead """
+        consumed = []
+        def items():
+            for i in range(10):
+                consumed.append(i)
+                yield i
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = ordered_map(executor, lambda x: x * x, items(), 3)
+            assert next(results) == 0
+            assert len(consumed) == 3
+            assert list(results) == [i * i for i in range(1, 10)]
+
+    def test_verification_key(self):
+        """ Signer material is derived once and survives pickling for process pools """
+        with open('./test/artifacts/mchp_verifiers/' + self.o_validator, 'rb') as data:
+            cert_pem = data.read()
+        with open('./test/artifacts/' + self.o_manifest_tlsu_b, 'rb') as data:
+            entry = json.load(data)[0]
+        protected = json.loads(base64url_decode(entry['protected'].encode('ascii')))
+
+        key = VerificationKey(self.o_validator, cert_pem)
+        assert key.matches(protected)
+        assert not key.matches(dict(protected, kid='other'))
+        assert key.key(protected['alg']) is key.key(protected['alg'])
+
+        restored = pickle.loads(pickle.dumps(key))
+        assert (restored.name, restored.kid, restored.x5t_s256) == \
+               (key.name, key.kid, key.x5t_s256)
+
+    def test_signer_index_candidates(self):
+        """ Signers are selected by kid, then x5t#S256, and scanned only without either """
+        with open('./test/artifacts/mchp_verifiers/' + self.o_validator, 'rb') as data:
+            key = VerificationKey(self.o_validator, data.read())
+        signers = SignerIndex([key])
+
+        assert signers.candidates({'kid': key.kid, 'x5t#S256': key.x5t_s256}) == [key]
+        assert signers.candidates({'x5t#S256': key.x5t_s256}) == [key]
+        assert not signers.candidates({'kid': 'unknown'})
+        assert signers.candidates({'alg': 'ES256'}) == [key]
+        assert SignerIndex.lookup_kind({'alg': 'ES256'}) == 'scan'
+
+    def test_load_verification_keys_skips_invalid(self):
+        """ Unparseable signer certificates are dropped, order is kept """
+        with open('./test/artifacts/mchp_verifiers/' + self.o_validator, 'rb') as data:
+            cert_pem = data.read()
+        keys = load_verification_keys([('bad.crt', b'not a certificate'),
+                                       (self.o_validator, cert_pem)])
+        assert [k.name for k in keys] == [self.o_validator]
+
+    def test_signer_cache(self):
+        """ Warm invocations reuse parsed signers and revalidate them by ETag """
+        handler = 'src.provider_microchip.provider_microchip.manifest_handler'
+        cache = SignerCache(ttl=300)
+        bucket = self.test_verification_certs_bucket_name
+
+        with patch(f'{handler}.s3_object_bytes', wraps=s3_object_bytes) as downloads, \
+             patch(f'{handler}.time.monotonic', return_value=1000.0) as clock:
+            first = cache.get(bucket, self.session)
+            assert [k.name for k in first.keys] == [self.o_validator]
+            assert cache.get(bucket, self.session) is first
+            assert downloads.call_count == 1
+
+            # Expired but unchanged: listed again, nothing downloaded
+            clock.return_value = 2000.0
+            assert cache.get(bucket, self.session) is first
+            assert downloads.call_count == 1
+
+            # A rewritten certificate gets a new ETag and is parsed again
+            with open('./test/artifacts/mchp_verifiers/' + self.o_validator, 'rb') as data:
+                self.session.client('s3').put_object(Bucket=bucket, Key=self.o_validator,
+                                                     Body=data.read() + b'\n')
+            clock.return_value = 3000.0
+            second = cache.get(bucket, self.session)
+            assert second is not first
+            assert downloads.call_count == 2
+
+            # Listing failures keep the cached signers in service
+            clock.return_value = 4000.0
+            with patch(f'{handler}.list_verification_certificates',
+                       side_effect=RuntimeError("throttled")):
+                assert cache.get(bucket, self.session) is second
+
+    def test_signer_cache_retries_failed_download(self):
+        """ A certificate that failed to download is fetched at the next revalidation """
+        handler = 'src.provider_microchip.provider_microchip.manifest_handler'
+        cache = SignerCache(ttl=300)
+        bucket = self.test_verification_certs_bucket_name
+
+        with patch(f'{handler}.s3_object_bytes',
+                   side_effect=RuntimeError("slow down")) as downloads, \
+             patch(f'{handler}.time.monotonic', return_value=1000.0) as clock:
+            assert len(cache.get(bucket, self.session)) == 0
 
-    def test_iter(self):
-        """ Ensure that the class can effectively return an iterator """
-        o = s3_object_bytes(self.test_s3_bucket_name, self.o_manifest_tlsu_b, self.session)
-        x = get_iterator(o)
-        assert isinstance(x, Iterator) is True
+            downloads.side_effect = s3_object_bytes
+            clock.return_value = 2000.0
+            signers = cache.get(bucket, self.session)
+            assert [k.name for k in signers.keys] == [self.o_validator]
+            assert downloads.call_count == 2
 
     def test_pos_lambda_handler_1(self):
         """Invoke the main handler with one file"""
@@ -141,7 +308,7 @@ class TestProviderMicrochip(TestCase):
 
         v = lambda_handler(h, c)  # Pass raw dict like AWS sends
         os.environ['QUEUE_TARGET']=""
-        assert v == h
+        assert v == {'batchItemFailures': []}
 
     def tearDown(self):
         s3_resource = self.session.resource("s3")
@@ -0,0 +1,222 @@
+"""
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+Unit tests for rate_limiter.py
+"""
+import os
+import unittest
+from unittest.mock import patch, MagicMock
+
+from boto3 import client
+from botocore.exceptions import ClientError
+from moto import mock_aws
+
+from src.layer_utils.layer_utils import rate_limiter
+from src.layer_utils.layer_utils.rate_limiter import (SharedTokenBucket, TokenBucket,
+                                                      acquire_rate_limit, clear_rate_limiters,
+                                                      operation_rate)
+
+class FakeClock:
+    """Monotonic and wall clock that only advance when slept on"""
+    def __init__(self):
+        self.now = 1_000_000.0
+        self.slept = []
+
+    def time(self):
+        """Current time"""
+        return self.now
+
+    def sleep(self, seconds):
+        """Advance the clock"""
+        self.slept.append(seconds)
+        self.now += seconds
+
+def patch_clock(clock):
+    """Replace the time functions the rate limiter uses"""
+    return patch.multiple('src.layer_utils.layer_utils.rate_limiter.time',
+                          monotonic=clock.time, time=clock.time, sleep=clock.sleep)
+
+class TestTokenBucket(unittest.TestCase):
+    """Test cases for the local token bucket"""
+
+    def test_burst_then_rate(self):
+        """A full bucket allows a burst, after which calls are paced at the rate"""
+        clock = FakeClock()
+        with patch_clock(clock):
+            bucket = TokenBucket(rate=10)
+            start = clock.now
+            for _ in range(30):
+                bucket.acquire()
+        self.assertEqual(clock.slept[:1], [0.1])
+        self.assertAlmostEqual(clock.now - start, 2.0)
+
+    def test_refill_is_capped(self):
+        """An idle bucket does not accumulate more than its capacity"""
+        clock = FakeClock()
+        with patch_clock(clock):
+            bucket = TokenBucket(rate=5, capacity=5)
+            clock.sleep(60)
+            clock.slept.clear()
+            for _ in range(6):
+                bucket.acquire()
+        self.assertEqual(len(clock.slept), 1)
+
+class TestOperationRate(unittest.TestCase):
+    """Test cases for rate configuration and the limiter registry"""
+
+    def setUp(self):
+        clear_rate_limiters()
+
+    def tearDown(self):
+        clear_rate_limiters()
+
+    def test_operation_rate(self):
+        """Environment overrides the defaults and unknown operations are not limited"""
+        self.assertEqual(operation_rate('iot_register_certificate_without_ca'), 10)
+        self.assertEqual(operation_rate('iot_describe_thing'), 0)
+        with patch.dict(os.environ, {'RATE_LIMIT_IOT_CREATE_THING': '2.5'}):
+            self.assertEqual(operation_rate('iot_create_thing'), 2.5)
+
+    def test_disabled_operation(self):
+        """A rate of 0 never waits"""
+        with patch.dict(os.environ, {'RATE_LIMIT_IOT_CREATE_THING': '0'}), \
+             patch('src.layer_utils.layer_utils.rate_limiter.time.sleep') as sleep:
+            for _ in range(100):
+                acquire_rate_limit('iot_create_thing')
+        sleep.assert_not_called()
+        self.assertIsNone(rate_limiter.rate_limiter('iot_create_thing'))
+
+    def test_bucket_per_operation(self):
+        """Each operation has its own bucket, shared by every caller"""
+        first = rate_limiter.rate_limiter('iot_create_thing')
+        self.assertIs(first, rate_limiter.rate_limiter('iot_create_thing'))
+        self.assertIsNot(first, rate_limiter.rate_limiter('iot_attach_policy'))
+        self.assertIsInstance(first, TokenBucket)
+
+    def test_shared_when_table_configured(self):
+        """Buckets are shared through DynamoDB when a table is configured"""
+        with patch.object(rate_limiter, 'RATE_LIMIT_TABLE', 'limits'):
+            self.assertIsInstance(rate_limiter.rate_limiter('iot_create_thing'),
+                                  SharedTokenBucket)
+
+@mock_aws(config={
+    "core": {
+        "mock_credentials": True,
+        "reset_boto3_session": False,
+        "passthrough": {
+            "urls": ["s3.*.amazonaws.com"],
+            "services": ["s3"],
+        }
+    },
+    "iot": {"use_valid_cert": True}})
+class TestSharedTokenBucket(unittest.TestCase):
+    """Test cases for the DynamoDB backed token bucket"""
+
+    def setUp(self):
+        self.dynamodb = client('dynamodb', region_name='us-east-1')
+        self.dynamodb.create_table(TableName='limits',
+                                   KeySchema=[{'AttributeName': 'id', 'KeyType': 'HASH'}],
+                                   AttributeDefinitions=[{'AttributeName': 'id',
+                                                          'AttributeType': 'S'}],
+                                   BillingMode='PAY_PER_REQUEST')
+
+    def test_rate_shared_across_containers(self):
+        """Two containers together stay within the one configured rate"""
+        clock = FakeClock()
+        with patch_clock(clock):
+            containers = [SharedTokenBucket('iot_create_thing', 10, 'limits',
+                                            client=self.dynamodb, lease=5)
+                          for _ in range(2)]
+            start = clock.now
+            for i in range(40):
+                containers[i % 2].acquire()
+        # A burst of 10, then 30 more at 10 per second
+        self.assertGreaterEqual(clock.now - start, 3.0)
+        self.assertLess(clock.now - start, 4.0)
+
+        item = self.dynamodb.get_item(TableName='limits',
+                                      Key={'id': {'S': 'rate_limit#iot_create_thing'}})['Item']
+        self.assertGreater(int(item['expiration']['N']), clock.now)
+
+    def test_leases_reduce_table_calls(self):
+        """Tokens are taken from the table a lease at a time"""
+        with patch_clock(FakeClock()):
+            bucket = SharedTokenBucket('iot_create_thing', 10, 'limits',
+                                       client=self.dynamodb, lease=5)
+            with patch.object(bucket, '_take', wraps=bucket._take) as take:
+                for _ in range(10):
+                    bucket.acquire()
+        self.assertEqual(take.call_count, 2)
+
+    def test_contention_retries(self):
+        """A lost conditional write is retried against the new bucket state"""
+        with patch_clock(FakeClock()):
+            bucket = SharedTokenBucket('iot_create_thing', 10, 'limits',
+                                       client=self.dynamodb, lease=5)
+            other = SharedTokenBucket('iot_create_thing', 10, 'limits',
+                                      client=client('dynamodb', region_name='us-east-1'),
+                                      lease=5)
+            get_item = self.dynamodb.get_item
+            def racing_get_item(**kwargs):
+                response = get_item(**kwargs)
+                if not other.leased:
+                    other.acquire()
+                return response
+            with patch.object(self.dynamodb, 'get_item', side_effect=racing_get_item):
+                bucket.acquire()
+        self.assertEqual(bucket.leased, 4)
+        self.assertEqual(other.leased, 4)
+
+    def test_table_unavailable(self):
+        """Without the table the bucket falls back to limiting locally"""
+        failing = MagicMock()
+        failing.get_item.side_effect = ClientError(
+            {'Error': {'Code': 'ResourceNotFoundException', 'Message': 'no table'}}, 'GetItem')
+        clock = FakeClock()
+        with patch_clock(clock):
+            bucket = SharedTokenBucket('iot_create_thing', 10, 'missing', client=failing)
+            start = clock.now
+            for _ in range(20):
+                bucket.acquire()
+        self.assertEqual(failing.get_item.call_count, 1)
+        self.assertAlmostEqual(clock.now - start, 1.0)
+
+    def test_throttled_table_retried(self):
+        """A throttled read is retried rather than abandoning the shared bucket"""
+        get_item = self.dynamodb.get_item
+        throttled = ClientError({'Error': {'Code': 'ProvisionedThroughputExceededException',
+                                           'Message': 'slow down'}}, 'GetItem')
+        errors = iter([throttled, throttled])
+        def read(**kwargs):
+            if (error := next(errors, None)) is not None:
+                raise error
+            return get_item(**kwargs)
+        with patch_clock(FakeClock()), \
+             patch.object(self.dynamodb, 'get_item', side_effect=read) as reads:
+            bucket = SharedTokenBucket('iot_create_thing', 10, 'limits',
+                                       client=self.dynamodb, lease=5)
+            bucket.acquire()
+        self.assertEqual(reads.call_count, 3)
+        self.assertEqual(bucket.leased, 4)
+        self.assertIsNone(bucket._fallback) # pylint: disable=protected-access
+
+    def test_fallback_reprobes_table(self):
+        """After the cooldown the shared table is tried again"""
+        get_item = self.dynamodb.get_item
+        unavailable = ClientError({'Error': {'Code': 'ResourceNotFoundException',
+                                             'Message': 'no table'}}, 'GetItem')
+        clock = FakeClock()
+        with patch_clock(clock), \
+             patch.object(self.dynamodb, 'get_item', side_effect=unavailable) as reads:
+            bucket = SharedTokenBucket('iot_create_thing', 10, 'limits',
+                                       client=self.dynamodb, lease=5)
+            bucket.acquire()
+            bucket.acquire()
+            self.assertEqual(reads.call_count, 1)
+
+            reads.side_effect = get_item
+            clock.sleep(rate_limiter.RATE_LIMIT_FALLBACK_COOLDOWN)
+            bucket.acquire()
+        self.assertEqual(reads.call_count, 2)
+        self.assertEqual(bucket.leased, 4)
@@ -12,7 +12,8 @@ from unittest.mock import patch, MagicMock, call
 from boto3 import Session
 
 from src.layer_utils.layer_utils.throttling_utils import (
-    ThrottlingConfig, StandardizedThrottler, create_standardized_throttler
+    AimdController, ThrottlingConfig, StandardizedThrottler, clear_queue_depth_samples,
+    create_standardized_throttler, sample_queue_depth
 )
 
 
@@ -53,6 +54,7 @@ class TestStandardizedThrottler:
     
     def setup_method(self):
         """Set up test fixtures."""
+        clear_queue_depth_samples()
         self.config = ThrottlingConfig()
         self.throttler = StandardizedThrottler(self.config)
         self.queue_url = "https://sqs.us-east-1.amazonaws.com/123456789012/test-queue"
@@ -194,6 +196,21 @@ class TestStandardizedThrottler:
         mock_send.assert_called_once_with(batch_messages, self.queue_url, self.session)
         assert result == [{"successful": True}]
     
+    @patch('src.layer_utils.layer_utils.message_utils.PACK_SIZE', 4)
+    @patch('src.layer_utils.layer_utils.throttling_utils.send_sqs_message_batch_with_retry')
+    def test_send_batch_with_throttling_packed(self, mock_send):
+        """Certificates are packed into fewer SQS messages when packing is enabled."""
+        self.config.auto_throttling_enabled = False
+        batch_messages = [{"v": 2, "thing": f"t{i}", "der": "AAAA", "fp": "0" * 64,
+                           "thing_type_name": "type"} for i in range(10)]
+        mock_send.return_value = [{"successful": True}]
+
+        self.throttler.send_batch_with_throttling(batch_messages, self.queue_url, self.session)
+
+        sent = mock_send.call_args.args[0]
+        assert [len(m["certs"]) for m in sent] == [4, 4, 2]
+        assert all(m["thing_type_name"] == "type" for m in sent)
+
     @patch('src.layer_utils.layer_utils.throttling_utils.send_sqs_message_batch_with_retry')
     def test_send_batch_with_throttling_adaptive_mode(self, mock_send):
         """Test sending batch with adaptive throttling."""
@@ -241,6 +258,223 @@ class TestStandardizedThrottler:
         assert stats["total_batches_processed"] == 10
 
 
+class TestQueueDepthSampler:
+    """Test cases for the cached, smoothed queue depth sampler."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        clear_queue_depth_samples()
+        self.queue_url = "https://sqs.us-east-1.amazonaws.com/123456789012/test-queue"
+        self.session = MagicMock(spec=Session)
+        self.now = 100.0
+
+    def sample(self, elapsed=0.0):
+        """Advance the clock and sample the queue depth."""
+        self.now += elapsed
+        with patch('time.monotonic', return_value=self.now):
+            return sample_queue_depth(self.queue_url, self.session)
+
+    @patch('src.layer_utils.layer_utils.throttling_utils.get_queue_depth')
+    def test_cached_between_refreshes(self, mock_get_depth):
+        """SQS is read at most once per refresh interval, across throttlers."""
+        mock_get_depth.return_value = {'total': 400}
+        throttlers = [StandardizedThrottler() for _ in range(3)]
+
+        readings = [self.sample(elapsed=1.0) for _ in throttlers]
+        assert [reading.depth for reading in readings] == [400] * 3
+        # Cached readings carry the time of the SQS read they came from
+        assert {reading.sampled_at for reading in readings} == {101.0}
+        assert mock_get_depth.call_count == 1
+
+        assert self.sample(elapsed=5.0).sampled_at == 108.0
+        assert mock_get_depth.call_count == 2
+
+    @patch('src.layer_utils.layer_utils.throttling_utils.QUEUE_DEPTH_SMOOTHING', 0.25)
+    @patch('src.layer_utils.layer_utils.throttling_utils.get_queue_depth')
+    def test_smoothing(self, mock_get_depth):
+        """Readings are exponentially smoothed."""
+        mock_get_depth.side_effect = [{'total': 1000}, {'total': 200}, {'total': 200}]
+
+        assert self.sample().depth == 1000
+        assert self.sample(elapsed=10).depth == 800
+        assert self.sample(elapsed=10).depth == 650
+
+    @patch('src.layer_utils.layer_utils.throttling_utils.get_queue_depth')
+    def test_error_keeps_cache(self, mock_get_depth):
+        """A failed read is raised and the next call reads again."""
+        mock_get_depth.side_effect = [{'total': 10}, Exception("Queue error"), {'total': 30}]
+
+        self.sample()
+        with pytest.raises(Exception):
+            self.sample(elapsed=10)
+        assert self.sample().depth == 20
+
+
+class TestAimdController:
+    """Test cases for the AIMD pacing controller."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.config = ThrottlingConfig()
+        self.config.max_queue_depth = 1000
+        self.now = 100.0
+
+    def controller(self):
+        """Controller whose clock only moves when the test advances it."""
+        with patch('time.monotonic', return_value=self.now):
+            return AimdController(self.config)
+
+    def update(self, controller, depth, elapsed=0.0):
+        """Advance the clock and feed the controller a queue depth reading."""
+        self.now += elapsed
+        with patch('time.monotonic', return_value=self.now):
+            return controller.update(depth)
+
+    def test_additive_increase(self):
+        """Rate grows by the step while the queue is below target."""
+        controller = self.controller()
+        for _ in range(4):
+            self.update(controller, 10)
+        assert controller.rate == pytest.approx(3.0)
+        assert controller.increases == 4
+
+    def test_multiplicative_decrease(self):
+        """Rate is cut when the queue reaches the target or cannot be read."""
+        controller = self.controller()
+        controller.rate = 8.0
+        self.update(controller, 1000)
+        assert controller.rate == pytest.approx(4.0)
+        self.update(controller, None)
+        assert controller.rate == pytest.approx(2.0)
+        assert controller.decreases == 2
+
+    def test_rate_bounds(self):
+        """Rate stays within the configured minimum and maximum."""
+        self.config.max_batch_rate = 3
+        controller = self.controller()
+        for _ in range(10):
+            self.update(controller, 0)
+        assert controller.rate == 3
+        for _ in range(20):
+            self.update(controller, 5000)
+        assert controller.rate == self.config.min_batch_rate
+
+    def test_pacing(self):
+        """Batches are spaced by the inverse of the rate, net of time already spent."""
+        self.config.batch_rate_step = 1.0
+        controller = self.controller()
+        # First batch goes immediately and the rate becomes 2 batches per second
+        assert self.update(controller, 0) == 0
+        # Rate becomes 3, the next batch is due 1/2 second after the first
+        assert self.update(controller, 0) == pytest.approx(0.5)
+        # 0.2 seconds of the following 1/3 second gap spent sending the batch
+        assert self.update(controller, 0, elapsed=0.7) == pytest.approx(1 / 3 - 0.2)
+
+    def test_rate_changes_once_per_reading(self):
+        """A cached reading fed again keeps the rate but still paces the batch."""
+        self.config.batch_rate_step = 1.0
+        controller = self.controller()
+        with patch('time.monotonic', return_value=self.now):
+            assert controller.update(0, sampled_at=50.0) == 0
+            assert controller.rate == pytest.approx(2.0)
+            delays = [controller.update(0, sampled_at=50.0) for _ in range(3)]
+            assert controller.rate == pytest.approx(2.0)
+            assert delays == pytest.approx([0.5, 1.0, 1.5])
+            controller.update(5000, sampled_at=50.0)
+            assert controller.rate == pytest.approx(2.0)
+            controller.update(5000, sampled_at=55.0)
+        assert controller.rate == pytest.approx(1.0)
+        assert (controller.increases, controller.decreases) == (1, 1)
+
+    def test_get_state(self):
+        """Controller state is exposed for monitoring."""
+        controller = self.controller()
+        self.update(controller, 250)
+        state = controller.get_state()
+        assert state["batch_rate"] == 1.5
+        assert state["queue_depth"] == 250
+        assert state["target_queue_depth"] == 1000
+        assert state["rate_increases"] == 1
+        assert state["rate_decreases"] == 0
+
+
+class TestControlledThrottling:
+    """Test cases for controlled throttling in StandardizedThrottler."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        clear_queue_depth_samples()
+        self.config = ThrottlingConfig()
+        self.config.auto_throttling_enabled = True
+        self.config.use_controlled_throttling = True
+        self.throttler = StandardizedThrottler(self.config)
+        self.queue_url = "https://sqs.us-east-1.amazonaws.com/123456789012/test-queue"
+        self.session = MagicMock(spec=Session)
+
+    @patch('src.layer_utils.layer_utils.throttling_utils.send_sqs_message_batch_with_retry')
+    @patch('src.layer_utils.layer_utils.throttling_utils.get_queue_depth')
+    def test_sub_second_pacing(self, mock_get_depth, mock_send):
+        """Batches are paced by the controller rather than fixed delays."""
+        mock_get_depth.return_value = {'total': 10}
+        mock_send.return_value = []
+        clock = [0.0]
+        delays = []
+        def sleep(seconds):
+            delays.append(seconds)
+            clock[0] += seconds
+
+        with patch('time.monotonic', side_effect=lambda: clock[0]), \
+             patch('time.sleep', side_effect=sleep):
+            for i in range(5):
+                self.throttler.send_batch_with_throttling([{"batch": i}], self.queue_url,
+                                                          self.session)
+
+        assert mock_send.call_count == 5
+        assert len(delays) == 4
+        assert all(0 < delay < 1 for delay in delays)
+
+    @patch('src.layer_utils.layer_utils.throttling_utils.send_sqs_message_batch_with_retry')
+    @patch('src.layer_utils.layer_utils.throttling_utils.get_queue_depth')
+    def test_batches_within_one_refresh(self, mock_get_depth, mock_send):
+        """Batches sent within one refresh interval adjust the rate only once."""
+        mock_get_depth.return_value = {'total': 10}
+        mock_send.return_value = []
+        clock = [0.0]
+        def sleep(seconds):
+            clock[0] += seconds
+
+        with patch('time.monotonic', side_effect=lambda: clock[0]), \
+             patch('time.sleep', side_effect=sleep):
+            for i in range(6):
+                self.throttler.send_batch_with_throttling([{"batch": i}], self.queue_url,
+                                                          self.session)
+
+        # Six batches at 1.5 per second take well under the 5 second refresh
+        assert clock[0] < 5
+        assert mock_get_depth.call_count == 1
+        assert self.throttler.controller.increases == 1
+        assert self.throttler.controller.rate == pytest.approx(1.5)
+
+    @patch('src.layer_utils.layer_utils.throttling_utils.get_queue_depth')
+    @patch('time.sleep')
+    def test_queue_depth_failure(self, mock_sleep, mock_get_depth):
+        """An unreadable queue depth slows the rate instead of failing the batch."""
+        mock_get_depth.side_effect = Exception("Queue error")
+
+        with patch('src.layer_utils.layer_utils.throttling_utils.logger') as mock_logger:
+            self.throttler.apply_controlled_throttling(self.queue_url, self.session)
+
+        mock_logger.warning.assert_called_once()
+        assert self.throttler.controller.rate == pytest.approx(0.5)
+
+    def test_get_throttling_stats_controlled(self):
+        """Throttling statistics include the controller state."""
+        stats = self.throttler.get_throttling_stats()
+
+        assert stats["throttling_type"] == "controlled"
+        assert stats["controller"] == self.throttler.controller.get_state()
+
+
 class TestCreateStandardizedThrottler:
     """Test cases for the factory function."""
     